@@ -13,10 +13,24 @@ CREATE TABLE IF NOT EXISTS brands (
     products_count INTEGER DEFAULT 0,
     last_processed_at TIMESTAMP,
     error_message TEXT,
+    payload_hash CHAR(64),
+    -- Версия project_brand_data, которой получено поле data
+    projection_version INTEGER,
+    fetch_count INTEGER NOT NULL DEFAULT 0,
+    change_count INTEGER NOT NULL DEFAULT 0,
+    last_fetched_at TIMESTAMP,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Полные __NEXT_DATA__ бренда, сжатые zstd и адресуемые по SHA-256
+CREATE TABLE IF NOT EXISTS brand_payloads (
+    payload_hash CHAR(64) PRIMARY KEY,
+    payload BYTEA NOT NULL,
+    raw_size INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE TABLE IF NOT EXISTS products (
     id VARCHAR(255) PRIMARY KEY,
     brand_name VARCHAR(255) REFERENCES brands(brand_name),
@@ -26,6 +40,73 @@ CREATE TABLE IF NOT EXISTS products (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Интернированные значения свойств брендов и продуктов
+CREATE TABLE IF NOT EXISTS property_values (
+    id SERIAL PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS property_values_md5_idx ON property_values (md5(value));
+
+CREATE TABLE IF NOT EXISTS brand_properties (
+    brand_name VARCHAR(255) REFERENCES brands(brand_name) ON DELETE CASCADE,
+    key VARCHAR(255) NOT NULL,
+    value_id INTEGER NOT NULL REFERENCES property_values(id),
+    PRIMARY KEY (brand_name, key, value_id)
+);
+CREATE INDEX IF NOT EXISTS brand_properties_key_value_idx ON brand_properties (key, value_id);
+
+CREATE TABLE IF NOT EXISTS product_properties (
+    product_id VARCHAR(255) REFERENCES products(id) ON DELETE CASCADE,
+    name VARCHAR(255) NOT NULL,
+    value_id INTEGER NOT NULL REFERENCES property_values(id),
+    PRIMARY KEY (product_id, name, value_id)
+);
+CREATE INDEX IF NOT EXISTS product_properties_name_value_idx ON product_properties (name, value_id);
+
+-- Соответствие URL документа (TDS/SDS) и его содержимого в хранилище
+CREATE TABLE IF NOT EXISTS document_blobs (
+    url TEXT PRIMARY KEY,
+    sha256 CHAR(64) NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    size BIGINT,
+    content_type TEXT,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS document_blobs_sha256_idx ON document_blobs (sha256);
+
+-- Числовые характеристики продуктов в канонических единицах
+CREATE TABLE IF NOT EXISTS product_specs (
+    product_id VARCHAR(255) REFERENCES products(id) ON DELETE CASCADE,
+    property VARCHAR(255) NOT NULL,
+    min_value DOUBLE PRECISION,
+    max_value DOUBLE PRECISION,
+    unit VARCHAR(32),
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS product_specs_property_range_idx ON product_specs (property, min_value, max_value);
+CREATE INDEX IF NOT EXISTS product_specs_product_idx ON product_specs (product_id);
+
+-- Плоское представление фасетов продуктов (свойства продукта и его бренда)
+CREATE MATERIALIZED VIEW IF NOT EXISTS product_facet_values AS
+    SELECT pp.product_id, pp.name AS facet, pp.value_id
+    FROM product_properties pp
+    UNION
+    SELECT p.id, bp.key, bp.value_id
+    FROM products p
+    JOIN brand_properties bp ON bp.brand_name = p.brand_name;
+CREATE UNIQUE INDEX IF NOT EXISTS product_facet_values_uidx
+    ON product_facet_values (product_id, facet, value_id);
+CREATE INDEX IF NOT EXISTS product_facet_values_facet_idx
+    ON product_facet_values (facet, value_id);
+
+-- Счетчики фасетов без фильтров
+CREATE MATERIALIZED VIEW IF NOT EXISTS facet_counts AS
+    SELECT facet, value_id, COUNT(*) AS products
+    FROM product_facet_values
+    GROUP BY facet, value_id;
+CREATE UNIQUE INDEX IF NOT EXISTS facet_counts_uidx ON facet_counts (facet, value_id);
+
 -- Даем права на таблицы
 GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO knowde_user;
 GRANT USAGE, SELECT ON ALL SEQUENCES IN SCHEMA public TO knowde_user; 
@@ -0,0 +1,52 @@
+"""Время холодного импорта API и скраперов по данным python -X importtime."""
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в PYTHONPATH
+project_root = Path(__file__).parent.parent
+
+TARGETS = ['src.api.api', 'src.processor.product_extractor']
+# Пакеты, которых не должно быть в процессе API
+SCRAPER_PACKAGES = {'selenium', 'pyppeteer', 'lxml', 'numpy', 'requests', 'requests_html', 'ijson'}
+RUNS = 5
+
+LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+def measure(module: str):
+    """Суммарное время импорта модуля (мкс) и список загруженных модулей"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=project_root, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    total = 0
+    modules = []
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if not match:
+            continue
+        modules.append(match.group(4))
+        # Модули верхнего уровня (без отступа) в сумме дают время всего импорта
+        if len(match.group(3)) == 1:
+            total += int(match.group(2))
+    return total, modules
+
+def main():
+    for module in TARGETS:
+        try:
+            timings = []
+            for _ in range(RUNS):
+                total, modules = measure(module)
+                timings.append(total)
+        except RuntimeError as e:
+            print(f"{module:<36} не импортируется: {e}")
+            continue
+        loaded = sorted({name.split('.')[0] for name in modules} & SCRAPER_PACKAGES)
+        print(f"{module:<36} {min(timings) / 1000:>8.1f} ms (лучший из {RUNS}), "
+              f"модулей: {len(modules)}, пакеты скраперов: {', '.join(loaded) or 'нет'}")
+
+if __name__ == "__main__":
+    main()
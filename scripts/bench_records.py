@@ -0,0 +1,79 @@
+"""Микробенчмарк: словари продуктов против ProductRecord + orjson."""
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в PYTHONPATH
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+import orjson
+from src.processor.records import ProductDocument, ProductRecord, ProductTable
+
+N = 20000
+
+def make_dict(i: int) -> dict:
+    """Продукт в прежнем формате вложенных словарей"""
+    return {
+        'id': i, 'brand': 'brand', 'name': f'Product {i}', 'slug': f'product-{i}', 'uuid': f'uuid-{i}',
+        'description': 'Description', 'company_name': 'Company', 'company_slug': 'company',
+        'company_id': 1, 'summary': {'Function': ['Emulsifier']},
+        'product_url': f'https://www.knowde.com/stores/company/products/product-{i}',
+        'logo_url': None, 'banner_url': None,
+        'properties': {'Market': ['Adhesives', 'Sealants']},
+        'tables': [{'type': 'content', 'name': 'Specs', 'headers': ['Property', 'Value'],
+                    'rows': [['Viscosity', '1,200 – 1,500 cP']]}],
+        'documents': [{'name': 'TDS', 'url': 'https://example.com/tds.pdf', 'blob_id': None}],
+        'img': [], 'info': [],
+    }
+
+def make_record(i: int) -> ProductRecord:
+    """Тот же продукт в виде ProductRecord"""
+    return ProductRecord(
+        id=i, brand='brand', name=f'Product {i}', slug=f'product-{i}', uuid=f'uuid-{i}',
+        description='Description', company_name='Company', company_slug='company',
+        company_id=1, summary={'Function': ['Emulsifier']},
+        product_url=f'https://www.knowde.com/stores/company/products/product-{i}',
+        logo_url=None, banner_url=None,
+        properties={'Market': ['Adhesives', 'Sealants']},
+        tables=[ProductTable(type='content', name='Specs', headers=['Property', 'Value'],
+                             rows=[['Viscosity', '1,200 – 1,500 cP']])],
+        documents=[ProductDocument(name='TDS', url='https://example.com/tds.pdf', blob_id=None)],
+        img=[], info=[],
+    )
+
+def measure_memory(factory) -> float:
+    """Средний объем памяти на продукт в байтах"""
+    tracemalloc.start()
+    items = [factory(i) for i in range(N)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return size / N
+
+def measure(label: str, func, items) -> None:
+    """Пропускная способность операции над списком продуктов"""
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36} {N / elapsed:>12,.0f} ops/s")
+
+def main():
+    print(f"Память на продукт: dict {measure_memory(make_dict):,.0f} B, "
+          f"ProductRecord {measure_memory(make_record):,.0f} B")
+
+    dicts = [make_dict(i) for i in range(N)]
+    records = [make_record(i) for i in range(N)]
+    measure("encode dict / json", json.dumps, dicts)
+    measure("encode dict / orjson", orjson.dumps, dicts)
+    measure("encode ProductRecord / orjson", orjson.dumps, records)
+
+    encoded = [json.dumps(d) for d in dicts]
+    measure("decode / json", json.loads, encoded)
+    measure("decode / orjson", orjson.loads, encoded)
+
+if __name__ == "__main__":
+    main()
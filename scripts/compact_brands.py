@@ -0,0 +1,47 @@
+"""Скрипт для переноса полных payload брендов в архив, сжатия и перепроецирования таблицы brands."""
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в PYTHONPATH
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.storage.brand_payload import PROJECTION_VERSION
+from src.storage.db_storage import DBStorage
+
+def main():
+    """Архивирование payload брендов, сохраненных до появления проекции"""
+    try:
+        storage = DBStorage()
+        storage.cur.execute("SELECT brand_name FROM brands WHERE payload_hash IS NULL;")
+        brands = [row[0] for row in storage.cur.fetchall()]
+        print(f"Брендов без архива: {len(brands)}")
+
+        for brand_name in brands:
+            data = storage.load_brand_data(brand_name)
+            if data:
+                storage.save_brand_data(brand_name, data)
+                print(f"Бренд {brand_name} перенесен в архив")
+
+        # Проекция из архива, если project_brand_data изменился после сохранения бренда
+        storage.cur.execute("""
+            SELECT brand_name FROM brands
+            WHERE payload_hash IS NOT NULL AND projection_version IS DISTINCT FROM %s;
+        """, (PROJECTION_VERSION,))
+        brands = [row[0] for row in storage.cur.fetchall()]
+        print(f"Брендов со старой проекцией: {len(brands)}")
+
+        for brand_name in brands:
+            data = storage.load_raw_brand_data(brand_name)
+            if data and storage.save_brand_data(brand_name, data) is not None:
+                print(f"Бренд {brand_name} перепроецирован")
+
+        # Место в TOAST освобождается только после VACUUM FULL
+        print("\nГотово. Для возврата места выполните: VACUUM FULL brands;")
+
+    except Exception as e:
+        print(f"Ошибка при сжатии данных брендов: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,8 @@ from src.storage.db_storage import DBStorage
 from src.processor.brand_processor import BrandProcessor
 from src.service.brand_service import BrandService
 from src.auth.knowde_auth import KnowdeAuth
+from src.processor.product_listing import ProductListingFetcher
+from src.fetch.http_client import HttpClient
 
 def main():
     """Извлечение продуктов из JSON файлов брендов"""
@@ -24,7 +26,8 @@ def main():
             
         storage = DBStorage()
         processor = BrandProcessor(storage)
-        service = BrandService(storage, processor, driver=session['driver'])
+        service = BrandService(storage, processor, driver=session['driver'],
+                               listing_fetcher=ProductListingFetcher(HttpClient.from_session(session)))
 
         # Получаем список всех брендов
         brands = service.list_available_brands()
@@ -32,10 +35,15 @@ def main():
         total_products = 0
         for brand_name in brands:
             print(f"\nОбработка бренда: {brand_name}")
-            products = service.extract_brand_products(brand_name)
-            print(f"Извлечено продуктов: {len(products)}")
-            total_products += len(products)
+            try:
+                products_count = service.extract_brand_products(brand_name)
+            except Exception as e:
+                print(f"Ошибка извлечения продуктов бренда {brand_name}: {e}")
+                continue
+            print(f"Извлечено продуктов: {products_count}")
+            total_products += products_count
 
+        storage.refresh_facets()
         print(f"\nВсего обработано продуктов: {total_products}")
 
     except Exception as e:
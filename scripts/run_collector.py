@@ -2,9 +2,17 @@
 from src.auth.knowde_auth import KnowdeAuth
 from src.storage.db_storage import DBStorage
 from src.queue.task_queue import TaskQueue
+from src.queue.crawl_checkpoint import CrawlCheckpoint
+from src.queue.backpressure import Watermarks
+from src.queue.cluster import create_membership
+from src.fetch.rate_limiter import create_rate_limiter
 from src.collector.brand_collector import BrandCollector
+from src.monitoring.tracing import setup_tracing
 import os
 def main():
+    membership = None
+    # TRACING=1: спаны брендов продолжаются в экстракторе через brands_queue
+    setup_tracing('brand-collector')
     try:
         # Инициализация компонентов
         auth = KnowdeAuth()
@@ -23,13 +31,27 @@ def main():
             raise Exception("Не удалось получить сессию")
             
         # Создаем коллектор и запускаем обработку
-        collector = BrandCollector(storage, queue, session['driver'])
-        collector.process_brands()
+        checkpoint = CrawlCheckpoint('brand_collector', queue.redis)
+        watermarks = Watermarks.from_env(queue.redis, 'brands_queue')
+        # COLLECTOR_SHARDING=1: страницы делятся между запущенными коллекторами
+        membership = create_membership(queue.redis, 'collectors')
+        if membership:
+            membership.start()
+        collector = BrandCollector(storage, queue, session['driver'], checkpoint=checkpoint,
+                                   watermarks=watermarks, membership=membership,
+                                   rate_limiter=create_rate_limiter())
+        if os.getenv('COLLECTOR_SOURCE') == 'sitemap':
+            # Очередь URL заполняется scripts/run_seeder.py
+            collector.process_frontier()
+        else:
+            collector.process_brands(window=int(os.getenv('COLLECTOR_WINDOW', 0)))
         
     except Exception as e:
         print(f"Ошибка в коллекторе брендов: {e}")
         raise
     finally:
+        if membership:
+            membership.stop()
         if 'session' in locals() and session.get('driver'):
             session['driver'].quit()
 
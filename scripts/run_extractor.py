@@ -1,38 +1,46 @@
 #!/usr/bin/env python
 import os
 from src.auth.knowde_auth import KnowdeAuth
-from src.storage.db_storage import DBStorage
 from src.queue.task_queue import TaskQueue
-from src.processor.product_extractor import ProductExtractor
+from src.pipeline.knowde_pipeline import PipelineResources, build_pipeline
+from src.monitoring.profiler import get_profiler
+from src.monitoring.tracing import setup_tracing
 
 def main():
+    resources = None
+    # SIGUSR1 - профилирование задач, SIGUSR2 - дамп аллокаций (PROFILE_DIR)
+    get_profiler().install_signal_handlers()
+    # TRACING=1: спаны стадий, запросов к БД, HTTP и команд WebDriver
+    setup_tracing('product-extractor')
     try:
         # Инициализация компонентов
-        auth = KnowdeAuth()
-        storage = DBStorage()
         queue = TaskQueue()
-        
+
         print("Запуск обработчика продуктов...")
-        
-        # Получаем авторизованную сессию
-        session = auth.get_auth_session(
-            os.getenv('KNOWDE_EMAIL'),
-            os.getenv('KNOWDE_PASSWORD')
+
+        # Каждый поток стадии получает свою авторизованную сессию
+        resources = PipelineResources(
+            queue,
+            session_factory=lambda: KnowdeAuth().get_auth_session(
+                os.getenv('KNOWDE_EMAIL'),
+                os.getenv('KNOWDE_PASSWORD')
+            ),
+            fetch_documents=os.getenv('FETCH_DOCUMENTS') == '1',
+            # BROWSER_TABS>0: страницы продуктов грузятся вкладками одного Chrome через CDP
+            browser_tabs=int(os.getenv('BROWSER_TABS', 0))
         )
-        
-        if not session:
-            raise Exception("Не удалось получить сессию")
-            
-        # Создаем экстрактор и запускаем обработку
-        extractor = ProductExtractor(storage, session['driver'])
-        extractor.run()  # Бесконечный цикл обработки
-        
+        pipeline = build_pipeline(resources)
+        # Бренды из brands_queue проходят стадии извлечения, загрузки страниц продуктов и сохранения;
+        # PIPELINE_STAGES с refresh_brand - еще и загрузка брендов из refresh_urls_queue (обновления)
+        stages = [name.strip() for name in os.getenv('PIPELINE_STAGES', '').split(',') if name.strip()]
+        pipeline.run_workers(stages or ['extract_products', 'fetch_details', 'persist'])  # Бесконечный цикл обработки
+
     except Exception as e:
         print(f"Ошибка в экстракторе продуктов: {e}")
         raise
     finally:
-        if 'session' in locals() and session.get('driver'):
-            session['driver'].quit()
+        if resources:
+            resources.close()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -10,9 +10,14 @@ sys.path.append(str(project_root))
 from src.parser.brand_parser import BrandParser
 from src.storage.db_storage import DBStorage
 from src.auth.knowde_auth import KnowdeAuth
+from src.queue.crawl_checkpoint import CrawlCheckpoint
+from src.queue.task_queue import TaskQueue
+from src.queue.cluster import create_membership
+from src.fetch.rate_limiter import create_rate_limiter
 
 def main():
     """Основная функция для запуска парсера"""
+    membership = None
     try:
         storage = DBStorage()
         
@@ -28,7 +33,13 @@ def main():
             return
             
         # Инициализация парсера с сессией
-        parser = BrandParser(storage, session)
+        queue = TaskQueue()
+        # COLLECTOR_SHARDING=1: категории делятся между запущенными парсерами
+        membership = create_membership(queue.redis, 'brand_parsers')
+        if membership:
+            membership.start()
+        parser = BrandParser(storage, session, checkpoint=CrawlCheckpoint('brand_parser', queue.redis),
+                             queue=queue, membership=membership, rate_limiter=create_rate_limiter())
             
         # Сбор ссылок на бренды
         parser.collect_brand_links()
@@ -41,6 +52,9 @@ def main():
     except Exception as e:
         print(f"Ошибка при выполнении парсера: {str(e)}")
         sys.exit(1)
+    finally:
+        if membership:
+            membership.stop()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Запуск конвейера обхода.
+
+PIPELINE_MODE:
+    local  - все стадии в одном процессе, начиная со страниц списка брендов
+    seed   - постановка страниц списка брендов в очередь стадии discover
+    worker - воркеры стадий из PIPELINE_STAGES (через запятую, по умолчанию все) поверх Redis
+    reprocess - повторное извлечение продуктов сохраненных брендов в одном процессе
+        (PIPELINE_BRANDS через запятую, по умолчанию все); с HTTP_CACHE=offline - без обращений к сайту
+"""
+import os
+from src.auth.knowde_auth import KnowdeAuth
+from src.queue.task_queue import TaskQueue
+from src.pipeline.knowde_pipeline import PipelineResources, build_pipeline
+from src.monitoring.profiler import get_profiler
+from src.monitoring.tracing import setup_tracing
+
+def main():
+    resources = None
+    # SIGUSR1 - профилирование задач, SIGUSR2 - дамп аллокаций (PROFILE_DIR)
+    get_profiler().install_signal_handlers()
+    # TRACING=1: спаны стадий, запросов к БД, HTTP и команд WebDriver
+    setup_tracing('pipeline')
+    try:
+        queue = TaskQueue()
+        # Каждому потоку со своим браузером нужна отдельная авторизация
+        resources = PipelineResources(
+            queue,
+            session_factory=lambda: KnowdeAuth().get_auth_session(
+                os.getenv('KNOWDE_EMAIL'),
+                os.getenv('KNOWDE_PASSWORD')
+            ),
+            fetch_documents=os.getenv('FETCH_DOCUMENTS') == '1',
+            # BROWSER_TABS>0: страницы продуктов грузятся вкладками одного Chrome через CDP
+            browser_tabs=int(os.getenv('BROWSER_TABS', 0))
+        )
+        pipeline = build_pipeline(resources)
+        mode = os.getenv('PIPELINE_MODE', 'worker')
+
+        if mode == 'reprocess':
+            brands = [name.strip() for name in os.getenv('PIPELINE_BRANDS', '').split(',') if name.strip()]
+            pipeline.run_local(brands or resources.storage().list_brands(), start='extract_products')
+        elif mode == 'local' or mode == 'seed':
+            total_pages = resources.collector().get_total_pages()
+            print(f"Страниц с брендами: {total_pages}")
+            pages = range(1, total_pages + 1)
+            if mode == 'local':
+                pipeline.run_local(pages)
+            else:
+                pipeline.submit(pages)
+        else:
+            stages = [name.strip() for name in os.getenv('PIPELINE_STAGES', '').split(',') if name.strip()]
+            pipeline.run_workers(stages or None, idle_timeout=float(os.getenv('PIPELINE_IDLE_TIMEOUT', 0)))
+
+    except Exception as e:
+        print(f"Ошибка конвейера: {e}")
+        raise
+    finally:
+        if resources:
+            resources.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+"""
+Планировщик обновления брендов.
+
+Бренды ставятся в refresh_urls_queue (стадия refresh_brand конвейера) по ценности
+обновления в пределах REFRESH_BUDGET_PER_HOUR загрузок в час.
+REFRESH_ONCE=1 - один цикл планирования (например, из cron).
+"""
+import os
+from src.storage.db_storage import DBStorage
+from src.queue.task_queue import TaskQueue
+from src.scheduler.refresh_scheduler import RefreshScheduler
+from src.monitoring.tracing import setup_tracing
+
+def main():
+    setup_tracing('refresh-scheduler')
+    try:
+        scheduler = RefreshScheduler.from_env(DBStorage(), TaskQueue())
+        print(f"Планировщик обновлений: бюджет {scheduler.budget_per_hour} брендов в час")
+        if os.getenv('REFRESH_ONCE') == '1':
+            scheduler.run_once()
+        else:
+            scheduler.run()
+
+    except Exception as e:
+        print(f"Ошибка планировщика обновлений: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+import os
+from src.queue.task_queue import TaskQueue
+from src.collector.sitemap_seeder import SitemapSeeder
+from src.monitoring.tracing import setup_tracing
+
+def main():
+    setup_tracing('sitemap-seeder')
+    try:
+        queue = TaskQueue()
+        seeder = SitemapSeeder(
+            queue,
+            sitemap_url=os.getenv('SITEMAP_URL', 'https://www.knowde.com/sitemap.xml')
+        )
+
+        print("Заполнение очереди из sitemap...")
+        seeder.seed(force=os.getenv('SITEMAP_FORCE') == '1')
+
+    except Exception as e:
+        print(f"Ошибка при заполнении очереди из sitemap: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
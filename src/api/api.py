@@ -9,6 +9,11 @@ API endpoints для доступа к данным брендов.
     Получение данных бренда:
     GET /brands/accor
     GET /brands/accor?include_products=true
+    GET /brands/accor?fields=pageProps.name,pageProps.social_links
+
+    Пакетное получение (ответ - потоковый JSON-массив):
+    POST /brands:batch    {"names": ["accor", "basf"], "fields": ["pageProps.name"]}
+    POST /products:batch  {"ids": ["123", "456"], "fields": ["name", "properties.Market"]}
 
     Получение сводки:
     GET /brands/accor/summary
@@ -16,21 +21,119 @@ API endpoints для доступа к данным брендов.
     Поиск продуктов:
     GET /brands/accor/products
     GET /brands/accor/products?category=Surfactants&keyword=natural
+
+    Поиск по числовым характеристикам всех брендов:
+    GET /products/search?spec=viscosity&min=1000&max=2000
+    GET /products/search?spec=viscosity&min=1&max=2&unit=Pa·s
+
+    Фасеты с количеством продуктов:
+    GET /facets
+    GET /facets?filter=Market:Adhesives&filter=Function:Emulsifier&facet=Chemical Family
+
+    Метрики очередей между стадиями (JSON или формат Prometheus):
+    GET /metrics/queues
+    GET /metrics/queues?format=prometheus
+
+    Лента изменений (Server-Sent Events, повтор с заголовка Last-Event-ID или since):
+    GET /changes
+    GET /changes?since=0-0&entity=product
 """
-from fastapi import FastAPI, HTTPException
-from typing import List, Optional
-import uvicorn
+import hashlib
+import os
+import re
+import orjson
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 
 from src.service.brand_service import BrandService
-from src.storage.brand_storage import BrandStorage
+from src.storage.db_storage import DBStorage
 from src.processor.brand_processor import BrandProcessor
+from src.api.compression import CompressionMiddleware
+from src.queue.change_feed import ChangeFeed
+from src.queue.backpressure import QueueMetrics, format_prometheus
+from src.queue.access_stats import AccessStats
+from src.monitoring.profiler import ProfilingMiddleware, get_profiler
+from src.monitoring.tracing import instrument_app, setup_tracing
+
+# orjson вместо стандартного json для всех ответов
+app = FastAPI(title="Knowde Brand Parser API", default_response_class=ORJSONResponse)
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv('API_COMPRESS_MIN_SIZE', 1024))
+)
+# Профиль каждого запроса при PROFILE=1 или после SIGUSR1; выключенный - одна проверка флага
+profiler = get_profiler()
+# Лента изменений - бесконечный поток, ее не профилируем
+app.add_middleware(ProfilingMiddleware, profiler=profiler, exclude_paths=['/changes'])
+# TRACING=1: спаны запросов API и обращений к БД
+if setup_tracing('api'):
+    instrument_app(app)
+
+CACHE_MAX_AGE = int(os.getenv('API_CACHE_MAX_AGE', 60))
+BATCH_MAX_ITEMS = int(os.getenv('API_BATCH_MAX_ITEMS', 1000))
+CHANGES_BLOCK_MS = int(os.getenv('API_CHANGES_BLOCK_MS', 15000))
+STREAM_ID_RE = re.compile(r'^\d+(-\d+)?$')
+
+# Сервисы с подключением к БД создаются при старте приложения, а не при импорте модуля
+storage: Optional[DBStorage] = None
+service: Optional[BrandService] = None
+redis = Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+# Подписчики /changes ждут XREAD в цикле событий, а не в потоках пула
+change_feed = ChangeFeed(redis, stream=os.getenv('CHANGE_FEED_STREAM', 'changes'),
+                         async_redis=AsyncRedis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0')))
+queue_metrics = QueueMetrics(redis)
+# Обращения к брендам повышают их приоритет в планировщике обновлений
+access_stats = AccessStats(redis)
+
+@app.on_event("startup")
+def init_services():
+    """Подключение к базе данных и инициализация сервисов"""
+    global storage, service
+    profiler.install_signal_handlers()
+    storage = DBStorage()
+    service = BrandService(storage, BrandProcessor(storage))
+
+def _cache_headers(etag: str) -> Dict[str, str]:
+    """Заголовки кэширования для ответов с данными бренда"""
+    return {'ETag': etag, 'Cache-Control': f'public, max-age={CACHE_MAX_AGE}', 'Vary': 'Accept-Encoding'}
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Проверка If-None-Match (слабое сравнение)"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    tags = {tag.strip().replace('W/', '', 1) for tag in header.split(',')}
+    return etag.replace('W/', '', 1) in tags
+
+class BrandBatchRequest(BaseModel):
+    names: List[str] = Field(..., min_items=1, max_items=BATCH_MAX_ITEMS)
+    fields: Optional[List[str]] = None
+    include_products: bool = False
 
-app = FastAPI(title="Knowde Brand Parser API")
+class ProductBatchRequest(BaseModel):
+    ids: List[str] = Field(..., min_items=1, max_items=BATCH_MAX_ITEMS)
+    fields: Optional[List[str]] = None
 
-# Инициализация сервисов
-storage = BrandStorage()
-processor = BrandProcessor(storage)
-service = BrandService(storage, processor)
+def _parse_fields(fields: Optional[List[str]]) -> Optional[List[str]]:
+    """Проверка списка полей с ответом 400 на ошибку"""
+    try:
+        return service.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _json_array(rows: Iterator[bytes]) -> Iterator[bytes]:
+    """Склейка готовых JSON-строк в массив без промежуточного списка"""
+    yield b'['
+    for i, row in enumerate(rows):
+        yield row if i == 0 else b',' + row
+    yield b']'
 
 @app.get("/brands/", response_model=List[str])
 async def get_brands():
@@ -38,20 +141,56 @@ async def get_brands():
     return service.list_available_brands()
 
 @app.get("/brands/{brand_name}")
-async def get_brand_data(brand_name: str, include_products: bool = False):
-    """Получение данных о конкретном бренде"""
-    data = service.get_brand_data(brand_name, include_products)
-    if not data:
+async def get_brand_data(brand_name: str, request: Request, include_products: bool = False,
+                         fields: Optional[str] = None):
+    """Получение данных о конкретном бренде (fields - пути через запятую)"""
+    selected = _parse_fields([fields] if fields else None)
+    variant = '-p' if include_products else ''
+    if selected:
+        variant = '-f' + hashlib.md5(','.join(selected).encode('utf-8')).hexdigest()[:8]
+    etag = service.get_brand_etag(brand_name, variant)
+    if etag is None:
+        raise HTTPException(status_code=404, detail="Brand not found")
+    access_stats.record([brand_name])
+    # Клиент уже имеет актуальную версию - тело не загружаем
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+
+    # JSON формируется в PostgreSQL и отдается как есть, без декодирования
+    data = service.get_brand_json(brand_name, include_products, selected)
+    if data is None:
         raise HTTPException(status_code=404, detail="Brand not found")
-    return data
+    return Response(content=data, media_type="application/json", headers=_cache_headers(etag))
+
+@app.post("/brands:batch")
+async def get_brands_batch(batch: BrandBatchRequest):
+    """Пакетное получение брендов; отсутствующие бренды пропускаются"""
+    fields = _parse_fields(batch.fields)
+    access_stats.record(batch.names)
+    rows = service.iter_brands_json(batch.names, fields, batch.include_products)
+    return StreamingResponse(_json_array(rows), media_type="application/json")
+
+@app.post("/products:batch")
+async def get_products_batch(batch: ProductBatchRequest):
+    """Пакетное получение продуктов; отсутствующие продукты пропускаются"""
+    fields = _parse_fields(batch.fields)
+    rows = service.iter_products_json(batch.ids, fields)
+    return StreamingResponse(_json_array(rows), media_type="application/json")
 
 @app.get("/brands/{brand_name}/summary")
-async def get_brand_summary(brand_name: str):
+async def get_brand_summary(brand_name: str, request: Request):
     """Получение краткой сводки о бренде"""
+    etag = service.get_brand_etag(brand_name, '-s')
+    if etag:
+        # Версия есть только у существующего бренда
+        access_stats.record([brand_name])
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers=_cache_headers(etag))
+
     summary = service.get_brand_summary(brand_name)
     if not summary:
         raise HTTPException(status_code=404, detail="Brand not found")
-    return summary
+    return ORJSONResponse(summary, headers=_cache_headers(etag) if etag else None)
 
 @app.get("/brands/{brand_name}/products")
 async def get_brand_products(
@@ -63,7 +202,67 @@ async def get_brand_products(
     products = service.search_products(brand_name, category, keyword)
     if products is None:
         raise HTTPException(status_code=404, detail="Brand not found")
+    access_stats.record([brand_name])
     return products
 
+@app.get("/products/search")
+async def search_products_by_spec(
+    spec: str,
+    min: Optional[float] = None,
+    max: Optional[float] = None,
+    unit: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Поиск продуктов по диапазону числовой характеристики"""
+    return service.search_products_by_spec(spec, min, max, unit, limit)
+
+@app.get("/facets")
+async def get_facets(
+    filter: List[str] = Query([]),
+    facet: Optional[List[str]] = Query(None),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Количество продуктов по значениям фасетов с учетом фильтров"""
+    return service.get_facets(filter, facet, limit)
+
+@app.get("/metrics/queues")
+async def get_queue_metrics(format: str = Query('json', regex='^(json|prometheus)$')):
+    """Глубина очередей и возраст самого старого элемента по стадиям"""
+    snapshot = queue_metrics.snapshot()
+    if format == 'prometheus':
+        return PlainTextResponse(format_prometheus(snapshot), headers={'Cache-Control': 'no-store'})
+    return ORJSONResponse(snapshot, headers={'Cache-Control': 'no-store'})
+
+async def _change_events(request: Request, last_id: str, entity: Optional[str]) -> AsyncIterator[bytes]:
+    """Поток событий ленты в формате text/event-stream"""
+    # Клиенту сообщаем интервал переподключения
+    yield b'retry: 3000\n\n'
+    while not await request.is_disconnected():
+        events = await change_feed.read_async(last_id, count=100, block=CHANGES_BLOCK_MS)
+        if not events:
+            # Комментарий удерживает соединение через прокси
+            yield b': keepalive\n\n'
+            continue
+        for event_id, fields in events:
+            last_id = event_id
+            if entity and fields.get('entity') != entity:
+                continue
+            yield (f"id: {event_id}\nevent: {fields.get('entity')}\n".encode('utf-8')
+                   + b'data: ' + orjson.dumps(fields) + b'\n\n')
+
+@app.get("/changes")
+async def get_changes(request: Request, since: Optional[str] = None, entity: Optional[str] = None):
+    """Подписка на изменения брендов и продуктов (SSE)"""
+    # По умолчанию - только новые события; '0-0' - вся сохраненная лента
+    last_id = request.headers.get('last-event-id') or since or '$'
+    if last_id != '$' and not STREAM_ID_RE.match(last_id):
+        raise HTTPException(status_code=400, detail="Invalid stream offset")
+    if last_id == '$':
+        # '$' в XREAD без блокировки терял бы события между запросами, фиксируем текущий конец ленты
+        last_id = await change_feed.latest_id_async()
+    return StreamingResponse(_change_events(request, last_id, entity), media_type="text/event-stream",
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""ASGI middleware для сжатия ответов (brotli или gzip)."""
+import zlib
+from typing import Dict, Optional
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен, без него используется gzip
+    brotli = None
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Кодировки из Accept-Encoding с их q-значениями"""
+    weights = {}
+    for item in header.split(','):
+        token, _, params = item.partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[token] = q
+    return weights
+
+def choose_encoding(header: str) -> Optional[str]:
+    """Кодировка с наибольшим q (при равенстве - brotli); None, если сжатие не принимается"""
+    weights = parse_accept_encoding(header)
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+
+    def weight(encoding: str) -> float:
+        return weights.get(encoding, weights.get('*', 0.0))
+
+    best = max(candidates, key=weight)
+    return best if weight(best) > 0 else None
+
+def add_vary(headers: MutableHeaders) -> None:
+    """Vary: Accept-Encoding без дублирования"""
+    vary = headers.get('vary')
+    if not vary:
+        headers['Vary'] = 'Accept-Encoding'
+    elif 'accept-encoding' not in [item.strip().lower() for item in vary.split(',')]:
+        headers['Vary'] = f"{vary}, Accept-Encoding"
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class _BrotliCompressor:
+    def __init__(self, quality: int):
+        self._obj = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._obj.process(data) + (self._obj.finish() if final else self._obj.flush())
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        # Ответ зависит от Accept-Encoding и без сжатия: разделяемый кэш не должен
+        # отдавать несжатое тело клиенту с gzip и наоборот
+        await _CompressionResponder(self, encoding)(self.app, scope, receive, send)
+
+    def create_compressor(self, encoding: str):
+        """Создание компрессора для выбранной кодировки"""
+        if encoding == 'br':
+            return _BrotliCompressor(self.brotli_quality)
+        return _GzipCompressor(self.gzip_level)
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: Optional[str]):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, app, scope, receive, send):
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                # Заголовки отправляются вместе с первым фрагментом тела
+                self.start_message = message
+                return
+            if message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+            if self.start_message is not None:
+                start, self.start_message = self.start_message, None
+                headers = MutableHeaders(raw=start['headers'])
+                add_vary(headers)
+                # Поток событий (SSE) отдается без сжатия, чтобы не задерживать события
+                if (self.encoding is None or 'content-encoding' in headers or start['status'] in (204, 304)
+                        or headers.get('content-type', '').startswith('text/event-stream')
+                        or (not more_body and len(body) < self.middleware.minimum_size)):
+                    self.passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                self.compressor = self.middleware.create_compressor(self.encoding)
+                body = self.compressor.compress(body, final=not more_body)
+                headers['Content-Encoding'] = self.encoding
+                if more_body:
+                    # Длина потокового ответа заранее неизвестна
+                    del headers['Content-Length']
+                else:
+                    headers['Content-Length'] = str(len(body))
+                await send(start)
+                await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+                return
+
+            if self.passthrough:
+                await send(message)
+                return
+            body = self.compressor.compress(body, final=not more_body)
+            await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+
+        await app(scope, receive, send_wrapper)
@@ -0,0 +1,158 @@
+"""Асинхронный движок браузера: пул вкладок одного Chrome через CDP (pyppeteer)."""
+import asyncio
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+# Ресурсы, не нужные для извлечения данных: не загружаем их, экономя сеть и память
+BLOCKED_RESOURCES = {'image', 'media', 'font', 'stylesheet'}
+
+class BrowserEngine:
+    def __init__(self, tabs: int = 8, page_timeout: float = 30.0, wait_selector: Optional[str] = None,
+                 selector_timeout: float = 10.0, cookies: Optional[List[Dict]] = None,
+                 user_agent: Optional[str] = None, executable_path: Optional[str] = None):
+        """
+        Args:
+            tabs: Число одновременно открытых вкладок
+            page_timeout: Предел загрузки страницы во вкладке, секунд
+            wait_selector: CSS-селектор, появления которого ждать после загрузки
+            selector_timeout: Предел ожидания селектора, секунд
+            cookies: Cookies авторизованной сессии (формат Selenium)
+        """
+        self.tabs = tabs
+        self.page_timeout = page_timeout
+        self.wait_selector = wait_selector
+        self.selector_timeout = selector_timeout
+        self.cookies = cookies or []
+        self.user_agent = user_agent
+        self.executable_path = executable_path or os.getenv('CHROME_BIN')
+        self._browser = None
+        self._pool: Optional[asyncio.Queue] = None
+        # Создается в цикле движка: в Python 3.9 Lock привязывается к текущему циклу
+        self._start_lock: Optional[asyncio.Lock] = None
+        # Собственный цикл событий в фоне: движком пользуются синхронные стадии
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='cdp-engine', daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_session(cls, session: Dict, **kwargs) -> 'BrowserEngine':
+        """Создание движка с cookies и User-Agent сессии KnowdeAuth"""
+        return cls(cookies=session.get('cookies'), user_agent=session.get('user_agent'), **kwargs)
+
+    def fetch_all(self, urls: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Загрузка страниц во вкладках пула.
+
+        Returns:
+            Dict[str, Optional[str]]: URL -> HTML (None при ошибке загрузки)
+        """
+        future = asyncio.run_coroutine_threadsafe(self._fetch_all(list(dict.fromkeys(urls))), self._loop)
+        return future.result()
+
+    def close(self) -> None:
+        """Закрытие браузера и остановка цикла событий"""
+        if self._browser:
+            asyncio.run_coroutine_threadsafe(self._browser.close(), self._loop).result()
+            self._browser = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    async def _start(self) -> None:
+        """Запуск браузера и открытие вкладок"""
+        # pyppeteer нужен только процессам, которые загружают страницы
+        from pyppeteer import launch
+
+        browser = await launch(
+            headless=True,
+            executablePath=self.executable_path,
+            args=['--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu'],
+            # Браузер запускается не из главного потока
+            handleSIGINT=False, handleSIGTERM=False, handleSIGHUP=False,
+        )
+        try:
+            pool = asyncio.Queue()
+            for _ in range(self.tabs):
+                pool.put_nowait(await self._new_tab(browser))
+        except Exception:
+            await browser.close()
+            raise
+        # Браузер считается запущенным только с полным пулом вкладок
+        self._browser, self._pool = browser, pool
+        print(f"Браузер запущен, вкладок: {self.tabs}")
+
+    async def _new_tab(self, browser=None):
+        """Новая вкладка с cookies сессии и блокировкой лишних ресурсов"""
+        page = await (browser or self._browser).newPage()
+        if self.user_agent:
+            await page.setUserAgent(self.user_agent)
+        if self.cookies:
+            await page.setCookie(*[
+                {key: cookie[key] for key in ('name', 'value', 'domain', 'path') if cookie.get(key)}
+                for cookie in self.cookies
+            ])
+        await page.setRequestInterception(True)
+
+        async def intercept(request):
+            if request.resourceType in BLOCKED_RESOURCES:
+                await request.abort()
+            else:
+                await request.continue_()
+
+        page.on('request', lambda request: asyncio.ensure_future(intercept(request)))
+        return page
+
+    async def _fetch_all(self, urls: List[str]) -> Dict[str, Optional[str]]:
+        # Вызовы из нескольких потоков стадии выполняются в одном цикле: браузер запускает первый
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if not self._browser:
+                await self._start()
+        pages = await asyncio.gather(*(self._fetch(url) for url in urls))
+        return dict(zip(urls, pages))
+
+    async def _fetch(self, url: str) -> Optional[str]:
+        """Загрузка страницы в свободной вкладке"""
+        page = await self._pool.get()
+        if page is None:
+            # Место вкладки, которую не удалось пересоздать раньше
+            page = await self._replace_tab(None)
+            if page is None:
+                self._pool.put_nowait(None)
+                return None
+        try:
+            try:
+                await asyncio.wait_for(page.goto(url, waitUntil='domcontentloaded'), self.page_timeout)
+                if self.wait_selector:
+                    await page.waitForSelector(self.wait_selector, timeout=self.selector_timeout * 1000)
+            except Exception as e:
+                # По таймауту разбираем то, что уже отрисовано (аналог window.stop())
+                print(f"Страница {url} загружена не полностью: {e}")
+            html = await asyncio.wait_for(page.content(), self.page_timeout)
+            self._pool.put_nowait(page)
+            return html
+        except Exception as e:
+            print(f"Ошибка загрузки {url} во вкладке: {e}")
+            # Сломанную вкладку заменяем новой, чтобы пул не уменьшался
+            self._pool.put_nowait(await self._replace_tab(page))
+            return None
+
+    async def _replace_tab(self, page) -> Optional[object]:
+        """
+        Закрытие сломанной вкладки и открытие новой.
+
+        Returns:
+            Новая вкладка или None, если открыть не удалось: в пул кладется None,
+            чтобы ожидающие загрузки не зависли, а вкладку попробовали открыть позже
+        """
+        if page is not None:
+            try:
+                await page.close()
+            except Exception:
+                pass
+        try:
+            return await self._new_tab()
+        except Exception as e:
+            print(f"Не удалось открыть новую вкладку: {e}")
+            return None
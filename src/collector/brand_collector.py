@@ -1,59 +1,202 @@
 """Модуль для сбора и обработки брендов."""
-from typing import List, Dict, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from src.storage.db_storage import DBStorage
 from src.queue.task_queue import TaskQueue
+from src.queue.crawl_checkpoint import CrawlCheckpoint
+from src.queue.backpressure import Watermarks
+from src.queue.cluster import ClusterMembership
+from src.monitoring.tracing import current_context, pop_contexts, span
 import time
 import json
 
 class BrandCollector:
-    def __init__(self, storage: DBStorage, queue: TaskQueue, driver: WebDriver):
+    def __init__(self, storage: DBStorage, queue: TaskQueue, driver: WebDriver,
+                 checkpoint: Optional[CrawlCheckpoint] = None, watermarks: Optional[Watermarks] = None,
+                 membership: Optional[ClusterMembership] = None, rate_limiter=None):
         self.storage = storage
         self.queue = queue
         self.driver = driver
+        self.checkpoint = checkpoint
+        # Пауза, когда экстракторы не успевают разбирать brands_queue
+        self.watermarks = watermarks
+        # Страницы списка делятся между узлами группы консистентным хэшированием
+        self.membership = membership
+        # Общий бюджет запросов всех узлов (RateLimiter/RedisRateLimiter)
+        self.rate_limiter = rate_limiter
+        self.total_pages = 0
         self.base_url = "https://www.knowde.com/b/markets-adhesives-sealants/brands"
 
-    def get_brands(self) -> List[Dict]:
-        """Получение списка всех брендов"""
-        brands = []
-        page = 1
-        total_pages = self._get_total_pages()
+    def iter_brands(self, window: int = 0) -> Iterator[Dict]:
+        """
+        Потоковый обход всех брендов.
+
+        Args:
+            window: Сколько брендов может ожидать сохранения в фоне (0 - сохранять синхронно).
+                Ограничивает число одновременно хранимых в памяти payload'ов.
+        Yields:
+            Dict: Облегченный результат обработки бренда (имя и статус)
+        """
+        completed = self.checkpoint.completed_brands() if self.checkpoint else set()
+        self.total_pages = total_pages = self.get_total_pages()
         
         print(f"Собрано {total_pages} страниц с брендами")
+
+        # Один поток сохранения: DBStorage использует одно соединение
+        executor = ThreadPoolExecutor(max_workers=1) if window > 0 else None
+        in_flight = deque()
+        try:
+            for page in self._iter_pages(total_pages):
+                print(f"\nОбработка страницы {page} из {total_pages}: {self.base_url}/{page}")
+                brand_urls = self.collect_page(page, exclude=completed)
+
+                # Обрабатываем каждый бренд
+                page_brands = []
+                for brand_url in brand_urls:
+                    if self.watermarks:
+                        self.watermarks.wait()
+                    with span('collector.brand', **{'url.full': brand_url}):
+                        fetched = self._fetch_brand(brand_url)
+                        # Сохранение может идти в другом потоке: контекст передаем явно
+                        trace_parent = current_context()
+                    if not fetched:
+                        # Захват снимаем, чтобы бренд повторили при возобновлении обхода
+                        self.queue.release_brands([brand_url.split('/')[-1]])
+                        yield {'name': brand_url.split('/')[-1], 'status': 'failed'}
+                        continue
+
+                    if executor:
+                        in_flight.append(executor.submit(self._persist_brand, *fetched, trace_parent))
+                        # Ждем самый старый бренд, если окно заполнено
+                        while len(in_flight) >= window:
+                            result = in_flight.popleft().result()
+                            if result['status'] == 'saved':
+                                page_brands.append(result['name'])
+                            yield result
+                    else:
+                        result = self._persist_brand(*fetched, trace_parent)
+                        if result['status'] == 'saved':
+                            page_brands.append(result['name'])
+                        yield result
+                    del fetched
+
+                # Курсор фиксируем только после сохранения всех брендов страницы
+                while in_flight:
+                    result = in_flight.popleft().result()
+                    if result['status'] == 'saved':
+                        page_brands.append(result['name'])
+                    yield result
+
+                if self.checkpoint and self.membership:
+                    # При шардировании страницы завершаются в произвольном порядке
+                    self.checkpoint.commit_page(self._page_url(page), page, page_brands)
+                    self.checkpoint.complete_category(self._page_url(page))
+                elif self.checkpoint:
+                    self.checkpoint.commit_page(self.base_url, page, page_brands)
+                
+                time.sleep(2)  # Небольшая пауза между страницами
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+
+    def _page_url(self, page: int) -> str:
+        return f"{self.base_url}/{page}"
+
+    def _is_page_done(self, page_url: str) -> bool:
+        return bool(self.checkpoint and self.checkpoint.is_category_done(page_url))
+
+    def _iter_pages(self, total_pages: int) -> Iterator[int]:
+        """Номера страниц списка: все по порядку от курсора или только свои при шардировании"""
+        if self.membership:
+            urls = {self._page_url(page): page for page in range(1, total_pages + 1)}
+            for page_url in self.membership.iter_owned(list(urls), self._is_page_done):
+                yield urls[page_url]
+            return
+
+        page = self.checkpoint.get_page_cursor(self.base_url) + 1 if self.checkpoint else 1
+        if page > 1:
+            print(f"Возобновление обхода со страницы {page}")
+        yield from range(page, total_pages + 1)
+
+    def is_crawl_complete(self) -> bool:
+        """Все ли страницы обработаны (при шардировании - всеми узлами группы)"""
+        if not self.membership:
+            return True
+        return all(self._is_page_done(self._page_url(page)) for page in range(1, self.total_pages + 1))
+
+    def collect_page(self, page: int, exclude: Optional[Set[str]] = None) -> List[str]:
+        """
+        Ссылки на бренды страницы списка, захваченные этим коллектором.
+
+        Args:
+            page: Номер страницы списка брендов
+            exclude: Бренды, уже обработанные в текущем обходе
+        """
+        # Загружаем страницу
+        self._throttle()
+        self.driver.get(self._page_url(page))
         
-        while page <= total_pages:
-            print(f"\nОбработка страницы {page} из {total_pages}: {self.base_url}/{page}")
-            
-            # Загружаем страницу
-            self.driver.get(f"{self.base_url}/{page}")
-            
-            # Ждем загрузки брендов
-            WebDriverWait(self.driver, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='/stores/'][href*='/brands/']"))
-            )
-            
-            # Получаем ссылки на бренды
-            brand_links = self.driver.find_elements(By.CSS_SELECTOR, "a[href*='/stores/'][href*='/brands/']")
-            brand_urls = [link.get_attribute('href') for link in brand_links]
-            
-            print(f"Найдено {len(brand_urls)} новых брендов на странице {page}")
-            
-            # Обрабатываем каждый бренд
-            for brand_url in brand_urls:
-                brand_data = self._process_brand(brand_url)
-                if brand_data:
-                    brands.append(brand_data)
-            
-            page += 1
-            time.sleep(2)  # Небольшая пауза между страницами
-            
-        return brands
+        # Ждем загрузки брендов
+        WebDriverWait(self.driver, 20).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='/stores/'][href*='/brands/']"))
+        )
+        
+        # Получаем ссылки на бренды
+        brand_links = self.driver.find_elements(By.CSS_SELECTOR, "a[href*='/stores/'][href*='/brands/']")
+        brand_urls = [link.get_attribute('href') for link in brand_links]
+        
+        print(f"Найдено {len(brand_urls)} новых брендов на странице {page}")
+        
+        # Оставляем только бренды, не взятые другими коллекторами
+        exclude = exclude or set()
+        names = [url.split('/')[-1] for url in brand_urls if url.split('/')[-1] not in exclude]
+        claimed = set(self.queue.claim_brands(names))
+        return [url for url in brand_urls if url.split('/')[-1] in claimed]
+
+    def collect_brand(self, brand_url: str) -> Optional[str]:
+        """
+        Загрузка и сохранение бренда без постановки в очередь (очередью управляет конвейер).
+
+        Returns:
+            Optional[str]: Имя бренда, если его продукты нужно извлечь заново
+        """
+        fetched = self._fetch_brand(brand_url)
+        if not fetched:
+            self.queue.release_brands([brand_url.split('/')[-1]])
+            return None
+        brand_name, data = fetched
+        changed = self.storage.save_brand_data(brand_name, data)
+        if changed is None:
+            self.queue.release_brands([brand_name])
+            raise RuntimeError(f"Не удалось сохранить бренд {brand_name}")
+        self.queue.confirm_brands([brand_name])
+        self._mark_url_seen(brand_url)
+        return brand_name if self._needs_extraction(brand_name, changed) else None
 
-    def _get_total_pages(self) -> int:
+    def _mark_url_seen(self, brand_url: str) -> None:
+        """lastmod из sitemap засчитывается только сохраненному бренду"""
+        self.queue.mark_url_seen('brand', brand_url, self.queue.take_pending_lastmod('brand', brand_url))
+
+    def _needs_extraction(self, brand_name: str, changed: bool) -> bool:
+        """Продукты извлекаются заново, если payload изменился или прошлое извлечение не завершено"""
+        if changed or not self.storage.is_brand_products_extracted(brand_name):
+            return True
+        print(f"Бренд {brand_name} не изменился, извлечение продуктов не требуется")
+        return False
+
+    def _throttle(self) -> None:
+        """Ожидание разрешения общего лимита запросов"""
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+
+    def get_total_pages(self) -> int:
         """Получение общего количества страниц с брендами"""
+        self._throttle()
         self.driver.get(self.base_url)
         try:
             # Ждем загрузки пагинации
@@ -70,12 +213,32 @@ class BrandCollector:
             print(f"Ошибка при получении количества страниц: {e}")
         return 1
 
-    def _process_brand(self, brand_url: str) -> Optional[Dict]:
-        """Обработка отдельного бренда"""
+    def _process_brand(self, brand_url: str, trace_parent: Optional[str] = None) -> Optional[Dict]:
+        """
+        Обработка отдельного бренда.
+
+        Args:
+            brand_url: URL страницы бренда
+            trace_parent: Контекст трассировки из очереди URL (от SitemapSeeder)
+        """
+        # Трассировка бренда начинается здесь и продолжается в экстракторе через brands_queue
+        with span('collector.brand', parent=trace_parent, **{'url.full': brand_url}):
+            fetched = self._fetch_brand(brand_url)
+            if not fetched:
+                return None
+            result = self._persist_brand(*fetched)
+            if result['status'] != 'saved':
+                return None
+            self._mark_url_seen(brand_url)
+            return result
+
+    def _fetch_brand(self, brand_url: str) -> Optional[Tuple[str, Dict]]:
+        """Загрузка __NEXT_DATA__ страницы бренда"""
         try:
             brand_name = brand_url.split('/')[-1]
             print(f"\nОбработка бренда: {brand_url}")
             
+            self._throttle()
             self.driver.get(brand_url)
             
             # Ждем загрузки данных
@@ -85,27 +248,72 @@ class BrandCollector:
             
             # Получаем данные из script тега
             script = self.driver.find_element(By.CSS_SELECTOR, "script#__NEXT_DATA__")
-            data = json.loads(script.get_attribute('innerHTML'))
-            
-            # Сохраняем данные бренда
-            self.storage.save_brand_data(brand_name, data)
-            
-            # Добавляем в очередь на обработку продуктов
-            self.queue.enqueue_brand_for_processing(brand_name)
-            
-            print(f"Бренд {brand_name} успешно обработан и сохранен")
-            return {'name': brand_name, 'data': data}
+            return brand_name, json.loads(script.get_attribute('innerHTML'))
             
         except Exception as e:
             print(f"Ошибка при обработке бренда {brand_url}: {e}")
             return None
 
-    def process_brands(self):
+    def _persist_brand(self, brand_name: str, data: Dict, trace_parent: Optional[str] = None) -> Dict:
+        """Сохранение данных бренда и постановка в очередь на извлечение продуктов"""
+        try:
+            with span('collector.persist_brand', parent=trace_parent, brand=brand_name):
+                changed = self.storage.save_brand_data(brand_name, data)
+                if changed is None:
+                    raise RuntimeError("данные не сохранены")
+                # Измененный бренд ставится заново, даже если уже обрабатывался
+                if self._needs_extraction(brand_name, changed):
+                    self.queue.enqueue_brand_for_processing(brand_name, force=True)
+            self.queue.confirm_brands([brand_name])
+            print(f"Бренд {brand_name} успешно обработан и сохранен")
+            return {'name': brand_name, 'status': 'saved'}
+        except Exception as e:
+            print(f"Ошибка при сохранении бренда {brand_name}: {e}")
+            self.queue.release_brands([brand_name])
+            return {'name': brand_name, 'status': 'failed'}
+
+    def process_frontier(self, idle_timeout: int = 60) -> int:
+        """
+        Обработка брендов из очереди URL, заполненной SitemapSeeder.
+
+        Args:
+            idle_timeout: Сколько секунд ждать новые URL перед завершением
+        Returns:
+            int: Количество обработанных брендов
+        """
+        processed = 0
+        idle = 0
+        while idle < idle_timeout:
+            brand_url = self.queue.get_next_url('brand')
+            if not brand_url:
+                time.sleep(5)
+                idle += 5
+                continue
+
+            idle = 0
+            trace_parent, = pop_contexts(self.queue.redis, 'brand_urls_queue', [brand_url])
+            if self.watermarks:
+                self.watermarks.wait()
+            if self._process_brand(brand_url, trace_parent):
+                processed += 1
+            time.sleep(2)  # Небольшая пауза между брендами
+
+        print(f"\nВсего обработано брендов из sitemap: {processed}")
+        return processed
+
+    def process_brands(self, window: int = 0) -> Dict[str, int]:
         """Обработка брендов"""
         try:
-            brands = self.get_brands()
-            print(f"\nВсего обработано брендов: {len(brands)}")
-            return brands
+            stats = {'saved': 0, 'failed': 0}
+            for result in self.iter_brands(window=window):
+                stats[result['status']] += 1
+            print(f"\nВсего обработано брендов: {stats['saved']}, ошибок: {stats['failed']}")
+            if self.checkpoint and self.is_crawl_complete():
+                # Обход завершен, следующий запуск начнется с начала: захваты брендов
+                # (confirmed_ttl сутки) иначе пропустили бы их при повторном обходе
+                self.checkpoint.reset()
+                self.queue.reset_brand_claims()
+            return stats
         except Exception as e:
             print(f"Ошибка при обработке брендов: {e}")
-            raise 
\ No newline at end of file
+            raise
@@ -0,0 +1,105 @@
+"""Модуль для заполнения очереди брендов из sitemap.xml."""
+import gzip
+import io
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+import requests
+from src.queue.task_queue import TaskQueue
+
+BRAND_URL_RE = re.compile(r'^https?://[^/]+/stores/[^/]+/brands/[^/]+/?$')
+
+class SitemapSeeder:
+    def __init__(self, queue: TaskQueue, sitemap_url: str = "https://www.knowde.com/sitemap.xml",
+                 batch_size: int = 500, timeout: int = 60):
+        self.queue = queue
+        self.sitemap_url = sitemap_url
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+    def seed(self, force: bool = False) -> Dict[str, int]:
+        """
+        Обходит sitemap (включая вложенные .gz) и ставит в очередь изменившиеся URL брендов.
+
+        URL продуктов пропускаются: у очереди продуктов нет потребителя, продукты
+        извлекаются из данных бренда.
+
+        Args:
+            force: Обходить вложенные sitemap даже если их lastmod не изменился
+        Returns:
+            Dict: Количество найденных и поставленных в очередь брендов и sitemap с ошибками
+        """
+        stats = {'brand_found': 0, 'brand_enqueued': 0, 'sitemap_failed': 0}
+        self._seed_sitemap(self.sitemap_url, force, stats)
+        print(f"Sitemap обработан: {stats}")
+        return stats
+
+    def _seed_sitemap(self, sitemap_url: str, force: bool, stats: Dict[str, int]) -> bool:
+        """
+        Обход одного sitemap и вложенных в него с пропуском неизменившихся.
+
+        Returns:
+            bool: True, если файл и все обойденные вложенные разобраны без ошибок
+        """
+        batch: List[Tuple[str, Optional[str]]] = []
+        children = []
+        complete = True
+        try:
+            for tag, loc, lastmod in self._iter_entries(sitemap_url):
+                if tag == 'sitemap':
+                    # Вложенные sitemap обходим после закрытия текущего потока
+                    children.append((loc, lastmod))
+                elif BRAND_URL_RE.match(loc):
+                    stats['brand_found'] += 1
+                    batch.append((loc, lastmod))
+                    if len(batch) >= self.batch_size:
+                        stats['brand_enqueued'] += self.queue.enqueue_changed_urls('brand', batch)
+                        batch = []
+        except Exception as e:
+            print(f"Ошибка при обработке sitemap {sitemap_url}: {e}")
+            stats['sitemap_failed'] += 1
+            complete = False
+        # Уже разобранные URL ставим в очередь и при ошибке: их lastmod верен
+        if batch:
+            stats['brand_enqueued'] += self.queue.enqueue_changed_urls('brand', batch)
+
+        for loc, lastmod in children:
+            if not force and lastmod and not self.queue.is_url_changed('sitemap', loc, lastmod):
+                print(f"Sitemap {loc} не изменился, пропускаем")
+                continue
+            # lastmod фиксируем только после чистого разбора и постановки всех URL файла,
+            # иначе следующий обход пропустит недочитанный sitemap
+            if self._seed_sitemap(loc, force, stats):
+                self.queue.mark_url_seen('sitemap', loc, lastmod)
+            else:
+                complete = False
+        return complete
+
+    def _iter_entries(self, sitemap_url: str) -> Iterator[Tuple[str, str, Optional[str]]]:
+        """Потоковый разбор одного sitemap-файла: (sitemap|url, loc, lastmod); ошибки не перехватываются"""
+        print(f"Загрузка sitemap: {sitemap_url}")
+        with requests.get(sitemap_url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            stream = io.BufferedReader(response.raw)
+            # .gz файлы отдаются как бинарные данные без Content-Encoding
+            if stream.peek(2)[:2] == b'\x1f\x8b':
+                stream = gzip.GzipFile(fileobj=stream)
+
+            loc, lastmod = None, None
+            context = iterparse(stream, events=('start', 'end'))
+            _, root = next(context)
+            for event, elem in context:
+                if event != 'end':
+                    continue
+                tag = elem.tag.rsplit('}', 1)[-1]
+                if tag == 'loc':
+                    loc = (elem.text or '').strip()
+                elif tag == 'lastmod':
+                    lastmod = (elem.text or '').strip() or None
+                elif tag in ('url', 'sitemap'):
+                    if loc:
+                        yield tag, loc, lastmod
+                    loc, lastmod = None, None
+                    # Освобождаем уже разобранные элементы
+                    root.clear()
@@ -0,0 +1,162 @@
+"""
+Локальный дисковый кэш ответов (SQLite) для разработки и повторной обработки.
+
+HTTP_CACHE:
+    off     - кэш выключен (по умолчанию)
+    on      - ответы берутся из кэша, промахи загружаются из сети и сохраняются
+    offline - только кэш: промах считается ошибкой загрузки, сеть не используется
+
+Ключ - URL, вид ответа (http - ответ HttpClient, rendered - HTML страницы после
+отрисовки в браузере) и HTTP_CACHE_BUILD: новая сборка (например, buildId сайта
+или версия парсера) не видит ответы старой. Записи старше HTTP_CACHE_TTL секунд
+считаются промахом (кроме режима offline), при превышении HTTP_CACHE_MAX_MB
+вытесняются давно не читавшиеся.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+import orjson
+import zstandard
+
+HTTP = 'http'
+RENDERED = 'rendered'
+
+class HttpCache:
+    def __init__(self, path: str = 'data/http_cache.sqlite', ttl: float = 7*24*3600,
+                 max_bytes: int = 2 * 1024**3, build: str = '', offline: bool = False):
+        """
+        Args:
+            path: Файл базы SQLite
+            ttl: Срок годности записи, секунд (0 - без срока)
+            max_bytes: Предел суммарного размера сжатых ответов
+            build: Версия, входящая в ключ
+            offline: Режим только кэша
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.build = build
+        self.offline = offline
+        self.compressor = zstandard.ZstdCompressor(level=3)
+        self.decompressor = zstandard.ZstdDecompressor()
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Одно соединение на процесс; параллельные процессы разделяет WAL и busy_timeout
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                build TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (url, kind, build)
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed_idx ON responses (accessed_at);
+        """)
+
+    def get(self, url: str, kind: str = HTTP) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+        """
+        Ответ из кэша.
+
+        Returns:
+            Optional[Tuple]: (статус, заголовки, тело) или None при промахе
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT status, headers, body, fetched_at FROM responses WHERE url = ? AND kind = ? AND build = ?",
+                (url, kind, self.build)
+            ).fetchone()
+            if not row:
+                return None
+            status, headers, body, fetched_at = row
+            if self.ttl and not self.offline and time.time() - fetched_at > self.ttl:
+                return None
+            # Время чтения - порядок вытеснения
+            self.conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE url = ? AND kind = ? AND build = ?",
+                (time.time(), url, kind, self.build)
+            )
+        return status, orjson.loads(headers), self.decompressor.decompress(body)
+
+    def get_many(self, urls: Iterable[str], kind: str = HTTP) -> Dict[str, bytes]:
+        """Тела найденных в кэше ответов: URL -> тело"""
+        found = {}
+        for url in urls:
+            cached = self.get(url, kind)
+            if cached:
+                found[url] = cached[2]
+        return found
+
+    def put(self, url: str, body: bytes, kind: str = HTTP, status: int = 200,
+            headers: Optional[Dict[str, str]] = None) -> None:
+        """Сохранение ответа с вытеснением давно не читавшихся при превышении размера"""
+        compressed = self.compressor.compress(body)
+        now = time.time()
+        with self._lock:
+            previous = self.conn.execute(
+                "SELECT size FROM responses WHERE url = ? AND kind = ? AND build = ?",
+                (url, kind, self.build)
+            ).fetchone()
+            self.conn.execute("""
+                INSERT OR REPLACE INTO responses
+                    (url, kind, build, status, headers, body, size, fetched_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (url, kind, self.build, status, orjson.dumps(headers or {}).decode('utf-8'),
+                  compressed, len(compressed), now, now))
+            if self._size is None:
+                self._size = self._total_size()
+            else:
+                self._size += len(compressed) - (previous[0] if previous else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _total_size(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self) -> None:
+        """Удаление давно не читавшихся записей до 90% предела"""
+        target = int(self.max_bytes * 0.9)
+        # Размер пересчитываем: в тот же файл могли писать другие процессы
+        self._size = self._total_size()
+        excess = self._size - target
+        victims = []
+        for rowid, size in self.conn.execute("SELECT rowid, size FROM responses ORDER BY accessed_at"):
+            if excess <= 0:
+                break
+            victims.append((rowid,))
+            excess -= size
+        self.conn.executemany("DELETE FROM responses WHERE rowid = ?", victims)
+        self._size = self._total_size()
+        print(f"HTTP-кэш: вытеснены старые записи, размер {self._size / 1024**2:.0f} MB")
+
+_cache: Optional[HttpCache] = None
+_cache_lock = threading.Lock()
+
+def create_http_cache() -> Optional[HttpCache]:
+    """Общий для процесса кэш по переменным окружения (None, если HTTP_CACHE выключен)"""
+    global _cache
+    mode = os.getenv('HTTP_CACHE', 'off')
+    if mode not in ('on', 'offline'):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache(
+                path=os.getenv('HTTP_CACHE_PATH', 'data/http_cache.sqlite'),
+                ttl=float(os.getenv('HTTP_CACHE_TTL', 7*24*3600)),
+                max_bytes=int(float(os.getenv('HTTP_CACHE_MAX_MB', 2048)) * 1024**2),
+                build=os.getenv('HTTP_CACHE_BUILD', ''),
+                offline=mode == 'offline',
+            )
+            print(f"HTTP-кэш: {_cache.path} (режим {mode})")
+    return _cache
@@ -0,0 +1,82 @@
+"""HTTP-клиент для загрузки JSON и документов с Knowde."""
+import random
+import time
+from typing import Dict, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from src.fetch.http_cache import HTTP, HttpCache, create_http_cache
+from src.fetch.rate_limiter import RateLimiter, create_rate_limiter
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class HttpClient:
+    def __init__(self, rate_limiter: Optional[RateLimiter] = None, cookies: Optional[List[Dict]] = None,
+                 user_agent: Optional[str] = None, max_retries: int = 3, timeout: int = 30,
+                 pool_size: int = 16, cache: Optional[HttpCache] = None):
+        self.rate_limiter = rate_limiter or create_rate_limiter()
+        # Дисковый кэш ответов для повторных прогонов (HTTP_CACHE=on/offline)
+        self.cache = cache or create_http_cache()
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        # Cookies авторизованной сессии Selenium
+        for cookie in cookies or []:
+            self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'))
+
+    @classmethod
+    def from_session(cls, session: Dict, **kwargs) -> 'HttpClient':
+        """Создание клиента из сессии KnowdeAuth"""
+        return cls(cookies=session.get('cookies'), user_agent=session.get('user_agent'), **kwargs)
+
+    def get(self, url: str, **kwargs) -> Optional[requests.Response]:
+        """GET с ограничением частоты и повторами при 429/5xx"""
+        # Потоковые и условные запросы (документы) не кэшируются
+        cacheable = self.cache is not None and not kwargs
+        if cacheable:
+            cached = self.cache.get(url, HTTP)
+            if cached:
+                return self._cached_response(url, *cached)
+            if self.cache.offline:
+                print(f"Нет в HTTP-кэше (режим offline): {url}")
+                return None
+
+        for attempt in range(self.max_retries):
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, timeout=self.timeout, **kwargs)
+            except requests.RequestException as e:
+                print(f"Попытка {attempt + 1} из {self.max_retries} не удалась для {url}: {e}")
+                time.sleep(random.uniform(2, 5) * (attempt + 1))
+                continue
+
+            if response.status_code in RETRY_STATUSES:
+                retry_after = response.headers.get('Retry-After', '')
+                delay = int(retry_after) if retry_after.isdigit() else random.uniform(5, 10) * (attempt + 1)
+                print(f"Получен статус {response.status_code} для {url}, ждем {delay:.0f} с")
+                response.close()
+                time.sleep(delay)
+                continue
+            if cacheable and response.status_code == 200:
+                self.cache.put(url, response.content, HTTP, response.status_code,
+                               {key: value for key, value in response.headers.items()
+                                if key.lower() in ('content-type', 'etag', 'last-modified')})
+            return response
+        return None
+
+    @staticmethod
+    def _cached_response(url: str, status: int, headers: Dict[str, str], body: bytes) -> requests.Response:
+        """Ответ requests из записи кэша"""
+        response = requests.Response()
+        response.url = url
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = body
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
@@ -0,0 +1,85 @@
+"""Модуль ограничения частоты запросов."""
+import os
+import threading
+import time
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate: Допустимое число запросов в секунду
+            burst: Сколько запросов можно выполнить подряд без ожидания
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Ожидание разрешения на очередной запрос (token bucket)"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            # Резервируем токен сразу, чтобы параллельные потоки ждали по очереди
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+# KEYS[1] - состояние ведра; ARGV[1] - запросов в секунду, ARGV[2] - burst.
+# Время берется на сервере Redis, чтобы часы узлов не влияли на бюджет.
+ACQUIRE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or burst
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated_at) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+if tokens < 0 then
+    return tostring(-tokens / rate)
+end
+return '0'
+"""
+
+class RedisRateLimiter:
+    def __init__(self, redis, key: str, rate: float, burst: int = 1):
+        """
+        Общий для всех узлов token bucket в Redis.
+
+        Args:
+            key: Ключ бюджета (один на сайт)
+            rate: Допустимое число запросов в секунду для всех узлов вместе
+        """
+        self.redis = redis
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+        self._script = redis.register_script(ACQUIRE_SCRIPT)
+        # При недоступности Redis каждый узел ограничивает себя локально
+        self._fallback = RateLimiter(rate, burst)
+
+    def acquire(self) -> None:
+        """Резервирование запроса в общем бюджете и ожидание своей очереди"""
+        try:
+            wait = float(self._script(keys=[self.key], args=[self.rate, self.burst]))
+        except Exception as e:
+            print(f"Общий лимит запросов недоступен, используем локальный: {e}")
+            self._fallback.acquire()
+            return
+        if wait > 0:
+            time.sleep(wait)
+
+def create_rate_limiter():
+    """Общий лимит при заданном GLOBAL_FETCH_RATE, иначе локальный FETCH_RATE"""
+    global_rate = float(os.getenv('GLOBAL_FETCH_RATE', 0))
+    if global_rate > 0:
+        from redis import Redis
+        redis = Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+        return RedisRateLimiter(redis, 'rate:knowde', global_rate, int(os.getenv('GLOBAL_FETCH_BURST', 1)))
+    return RateLimiter(float(os.getenv('FETCH_RATE', 2)))
@@ -0,0 +1,206 @@
+"""
+Профилирование по требованию для воркеров и API.
+
+Включение:
+    PROFILE=1            - профиль каждой задачи бренда и каждого запроса API
+    kill -USR1 <pid>     - включение/выключение профилирования без перезапуска
+    TRACEMALLOC=1        - учет аллокаций с запуска процесса
+    kill -USR2 <pid>     - дамп top-N аллокаций (первый сигнал запускает tracemalloc)
+
+Файлы пишутся в PROFILE_DIR (по умолчанию data/profiles):
+    *.speedscope.json - pyinstrument, открывается в https://www.speedscope.app
+    *.prof            - cProfile (если pyinstrument не установлен), flameprof/snakeviz
+    *.alloc.txt       - top-N аллокаций tracemalloc и прирост с прошлого дампа
+"""
+import os
+import re
+import signal
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+_UNSAFE_CHARS = re.compile(r'[^\w.-]+')
+_DISABLED = nullcontext()
+
+def _load_pyinstrument():
+    """pyinstrument импортируется при первом профиле: выключенные хуки не замедляют запуск"""
+    try:
+        from pyinstrument import Profiler as SamplingProfiler
+        from pyinstrument.renderers import SpeedscopeRenderer
+    except ImportError:  # pyinstrument не обязателен, без него используется cProfile
+        return None
+    return SamplingProfiler, SpeedscopeRenderer
+
+class Profiler:
+    def __init__(self, output_dir: str = 'data/profiles', enabled: bool = False,
+                 min_duration: float = 0.0, interval: float = 0.001, top: int = 30):
+        """
+        Args:
+            output_dir: Каталог для файлов профилей
+            enabled: Профилировать сразу, без сигнала
+            min_duration: Не сохранять профили задач быстрее стольких секунд
+            interval: Интервал выборки pyinstrument, секунд
+            top: Число строк в дампе аллокаций
+        """
+        self.output_dir = Path(output_dir)
+        self.enabled = enabled
+        self.min_duration = min_duration
+        self.interval = interval
+        self.top = top
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'Profiler':
+        return cls(
+            output_dir=os.getenv('PROFILE_DIR', 'data/profiles'),
+            enabled=os.getenv('PROFILE') == '1',
+            min_duration=float(os.getenv('PROFILE_MIN_DURATION', 0)),
+            interval=float(os.getenv('PROFILE_INTERVAL', 0.001)),
+            top=int(os.getenv('TRACEMALLOC_TOP', 30)),
+        )
+
+    def profile(self, kind: str, name: str = '', async_mode: bool = False):
+        """
+        Контекст профилирования задачи; при выключенном профилировании - пустой контекст.
+
+        Args:
+            kind: Тип задачи (brand, request, ...), начало имени файла
+            name: Имя задачи (бренд, путь запроса)
+            async_mode: Профилировать корутину (для cProfile в профиль попадут
+                и другие задачи цикла событий)
+        """
+        if not self.enabled:
+            return _DISABLED
+        return self._profile(kind, name, async_mode)
+
+    @contextmanager
+    def _profile(self, kind: str, name: str, async_mode: bool) -> Iterator[None]:
+        started = time.perf_counter()
+        pyinstrument = _load_pyinstrument()
+        if pyinstrument is not None:
+            SamplingProfiler, SpeedscopeRenderer = pyinstrument
+            sampler = SamplingProfiler(interval=self.interval, async_mode='enabled' if async_mode else 'disabled')
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stop()
+                if time.perf_counter() - started >= self.min_duration:
+                    path = self._path(kind, name, 'speedscope.json')
+                    path.write_text(sampler.output(SpeedscopeRenderer()), encoding='utf-8')
+            return
+
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # В потоке уже работает другой профилировщик (вложенная задача)
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            if time.perf_counter() - started >= self.min_duration:
+                profile.dump_stats(str(self._path(kind, name, 'prof')))
+
+    def toggle(self) -> bool:
+        """Включение/выключение профилирования задач"""
+        self.enabled = not self.enabled
+        print(f"Профилирование {'включено' if self.enabled else 'выключено'}, каталог: {self.output_dir}")
+        return self.enabled
+
+    def start_tracemalloc(self, frames: int = 10) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            print(f"tracemalloc запущен (кадров: {frames})")
+
+    def dump_allocations(self) -> Optional[Path]:
+        """
+        Дамп top-N мест аллокаций и прироста с предыдущего дампа.
+
+        Returns:
+            Optional[Path]: Путь к файлу или None, если tracemalloc только что запущен
+        """
+        if not tracemalloc.is_tracing():
+            self.start_tracemalloc()
+            return None
+        with self._lock:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ))
+            current, peak = tracemalloc.get_traced_memory()
+            lines = [f"traced: {current / 1024 / 1024:.1f} MiB, peak: {peak / 1024 / 1024:.1f} MiB", '',
+                     f"Top {self.top} по строкам:"]
+            lines += [str(stat) for stat in snapshot.statistics('lineno')[:self.top]]
+            if self._snapshot is not None:
+                lines += ['', f"Top {self.top} прироста с прошлого дампа:"]
+                lines += [str(stat) for stat in snapshot.compare_to(self._snapshot, 'lineno')[:self.top]]
+            self._snapshot = snapshot
+        path = self._path('alloc', '', 'alloc.txt')
+        path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        print(f"Дамп аллокаций: {path}")
+        return path
+
+    def install_signal_handlers(self) -> bool:
+        """
+        SIGUSR1 - переключение профилирования, SIGUSR2 - дамп аллокаций.
+
+        Returns:
+            bool: Обработчики установлены (только в главном потоке и не в Windows)
+        """
+        if not hasattr(signal, 'SIGUSR1'):
+            return False
+        try:
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.toggle())
+            # Дамп пишется из потока: обработчик сигнала не должен надолго блокировать главный поток
+            signal.signal(signal.SIGUSR2, lambda signum, frame: threading.Thread(
+                target=self.dump_allocations, name='tracemalloc-dump', daemon=True).start())
+        except ValueError:
+            return False
+        return True
+
+    def _path(self, kind: str, name: str, extension: str) -> Path:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        name = _UNSAFE_CHARS.sub('_', name).strip('_')[:80]
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        parts = [kind, name, f'{stamp}{int(time.time() * 1000) % 1000:03d}', str(os.getpid()),
+                 str(threading.get_ident() % 100000)]
+        return self.output_dir / ('-'.join(part for part in parts if part) + '.' + extension)
+
+class ProfilingMiddleware:
+    """ASGI middleware: профиль каждого HTTP-запроса, пока профилирование включено"""
+
+    def __init__(self, app, profiler: Profiler, exclude_paths: Iterable[str] = ()):
+        """
+        Args:
+            profiler: Общий профилировщик процесса
+            exclude_paths: Пути без профилирования (долгие потоковые ответы)
+        """
+        self.app = app
+        self.profiler = profiler
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.profiler.enabled or scope['path'] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        with self.profiler.profile('request', f"{scope['method']}{scope['path']}", async_mode=True):
+            await self.app(scope, receive, send)
+
+_profiler: Optional[Profiler] = None
+
+def get_profiler() -> Profiler:
+    """Общий профилировщик процесса; при первом вызове читает настройки окружения"""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler.from_env()
+        if os.getenv('TRACEMALLOC') == '1':
+            _profiler.start_tracemalloc(int(os.getenv('TRACEMALLOC_FRAMES', 10)))
+    return _profiler
@@ -0,0 +1,209 @@
+"""
+Распределенная трассировка (OpenTelemetry) от коллектора через очереди Redis до записи в БД.
+
+Включается переменной TRACING=1 (пакеты opentelemetry не обязательны).
+Экспорт: OTLP по HTTP, если задан OTEL_EXPORTER_OTLP_ENDPOINT, иначе - JSON-строки
+в TRACING_FILE (по умолчанию data/traces.jsonl). Доля трассировок - стандартные
+OTEL_TRACES_SAMPLER / OTEL_TRACES_SAMPLER_ARG.
+
+Контекст трассировки элемента очереди (W3C traceparent) хранится рядом с очередью
+в хэше '<очередь>:trace', как и время постановки в '<очередь>:enqueued_at':
+формат самих элементов (имена брендов, URL, записи продуктов) не меняется.
+"""
+import os
+from contextlib import nullcontext
+from typing import Dict, Iterable, List, Optional, Sequence
+
+TRACE_CONTEXT_TTL = int(os.getenv('TRACE_CONTEXT_TTL', 24*3600))
+
+_enabled = False
+_tracer = None
+# Модули opentelemetry загружаются только при включенной трассировке
+trace = None
+propagate = None
+_DISABLED = nullcontext()
+
+def setup_tracing(service_name: str) -> bool:
+    """
+    Настройка провайдера, экспорта и автоматической инструментации (psycopg2, requests, WebDriver).
+
+    Вызывается при запуске процесса до создания соединений с БД.
+
+    Returns:
+        bool: Трассировка включена
+    """
+    global _enabled, _tracer, trace, propagate
+    if _enabled:
+        return True
+    if os.getenv('TRACING') != '1':
+        return False
+    try:
+        from opentelemetry import propagate, trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:  # opentelemetry не обязателен, без него трассировка отключена
+        print("TRACING=1, но пакеты opentelemetry не установлены - трассировка отключена")
+        return False
+
+    provider = TracerProvider(resource=Resource.create({
+        'service.name': os.getenv('OTEL_SERVICE_NAME') or service_name,
+        'service.instance.id': os.getenv('WORKER_ID') or str(os.getpid()),
+    }))
+    provider.add_span_processor(BatchSpanProcessor(_create_exporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer('knowde')
+    _enabled = True
+
+    _instrument_libraries()
+    _instrument_webdriver()
+    print(f"Трассировка включена: {service_name}")
+    return True
+
+def _create_exporter():
+    if os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT'):
+        # Адрес коллектора и заголовки берутся из стандартных переменных OTEL_EXPORTER_OTLP_*
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+    path = os.getenv('TRACING_FILE', 'data/traces.jsonl')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    return ConsoleSpanExporter(
+        out=open(path, 'a', encoding='utf-8'),
+        formatter=lambda span: span.to_json(indent=None) + '\n',
+    )
+
+def _instrument_libraries() -> None:
+    """Автоматическая инструментация установленных библиотек"""
+    try:
+        from opentelemetry.instrumentation.psycopg2 import Psycopg2Instrumentor
+        Psycopg2Instrumentor().instrument()
+    except ImportError:
+        pass
+    try:
+        from opentelemetry.instrumentation.requests import RequestsInstrumentor
+        RequestsInstrumentor().instrument()
+    except ImportError:
+        pass
+
+def _instrument_webdriver() -> None:
+    """
+    Спаны команд WebDriver (get, findElement, ...).
+
+    Готовой инструментации Selenium нет: оборачиваем WebDriver.execute, через
+    который проходят все команды. Спаны создаются только внутри трассируемой
+    задачи, чтобы не плодить одиночные трассировки.
+    """
+    try:
+        from selenium.webdriver.remote.webdriver import WebDriver
+    except ImportError:
+        return
+    if getattr(WebDriver.execute, '_traced', False):
+        return
+    execute = WebDriver.execute
+
+    def traced_execute(self, driver_command, params=None):
+        if not trace.get_current_span().get_span_context().is_valid:
+            return execute(self, driver_command, params)
+        attributes = {'webdriver.command': driver_command}
+        if params and driver_command == 'get':
+            attributes['url.full'] = params.get('url', '')
+        with _tracer.start_as_current_span(f'webdriver.{driver_command}', attributes=attributes):
+            return execute(self, driver_command, params)
+
+    traced_execute._traced = True
+    WebDriver.execute = traced_execute
+
+def instrument_app(app) -> None:
+    """Спаны входящих запросов FastAPI"""
+    if not _enabled:
+        return
+    try:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    except ImportError:
+        return
+    FastAPIInstrumentor.instrument_app(app)
+
+def is_enabled() -> bool:
+    return _enabled
+
+def span(name: str, parent: Optional[str] = None, links: Sequence[str] = (), **attributes):
+    """
+    Спан вокруг блока кода; при выключенной трассировке - пустой контекст.
+
+    Args:
+        name: Имя спана
+        parent: traceparent родителя из другого процесса (по умолчанию - текущий спан)
+        links: traceparent связанных трассировок (например, остальных элементов пачки)
+        **attributes: Атрибуты спана
+    """
+    if not _enabled:
+        return _DISABLED
+    context = _extract(parent) if parent else None
+    span_links = []
+    for link in links:
+        link_context = trace.get_current_span(_extract(link)).get_span_context()
+        if link_context.is_valid:
+            span_links.append(trace.Link(link_context))
+    return _tracer.start_as_current_span(name, context=context, links=span_links,
+                                         attributes={key: value for key, value in attributes.items()
+                                                     if value is not None})
+
+def batch_span(name: str, contexts: Iterable[Optional[str]], **attributes):
+    """
+    Спан обработки пачки элементов очереди.
+
+    Родитель - трассировка первого элемента (обычно вся пачка относится к одному
+    бренду), остальные трассировки пачки прикрепляются ссылками.
+    """
+    if not _enabled:
+        return _DISABLED
+    distinct = list(dict.fromkeys(context for context in contexts if context))
+    return span(name, parent=distinct[0] if distinct else None, links=distinct[1:], **attributes)
+
+def current_context() -> Optional[str]:
+    """traceparent текущего спана для передачи в другой процесс"""
+    if not _enabled:
+        return None
+    carrier: Dict[str, str] = {}
+    propagate.inject(carrier)
+    return carrier.get('traceparent')
+
+def _extract(traceparent: str):
+    return propagate.extract({'traceparent': traceparent})
+
+def trace_key(queue_key: str) -> str:
+    """Ключ хэша с контекстами трассировки элементов очереди"""
+    return f'{queue_key}:trace'
+
+def attach_context(pipe, queue_key: str, items: Iterable) -> None:
+    """
+    Сохранение контекста текущего спана для элементов, поставленных в очередь.
+
+    Args:
+        pipe: Соединение или pipeline Redis (команды добавляются к остальным)
+        queue_key: Очередь, в которую поставлены элементы
+        items: Элементы в том виде, в каком они лежат в очереди
+    """
+    traceparent = current_context()
+    if not traceparent:
+        return
+    items = list(items)
+    if not items:
+        return
+    key = trace_key(queue_key)
+    pipe.hset(key, mapping={item: traceparent for item in items})
+    # Контексты элементов, которые никто не забрал, не копятся бесконечно
+    pipe.expire(key, TRACE_CONTEXT_TTL)
+
+def pop_contexts(redis, queue_key: str, items: List) -> List[Optional[str]]:
+    """Контексты трассировки извлеченных из очереди элементов (с удалением из хэша)"""
+    if not _enabled or not items:
+        return [None] * len(items)
+    key = trace_key(queue_key)
+    pipe = redis.pipeline()
+    pipe.hmget(key, items)
+    pipe.hdel(key, *items)
+    values, _ = pipe.execute()
+    return [value.decode('utf-8') if value else None for value in values]
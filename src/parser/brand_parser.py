@@ -11,11 +11,22 @@ from requests_html import HTMLSession
 import re
 from typing import Set, Optional, Dict
 from src.storage.db_storage import DBStorage
+from src.queue.crawl_checkpoint import CrawlCheckpoint
+from src.queue.task_queue import TaskQueue
+from src.queue.cluster import ClusterMembership
 
 class BrandParser:
-    def __init__(self, storage: DBStorage, session: Dict):
+    def __init__(self, storage: DBStorage, session: Dict, checkpoint: Optional[CrawlCheckpoint] = None,
+                 queue: Optional[TaskQueue] = None, membership: Optional[ClusterMembership] = None,
+                 rate_limiter=None):
         self.storage = storage
         self.session = session
+        self.checkpoint = checkpoint
+        self.queue = queue
+        # Категории делятся между узлами группы консистентным хэшированием
+        self.membership = membership
+        # Общий бюджет запросов всех узлов (RateLimiter/RedisRateLimiter)
+        self.rate_limiter = rate_limiter
         self.driver = session['driver']  # Используем уже авторизованный драйвер
         self.hash_value = None  # Добавляем атрибут для хранения hash
 
@@ -23,10 +34,20 @@ class BrandParser:
         """Случайная задержка между запросами"""
         time.sleep(random.uniform(min_delay, max_delay))
 
+    def _throttle(self) -> None:
+        """Ожидание разрешения общего лимита запросов"""
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+
+    def _is_category_done(self, url: str) -> bool:
+        return bool(self.checkpoint and self.checkpoint.is_category_done(url))
+
     def collect_brand_links(self) -> None:
         """Сбор и обработка брендов"""
         print("Начинаем сбор и обработку брендов...")
-        processed_brands = set()
+        processed_brands = self.checkpoint.completed_brands() if self.checkpoint else set()
+        if processed_brands:
+            print(f"Возобновление обхода: уже обработано {len(processed_brands)} брендов")
 
         try:
             # Проверяем авторизацию
@@ -43,22 +64,35 @@ class BrandParser:
                 return
 
             category_links = self._extract_category_links()
+            if self.membership:
+                # Владение пересчитывается перед каждой категорией при изменении состава узлов
+                categories = self.membership.iter_owned(category_links, self._is_category_done)
+            else:
+                categories = category_links
             
-            for url in category_links:
+            for url in categories:
+                if self.checkpoint and self.checkpoint.is_category_done(url):
+                    print(f"Категория {url} уже обработана, пропускаем")
+                    continue
+
                 try:
                     self._random_delay()
+                    self._throttle()
                     self.driver.get(url)
                     
                     pagination_links = self.driver.find_elements(By.CSS_SELECTOR, 'a[class^="pagination-action_button"]')
                     numbers = [int(link.text) for link in pagination_links if link.text.isdigit()]
                     max_number = max(numbers) if numbers else 10
                     
+                    start_page = self.checkpoint.get_page_cursor(url) + 1 if self.checkpoint else 1
+
                     # Обрабатываем каждую страницу пагинации
-                    for page in range(1, max_number + 1):
+                    for page in range(start_page, max_number + 1):
                         page_url = f"{url}/{page}"
                         print(f"\nОбработка страницы {page} из {max_number}: {page_url}")
                         
                         try:
+                            self._throttle()
                             self.driver.get(page_url)
                             
                             # Ждем загрузки брендов на странице
@@ -80,28 +114,46 @@ class BrandParser:
                                 if brand_name not in processed_brands:
                                     current_page_brands.append((brand_name, brand_url))
                             
+                            # Отбрасываем бренды, уже взятые другими коллекторами
+                            if self.queue and current_page_brands:
+                                claimed = set(self.queue.claim_brands([name for name, _ in current_page_brands]))
+                                current_page_brands = [(name, link) for name, link in current_page_brands
+                                                       if name in claimed]
+
                             # Обрабатываем все найденные бренды на текущей странице
                             print(f"Найдено {len(current_page_brands)} новых брендов на странице {page}")
                             
+                            page_brands = []
                             for brand_name, brand_url in current_page_brands:
                                 try:
                                     print(f"\nОбработка бренда: {brand_url}")
                                     json_data = self._get_json_data_for_brand(brand_url)
                                     
                                     if json_data:
-                                        self.storage.save_brand_data(brand_name, json_data)
+                                        if self.storage.save_brand_data(brand_name, json_data) is None:
+                                            raise RuntimeError("данные не сохранены")
                                         processed_brands.add(brand_name)
+                                        page_brands.append(brand_name)
+                                        if self.queue:
+                                            self.queue.confirm_brands([brand_name])
                                         print(f"Бренд {brand_name} успешно обработан и сохранен")
                                     else:
                                         print(f"Не удалось получить данные для бренда {brand_name}")
+                                        if self.queue:
+                                            self.queue.release_brands([brand_name])
                                     
                                     self._random_delay(1, 3)
                                     
                                 except Exception as e:
                                     print(f"Ошибка при обработке бренда {brand_name}: {e}")
+                                    # Захват снимаем, чтобы бренд повторили при возобновлении обхода
+                                    if self.queue:
+                                        self.queue.release_brands([brand_name])
                                     self._random_delay(5.0, 10.0)
                                     continue
                             
+                            if self.checkpoint:
+                                self.checkpoint.commit_page(url, page, page_brands)
                             print(f"Завершена обработка страницы {page}")
                             self._random_delay(2, 4)  # Задержка между страницами
                             
@@ -109,6 +161,9 @@ class BrandParser:
                             print(f"Ошибка при обработке страницы {page_url}: {e}")
                             self._random_delay(5.0, 10.0)
                             continue
+
+                    if self.checkpoint:
+                        self.checkpoint.complete_category(url)
                             
                 except Exception as e:
                     print(f"Ошибка при обработке категории {url}: {e}")
@@ -116,6 +171,14 @@ class BrandParser:
                     continue
 
             print(f"\nВсего успешно обработано брендов: {len(processed_brands)}")
+            # Прогресс общий для всех узлов: сбрасывает его тот, кто видит все категории завершенными
+            if self.checkpoint and (not self.membership
+                                    or all(self._is_category_done(url) for url in category_links)):
+                # Обход завершен, следующий запуск начнется с начала: захваты брендов
+                # (confirmed_ttl сутки) иначе пропустили бы их при повторном обходе
+                self.checkpoint.reset()
+                if self.queue:
+                    self.queue.reset_brand_claims()
 
         except Exception as e:
             print(f"Общая ошибка при сборе и обработке брендов: {e}")
@@ -172,6 +235,7 @@ class BrandParser:
                 brand_path = brand_url.split('knowde.com')[1]
                 json_url = f"https://www.knowde.com/_next/data/{self.hash_value}{brand_path}.json"
 
+                self._throttle()
                 response = requests.get(json_url)
                 
                 if response.status_code == 200:
@@ -197,6 +261,7 @@ class BrandParser:
         print("Получение нового hash значения...")
         for attempt in range(max_retries):
             try:
+                self._throttle()
                 self.driver.get(url)
                 WebDriverWait(self.driver, 10).until(
                     EC.presence_of_element_located((By.CSS_SELECTOR, "script[src*='/_next/static/']"))
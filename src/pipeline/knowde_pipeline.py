@@ -0,0 +1,272 @@
+"""Стадии обхода Knowde: discover → fetch_brand → extract_products → fetch_details → persist."""
+import os
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional
+from redis import Redis
+from src.browser.cdp_engine import BrowserEngine
+from src.collector.brand_collector import BrandCollector
+from src.fetch.http_cache import create_http_cache
+from src.fetch.http_client import HttpClient
+from src.monitoring.profiler import get_profiler
+from src.monitoring.tracing import span
+from src.pipeline.pipeline import Pipeline, Stage
+from src.processor.document_fetcher import DocumentFetcher
+from src.processor.product_extractor import ProductExtractor
+from src.processor.product_listing import ProductListingFetcher
+from src.processor.product_page import CONTENT_TABLES
+from src.processor.records import ProductRecord, record_from_dict
+from src.queue.task_queue import TaskQueue
+from src.storage.blob_storage import create_blob_store
+from src.storage.db_storage import DBStorage
+from src.storage import json_codec
+
+def _encode_record(record: ProductRecord) -> bytes:
+    return json_codec.dumpb(record)
+
+def _decode_record(raw: bytes) -> ProductRecord:
+    return record_from_dict(json_codec.loads(raw))
+
+# Бренд завершен, когда сохранены все его продукты: ожидаемое число задает
+# extract_products, persist добавляет ключи сохраненных продуктов в множество
+# (повторно обработанная пачка не засчитывается дважды)
+SETTLE_SCRIPT = """
+local expected_key, persisted_key = KEYS[1], KEYS[2]
+local ttl = tonumber(ARGV[1])
+if ARGV[2] ~= '' then
+    redis.call('SET', expected_key, ARGV[2], 'EX', ttl)
+end
+if #ARGV > 2 then
+    redis.call('SADD', persisted_key, unpack(ARGV, 3))
+    redis.call('EXPIRE', persisted_key, ttl)
+end
+local expected = redis.call('GET', expected_key)
+if expected and redis.call('SCARD', persisted_key) >= tonumber(expected) then
+    redis.call('DEL', expected_key, persisted_key)
+    return 1
+end
+return 0
+"""
+
+class BrandProgress:
+    """Учет сохраненных продуктов бренда между стадиями extract_products и persist"""
+
+    def __init__(self, redis: Redis, ttl: int = 7 * 86400):
+        self.redis = redis
+        self.ttl = ttl
+        self._settle = redis.register_script(SETTLE_SCRIPT)
+
+    def _keys(self, brand_name: str) -> List[str]:
+        return [f'pipeline:brand_progress:{brand_name}:expected', f'pipeline:brand_progress:{brand_name}:persisted']
+
+    def start(self, brand_name: str) -> None:
+        """Сброс учета перед извлечением продуктов бренда"""
+        self.redis.delete(*self._keys(brand_name))
+
+    def extracted(self, brand_name: str, count: int) -> bool:
+        """Фиксирует число продуктов бренда; True, если все они уже сохранены"""
+        return bool(self._settle(keys=self._keys(brand_name), args=[self.ttl, count]))
+
+    def persisted(self, brand_name: str, product_keys: List[str]) -> bool:
+        """Отмечает сохраненные продукты; True, если бренд сохранен полностью"""
+        return bool(self._settle(keys=self._keys(brand_name), args=[self.ttl, '', *product_keys]))
+
+    def forget(self, brand_name: str) -> None:
+        """Бренд не будет отмечен завершенным до следующего извлечения"""
+        self.start(brand_name)
+
+def _record_key(record: ProductRecord) -> str:
+    return str(record.id if record.id is not None else record.product_url)
+
+class PipelineResources:
+    """Ресурсы воркеров: у каждого потока свое соединение с БД и свой браузер"""
+
+    def __init__(self, queue: TaskQueue, session_factory: Optional[Callable[[], Optional[Dict]]] = None,
+                 fetch_documents: bool = False, browser_tabs: int = 0):
+        self.queue = queue
+        self.session_factory = session_factory
+        self.fetch_documents = fetch_documents
+        # Больше 0 - страницы продуктов грузятся вкладками одного браузера на процесс
+        self.browser_tabs = browser_tabs
+        # HTTP_CACHE=offline: повторная обработка только из кэша, без авторизации и браузера
+        cache = create_http_cache()
+        self.offline = bool(cache and cache.offline)
+        self._engine: Optional[BrowserEngine] = None
+        self._local = threading.local()
+        self._sessions: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def storage(self) -> DBStorage:
+        if not hasattr(self._local, 'storage'):
+            self._local.storage = DBStorage()
+        return self._local.storage
+
+    def session(self) -> Dict:
+        """Авторизованная сессия браузера текущего потока"""
+        if not hasattr(self._local, 'session'):
+            if self.offline:
+                self._local.session = {'driver': None}
+                return self._local.session
+            session = self.session_factory() if self.session_factory else None
+            if not session:
+                raise RuntimeError("Не удалось получить сессию")
+            with self._lock:
+                self._sessions.append(session)
+            self._local.session = session
+        return self._local.session
+
+    def collector(self) -> BrandCollector:
+        if not hasattr(self._local, 'collector'):
+            self._local.collector = BrandCollector(self.storage(), self.queue, self.session()['driver'])
+        return self._local.collector
+
+    def extractor(self, with_driver: bool) -> ProductExtractor:
+        """Экстрактор потока; браузер нужен только стадии fetch_details"""
+        key = 'extractor_driver' if with_driver else 'extractor'
+        if not hasattr(self._local, key):
+            session = self.session()
+            client = HttpClient.from_session(session)
+            document_fetcher = None
+            # Документы загружаются потоково мимо кэша, в режиме offline их не загружаем
+            if with_driver and self.fetch_documents and not self.offline:
+                document_fetcher = DocumentFetcher(self.storage(), create_blob_store(), client,
+                                                   concurrency=int(os.getenv('DOCUMENT_CONCURRENCY', 4)))
+            listing_fetcher = ProductListingFetcher(client, concurrency=int(os.getenv('LISTING_CONCURRENCY', 4)))
+            setattr(self._local, key, ProductExtractor(
+                self.storage(), session['driver'] if with_driver else None,
+                listing_fetcher=listing_fetcher, document_fetcher=document_fetcher,
+                browser_engine=self.engine() if with_driver else None,
+            ))
+        return getattr(self._local, key)
+
+    def engine(self) -> Optional[BrowserEngine]:
+        """Общий для всех потоков CDP-движок (None, если вкладки не настроены)"""
+        if self.browser_tabs <= 0 or self.offline:
+            return None
+        # Сессия (логин) нужна для cookies; берем ее до блокировки, session() сам ее использует
+        session = self.session()
+        with self._lock:
+            if not self._engine:
+                self._engine = BrowserEngine.from_session(
+                    session, tabs=self.browser_tabs, wait_selector=CONTENT_TABLES,
+                    page_timeout=float(os.getenv('BROWSER_PAGE_TIMEOUT', 30)),
+                )
+        return self._engine
+
+    def close(self) -> None:
+        """Закрытие браузеров всех потоков"""
+        with self._lock:
+            if self._engine:
+                self._engine.close()
+                self._engine = None
+            for session in self._sessions:
+                if session.get('driver'):
+                    session['driver'].quit()
+            self._sessions.clear()
+
+def _stage_setting(name: str, setting: str, default: int) -> int:
+    """Настройка стадии из окружения, например PIPELINE_FETCH_DETAILS_CONCURRENCY"""
+    return int(os.getenv(f'PIPELINE_{name.upper()}_{setting}', default))
+
+def build_pipeline(resources: PipelineResources) -> Pipeline:
+    """
+    Конвейер обхода Knowde.
+
+    Входы fetch_brand и extract_products - существующие очереди brand_urls_queue
+    (заполняется и SitemapSeeder) и brands_queue; в brands_queue и BrandCollector,
+    и стадия fetch_brand ставят бренды через TaskQueue.enqueue_brands_for_processing.
+    Ответвление refresh_brand читает refresh_urls_queue планировщика обновлений
+    и передает измененные бренды в extract_products.
+    """
+    # Профили задач бренда и пачек страниц продуктов (PROFILE=1 или SIGUSR1)
+    profiler = get_profiler()
+    progress = BrandProgress(resources.queue.redis)
+
+    def discover(pages: List[int]) -> Iterable[str]:
+        for page in pages:
+            yield from resources.collector().collect_page(int(page))
+
+    def fetch_brand(brand_urls: List[str]) -> Iterable[str]:
+        # Дальше идут только бренды, payload которых изменился (или не извлеченные)
+        for brand_url in brand_urls:
+            brand_name = resources.collector().collect_brand(brand_url)
+            if brand_name:
+                yield brand_name
+
+    def extract_products(brand_names: List[str]) -> Iterable[ProductRecord]:
+        storage = resources.storage()
+        for brand_name in brand_names:
+            progress.start(brand_name)
+            storage.update_extraction_status(brand_name, 'processing')
+            count = 0
+            try:
+                with profiler.profile('brand', brand_name), span('brand.extract_products', brand=brand_name):
+                    for record in resources.extractor(with_driver=False).iter_brand_products(brand_name):
+                        count += 1
+                        yield record
+            except Exception as e:
+                storage.update_extraction_status(brand_name, 'failed', error=str(e))
+                raise
+            # completed ставит persist, когда сохранен последний продукт бренда
+            storage.update_extraction_status(brand_name, 'extracted', products_count=count)
+            if progress.extracted(brand_name, count):
+                storage.update_extraction_status(brand_name, 'completed')
+
+    def fetch_details(records: List[ProductRecord]) -> Iterable[ProductRecord]:
+        with profiler.profile('details', records[0].brand if records else ''):
+            resources.extractor(with_driver=True).fetch_details(records)
+        return records
+
+    def persist(records: List[ProductRecord]) -> Iterable:
+        resources.extractor(with_driver=False).save_batch(records)
+        saved = defaultdict(list)
+        for record in records:
+            saved[record.brand].append(_record_key(record))
+        for brand_name, product_keys in saved.items():
+            if progress.persisted(brand_name, product_keys):
+                resources.storage().update_extraction_status(brand_name, 'completed')
+        # Фасеты обновляются после пачки продуктов, но не чаще интервала
+        resources.storage().refresh_facets(min_interval=int(os.getenv('FACET_REFRESH_INTERVAL', 300)))
+        return []
+
+    def brands_failed(brand_names: List[str]) -> None:
+        for brand_name in brand_names:
+            progress.forget(brand_name)
+            resources.storage().update_extraction_status(brand_name, 'failed',
+                                                         error="Извлечение продуктов не удалось")
+
+    def records_failed(records: List[ProductRecord]) -> None:
+        lost = defaultdict(int)
+        for record in records:
+            lost[record.brand] += 1
+        for brand_name, count in lost.items():
+            progress.forget(brand_name)
+            resources.storage().update_extraction_status(brand_name, 'failed',
+                                                         error=f"Не сохранено продуктов: {count}")
+
+    stages = [
+        Stage('discover', discover,
+              batch_size=1, concurrency=_stage_setting('discover', 'CONCURRENCY', 1)),
+        Stage('fetch_brand', fetch_brand, queue_key='brand_urls_queue',
+              batch_size=1, concurrency=_stage_setting('fetch_brand', 'CONCURRENCY', 1)),
+        Stage('extract_products', extract_products, queue_key='brands_queue', on_dead=brands_failed,
+              # fetch_brand пропускает неизмененные бренды, остальные ставятся и повторно
+              enqueue=lambda brand_names: len(resources.queue.enqueue_brands_for_processing(brand_names,
+                                                                                             force=True)),
+              batch_size=1, concurrency=_stage_setting('extract_products', 'CONCURRENCY', 1)),
+        Stage('fetch_details', fetch_details, encode=_encode_record, decode=_decode_record, by_reference=True,
+              on_dead=records_failed,
+              batch_size=_stage_setting('fetch_details', 'BATCH', 20),
+              concurrency=_stage_setting('fetch_details', 'CONCURRENCY', 1)),
+        Stage('persist', persist, encode=_encode_record, decode=_decode_record, by_reference=True,
+              on_dead=records_failed,
+              batch_size=_stage_setting('persist', 'BATCH', 100),
+              concurrency=_stage_setting('persist', 'CONCURRENCY', 1)),
+        # Отдельная очередь: URL из brand_urls_queue забирает и BrandCollector.process_frontier
+        Stage('refresh_brand', fetch_brand, queue_key='refresh_urls_queue', next_stage='extract_products',
+              batch_size=1, concurrency=_stage_setting('refresh_brand', 'CONCURRENCY', 1)),
+    ]
+    return Pipeline(stages, redis=resources.queue.redis,
+                    max_pending=int(os.getenv('PIPELINE_MAX_PENDING', 1000)),
+                    lease_timeout=float(os.getenv('PIPELINE_LEASE_TIMEOUT', 300)),
+                    max_attempts=int(os.getenv('PIPELINE_MAX_ATTEMPTS', 3)))
@@ -0,0 +1,436 @@
+"""Модуль декларативного конвейера стадий с локальным и распределенным (Redis) запуском."""
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from redis import Redis
+from src.queue.backpressure import Watermarks
+from src.queue.frontier import enqueued_at_key
+from src.monitoring.tracing import attach_context, batch_span, pop_contexts, span
+
+# Пачка не удаляется из Redis до подтверждения: извлеченные элементы получают аренду
+# в zset '<очередь>:leases' (срок аренды продлевает воркер, пока жив)
+# KEYS[1] - очередь, KEYS[2] - zset времени постановки, KEYS[3] - zset аренды, KEYS[4] - хэш элементов
+# ARGV[1] - размер пачки, ARGV[2] - срок аренды, ARGV[3] - элементы хранятся по номерам (1/0)
+POP_BATCH_SCRIPT = """
+local ids = redis.call('LPOP', KEYS[1], ARGV[1])
+if not ids then
+    return {{}, {}}
+end
+redis.call('ZREM', KEYS[2], unpack(ids))
+local leases = {}
+for _, id in ipairs(ids) do
+    leases[#leases + 1] = ARGV[2]
+    leases[#leases + 1] = id
+end
+redis.call('ZADD', KEYS[3], unpack(leases))
+if ARGV[3] == '1' then
+    return {ids, redis.call('HMGET', KEYS[4], unpack(ids))}
+end
+return {ids, ids}
+"""
+
+# Возврат неудавшейся или брошенной пачки в очередь; после ARGV[1] попыток - в '<очередь>:dead'
+# KEYS[1] - очередь, KEYS[2] - zset времени постановки, KEYS[3] - zset аренды,
+# KEYS[4] - хэш числа попыток, KEYS[5] - список отложенных
+# ARGV[1] - предел попыток, ARGV[2] - текущее время, ARGV[3..] - элементы
+RELEASE_SCRIPT = """
+local dead = {}
+for i = 3, #ARGV do
+    local id = ARGV[i]
+    -- Аренду могли уже вернуть (например, после истечения срока): элемент не дублируем
+    if redis.call('ZREM', KEYS[3], id) == 1 then
+        if redis.call('HINCRBY', KEYS[4], id, 1) < tonumber(ARGV[1]) then
+            redis.call('RPUSH', KEYS[1], id)
+            redis.call('ZADD', KEYS[2], 'NX', ARGV[2], id)
+        else
+            redis.call('HDEL', KEYS[4], id)
+            redis.call('RPUSH', KEYS[5], id)
+            dead[#dead + 1] = id
+        end
+    end
+end
+return dead
+"""
+
+def _encode_text(item: Any) -> bytes:
+    return str(item).encode('utf-8')
+
+def _decode_text(raw: bytes) -> str:
+    return raw.decode('utf-8')
+
+@dataclass
+class Stage:
+    name: str
+    # Обработчик пачки входных элементов; выдает элементы для следующей стадии (может быть генератором)
+    handler: Callable[[List[Any]], Iterable[Any]]
+    batch_size: int = 1
+    concurrency: int = 1
+    # Очередь Redis со входом стадии (по умолчанию pipeline:<name>)
+    queue_key: Optional[str] = None
+    # Сериализация входных элементов стадии при распределенном запуске
+    encode: Callable[[Any], bytes] = field(default=_encode_text)
+    decode: Callable[[bytes], Any] = field(default=_decode_text)
+    # Крупные элементы (записи продуктов) хранятся в хэше '<очередь>:items', а в очереди,
+    # метриках и контекстах трассировки - только их номера
+    by_reference: bool = False
+    # Постановка в очередь стадии общим для всех производителей способом (например, через frontier)
+    enqueue: Optional[Callable[[List[Any]], int]] = None
+    # Вызывается с элементами, исчерпавшими попытки обработки
+    on_dead: Optional[Callable[[List[Any]], None]] = None
+    # Ответвление: стадия со своей очередью, выход которой идет в указанную стадию
+    # (обслуживается только воркерами, run_local ее не использует)
+    next_stage: Optional[str] = None
+
+    def __post_init__(self):
+        self.queue_key = self.queue_key or f'pipeline:{self.name}'
+
+    def key(self, suffix: str) -> str:
+        """Служебный ключ очереди стадии (items, seq, leases, attempts, dead)"""
+        return f'{self.queue_key}:{suffix}'
+
+_DONE = object()
+
+class Pipeline:
+    def __init__(self, stages: List[Stage], redis: Optional[Redis] = None, max_pending: int = 1000,
+                 linger: float = 1.0, poll_interval: float = 2.0, lease_timeout: float = 300.0,
+                 max_attempts: int = 3):
+        """
+        Args:
+            stages: Стадии в порядке прохождения элементов
+            redis: Соединение для распределенного запуска (не нужно для run_local)
+            max_pending: Предел элементов между стадиями (глубина очереди при локальном запуске
+                и верхняя граница очереди следующей стадии при распределенном)
+            linger: Сколько секунд ждать добора неполной пачки
+            poll_interval: Пауза опроса пустой очереди Redis
+            lease_timeout: Через сколько секунд без продления пачка упавшего воркера
+                возвращается в очередь
+            max_attempts: Попыток обработки элемента до переноса в '<очередь>:dead'
+        """
+        self.stages = stages
+        self.redis = redis
+        self.max_pending = max_pending
+        self.linger = linger
+        self.poll_interval = poll_interval
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self._pop_script = redis.register_script(POP_BATCH_SCRIPT) if redis else None
+        self._release_script = redis.register_script(RELEASE_SCRIPT) if redis else None
+        # Элементы, которые обрабатывают воркеры процесса: ключ аренды -> элементы
+        self._held: Dict[str, Set[bytes]] = {}
+        self._held_lock = threading.Lock()
+
+    def stage(self, name: str) -> Stage:
+        """Стадия по имени"""
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(f"Неизвестная стадия: {name}")
+
+    def queues(self) -> Dict[str, str]:
+        """Стадия -> очередь Redis с ее входом (для метрик)"""
+        return {stage.name: stage.queue_key for stage in self.stages}
+
+    def run_local(self, items: Iterable[Any], start: Optional[str] = None) -> Dict[str, int]:
+        """
+        Прогон элементов через все стадии в одном процессе.
+
+        Стадии работают одновременно в потоках и связаны ограниченными
+        очередями: медленная стадия притормаживает предыдущие, а выход
+        обработчика передается дальше по мере получения.
+
+        Args:
+            items: Входные элементы первой стадии
+            start: Имя стадии, с которой начать (например, fetch_brand для готовых URL)
+        Returns:
+            Dict[str, int]: Количество элементов, обработанных каждой стадией
+        """
+        chain = self._chain()
+        stages = chain[chain.index(self.stage(start)):] if start else chain
+        inputs = [queue.Queue(maxsize=self.max_pending) for _ in stages]
+        processed = {stage.name: 0 for stage in stages}
+        remaining = [stage.concurrency for stage in stages]
+        lock = threading.Lock()
+
+        def feed():
+            for item in items:
+                inputs[0].put(item)
+            for _ in range(stages[0].concurrency):
+                inputs[0].put(_DONE)
+
+        def work(index: int):
+            stage = stages[index]
+            output = inputs[index + 1].put if index + 1 < len(stages) else None
+            done = False
+            while not done:
+                batch = []
+                while len(batch) < stage.batch_size:
+                    try:
+                        # Первый элемент пачки ждем без ограничения, остальные - не дольше linger
+                        item = inputs[index].get(timeout=self.linger if batch else None)
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        done = True
+                        break
+                    batch.append(item)
+                if not batch:
+                    continue
+
+                with span(f'pipeline.{stage.name}', **{'pipeline.batch_size': len(batch)}):
+                    self._handle_local(stage, batch, output)
+                with lock:
+                    processed[stage.name] += len(batch)
+
+            with lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+            # Последний воркер стадии сообщает следующей, что входов больше не будет
+            if last and index + 1 < len(stages):
+                for _ in range(stages[index + 1].concurrency):
+                    inputs[index + 1].put(_DONE)
+
+        threads = [threading.Thread(target=feed, name='pipeline-feed', daemon=True)]
+        for index, stage in enumerate(stages):
+            threads += [
+                threading.Thread(target=work, args=(index,), name=f'pipeline-{stage.name}-{n}', daemon=True)
+                for n in range(stage.concurrency)
+            ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        print(f"Конвейер завершен: {processed}")
+        return processed
+
+    def _handle_local(self, stage: Stage, batch: List[Any], output: Optional[Callable[[Any], None]]) -> None:
+        """Обработка пачки с повторами; выход сразу уходит в ограниченную очередь следующей стадии"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                for item in stage.handler(batch) or []:
+                    if output:
+                        output(item)
+                return
+            except Exception as e:
+                print(f"Ошибка стадии {stage.name} на пачке из {len(batch)} "
+                      f"(попытка {attempt}/{self.max_attempts}): {e}")
+        self._dead(stage, batch)
+
+    def submit(self, items: Iterable[Any], stage: Optional[str] = None) -> int:
+        """Постановка элементов во входную очередь стадии (по умолчанию первой)"""
+        target = self.stage(stage) if stage else self.stages[0]
+        return self._push(target, list(items))
+
+    def run_workers(self, names: Optional[List[str]] = None, idle_timeout: float = 0) -> Dict[str, int]:
+        """
+        Распределенный запуск: воркеры выбранных стадий читают свои очереди Redis.
+
+        Доставка - не менее одного раза: пачка подтверждается только после
+        обработки и передачи всего ее выхода следующей стадии. При ошибке
+        пачка возвращается в очередь, пачка упавшего процесса - по истечении
+        аренды; после max_attempts попыток элементы переносятся в '<очередь>:dead'.
+        Обработчики стадий должны быть идемпотентны.
+
+        Args:
+            names: Стадии, которые обслуживает процесс (по умолчанию все)
+            idle_timeout: Завершение после стольких секунд без входов (0 - работать бесконечно)
+        Returns:
+            Dict[str, int]: Количество элементов, обработанных каждой стадией
+        """
+        if not self.redis:
+            raise ValueError("Для распределенного запуска нужно соединение с Redis")
+        stages = [self.stage(name) for name in names] if names else self.stages
+        processed = {stage.name: 0 for stage in stages}
+        lock = threading.Lock()
+        stopped = threading.Event()
+
+        def work(stage: Stage):
+            following = self._next(stage)
+            watermarks = None
+            if following:
+                watermarks = Watermarks(self.redis, following.queue_key, self.max_pending,
+                                        self.max_pending // 2, self.poll_interval)
+            idle = 0.0
+            reclaimed_at = 0.0
+            while not idle_timeout or idle < idle_timeout:
+                if time.monotonic() - reclaimed_at >= self.lease_timeout / 2:
+                    self._reclaim(stage)
+                    reclaimed_at = time.monotonic()
+
+                ids, items = self._pop(stage)
+                if not ids:
+                    time.sleep(self.poll_interval)
+                    idle += self.poll_interval
+                    continue
+                idle = 0.0
+
+                # Спан пачки продолжает трассировку элементов, начатую в предыдущей стадии
+                contexts = pop_contexts(self.redis, stage.queue_key, ids)
+                try:
+                    with batch_span(f'pipeline.{stage.name}', contexts, **{'pipeline.batch_size': len(ids)}):
+                        self._emit(following, watermarks, stage.handler(items) or [])
+                except Exception as e:
+                    print(f"Ошибка стадии {stage.name} на пачке из {len(ids)}: {e}")
+                    self._release(stage, ids)
+                    continue
+                finally:
+                    self._untrack(stage, ids)
+                self._ack(stage, ids)
+                with lock:
+                    processed[stage.name] += len(ids)
+
+        threads = [
+            threading.Thread(target=work, args=(stage,), name=f'pipeline-{stage.name}-{n}', daemon=True)
+            for stage in stages for n in range(stage.concurrency)
+        ]
+        renewal = threading.Thread(target=self._renew_leases, args=(stopped,), name='pipeline-leases',
+                                   daemon=True)
+        renewal.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stopped.set()
+
+        print(f"Воркеры конвейера завершены: {processed}")
+        return processed
+
+    def requeue_dead(self, name: str) -> int:
+        """Возврат отложенных элементов стадии в ее очередь (после исправления причины ошибок)"""
+        stage = self.stage(name)
+        moved = 0
+        while True:
+            item = self.redis.lmove(stage.key('dead'), stage.queue_key, 'LEFT', 'RIGHT')
+            if item is None:
+                break
+            self.redis.zadd(enqueued_at_key(stage.queue_key), {item: time.time()}, nx=True)
+            moved += 1
+        print(f"Возвращено в очередь {stage.queue_key}: {moved}")
+        return moved
+
+    def _chain(self) -> List[Stage]:
+        """Основная цепочка стадий без ответвлений"""
+        return [stage for stage in self.stages if not stage.next_stage]
+
+    def _next(self, stage: Stage) -> Optional[Stage]:
+        """Следующая стадия или None для последней"""
+        if stage.next_stage:
+            return self.stage(stage.next_stage)
+        chain = self._chain()
+        index = chain.index(stage)
+        return chain[index + 1] if index + 1 < len(chain) else None
+
+    def _emit(self, following: Optional[Stage], watermarks: Optional[Watermarks], outputs: Iterable[Any]) -> None:
+        """
+        Передача выхода обработчика следующей стадии частями по ее размеру пачки.
+
+        Перед каждой частью ждем, пока очередь следующей стадии не опустится
+        ниже границы, поэтому бренд на тысячи продуктов не переполняет ее
+        и не держит все записи в памяти.
+        """
+        if not following:
+            for _ in outputs:
+                pass
+            return
+        chunk = []
+        for output in outputs:
+            chunk.append(output)
+            if len(chunk) >= following.batch_size:
+                watermarks.wait()
+                self._push(following, chunk)
+                chunk = []
+        if chunk:
+            watermarks.wait()
+            self._push(following, chunk)
+
+    def _push(self, stage: Stage, items: List[Any]) -> int:
+        """Добавление элементов в очередь стадии с отметкой времени для метрик задержки"""
+        if not items:
+            return 0
+        if stage.enqueue:
+            return stage.enqueue(items)
+        encoded = [stage.encode(item) for item in items]
+        pipe = self.redis.pipeline()
+        if stage.by_reference:
+            last = self.redis.incrby(stage.key('seq'), len(encoded))
+            ids = [str(number) for number in range(last - len(encoded) + 1, last + 1)]
+            pipe.hset(stage.key('items'), mapping=dict(zip(ids, encoded)))
+        else:
+            ids = encoded
+        pipe.rpush(stage.queue_key, *ids)
+        pipe.zadd(enqueued_at_key(stage.queue_key), {item_id: time.time() for item_id in ids}, nx=True)
+        attach_context(pipe, stage.queue_key, ids)
+        pipe.execute()
+        return len(ids)
+
+    def _pop(self, stage: Stage) -> Tuple[List[bytes], List[Any]]:
+        """Аренда пачки: номера элементов и декодированные элементы"""
+        ids, raw = self._pop_script(
+            keys=[stage.queue_key, enqueued_at_key(stage.queue_key), stage.key('leases'), stage.key('items')],
+            args=[stage.batch_size, time.time() + self.lease_timeout, '1' if stage.by_reference else '0'],
+        )
+        if not ids:
+            return [], []
+        with self._held_lock:
+            self._held.setdefault(stage.key('leases'), set()).update(ids)
+        # Элемент без данных (например, удаленных вручную) подтверждаем вместе с пачкой
+        return ids, [stage.decode(item) for item in raw if item is not None]
+
+    def _untrack(self, stage: Stage, ids: List[bytes]) -> None:
+        with self._held_lock:
+            self._held.get(stage.key('leases'), set()).difference_update(ids)
+
+    def _ack(self, stage: Stage, ids: List[bytes]) -> None:
+        """Подтверждение обработанной пачки"""
+        pipe = self.redis.pipeline()
+        pipe.zrem(stage.key('leases'), *ids)
+        pipe.hdel(stage.key('attempts'), *ids)
+        if stage.by_reference:
+            pipe.hdel(stage.key('items'), *ids)
+        pipe.execute()
+
+    def _release(self, stage: Stage, ids: List[bytes]) -> None:
+        """Возврат пачки в очередь для повторной попытки или перенос в отложенные"""
+        dead = self._release_script(
+            keys=[stage.queue_key, enqueued_at_key(stage.queue_key), stage.key('leases'),
+                  stage.key('attempts'), stage.key('dead')],
+            args=[self.max_attempts, time.time(), *ids],
+        )
+        if dead:
+            print(f"Стадия {stage.name}: {len(dead)} элементов перенесены в {stage.key('dead')}")
+            items = self.redis.hmget(stage.key('items'), dead) if stage.by_reference else dead
+            self._dead(stage, [stage.decode(item) for item in items if item is not None])
+
+    def _reclaim(self, stage: Stage) -> None:
+        """Возврат в очередь пачек, аренда которых истекла (воркер упал или завис)"""
+        expired = self.redis.zrangebyscore(stage.key('leases'), '-inf', time.time(), start=0, num=500)
+        if expired:
+            print(f"Стадия {stage.name}: возвращаем в очередь {len(expired)} элементов с истекшей арендой")
+            self._release(stage, expired)
+
+    def _renew_leases(self, stopped: threading.Event) -> None:
+        """Продление аренды пачек, которые обрабатывают воркеры процесса"""
+        while not stopped.wait(self.lease_timeout / 3):
+            with self._held_lock:
+                held = {key: list(ids) for key, ids in self._held.items() if ids}
+            if not held:
+                continue
+            deadline = time.time() + self.lease_timeout
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for key, ids in held.items():
+                    pipe.zadd(key, {item_id: deadline for item_id in ids}, xx=True)
+                pipe.execute()
+            except Exception as e:
+                print(f"Ошибка продления аренды пачек: {e}")
+
+    def _dead(self, stage: Stage, items: List[Any]) -> None:
+        """Элементы, исчерпавшие попытки обработки"""
+        print(f"Стадия {stage.name}: {len(items)} элементов исчерпали {self.max_attempts} попыток обработки")
+        if stage.on_dead and items:
+            try:
+                stage.on_dead(items)
+            except Exception as e:
+                print(f"Ошибка обработки отложенных элементов стадии {stage.name}: {e}")
@@ -0,0 +1,61 @@
+"""Модуль для потокового разбора JSON бренда без построения полного дерева."""
+from typing import Any, BinaryIO, Dict, Iterator, Tuple
+import ijson
+
+QUERY_PREFIX = 'pageProps.dehydratedState.queries.item'
+DETAILS_PREFIX = f'{QUERY_PREFIX}.state.data.details.item'
+PRODUCTS_PREFIX = f'{QUERY_PREFIX}.state.data.products'
+PRODUCT_PREFIX = f'{PRODUCTS_PREFIX}.data.item'
+
+def iter_brand_payload(stream: BinaryIO) -> Iterator[Tuple[str, Any]]:
+    """
+    Потоково разбирает JSON бренда за один проход.
+
+    Продукты берутся только из первого query, содержащего products,
+    как и при разборе через словари.
+
+    Args:
+        stream: Бинарный поток с JSON бренда
+    Yields:
+        Tuple[str, Any]: ('details', секция), ('product', продукт)
+            и в конце ('meta', скалярные поля products, например total)
+    """
+    query_index = -1
+    products_query = None
+    meta: Dict[str, Any] = {}
+
+    builder = None
+    kind = None
+    depth = 0
+
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+            if depth == 0:
+                yield kind, builder.value
+                builder = None
+            continue
+
+        if prefix == QUERY_PREFIX and event == 'start_map':
+            query_index += 1
+        elif prefix == PRODUCTS_PREFIX and products_query is None:
+            products_query = query_index
+        elif prefix == DETAILS_PREFIX or (prefix == PRODUCT_PREFIX and query_index == products_query):
+            kind = 'details' if prefix == DETAILS_PREFIX else 'product'
+            if event in ('start_map', 'start_array'):
+                # Собираем только текущий элемент, остальное дерево не строится
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                depth = 1
+            else:
+                yield kind, value
+        elif (query_index == products_query and prefix.startswith(f'{PRODUCTS_PREFIX}.')
+              and prefix != f'{PRODUCTS_PREFIX}.data' and not prefix.startswith(f'{PRODUCTS_PREFIX}.data.')
+              and event in ('string', 'number', 'boolean', 'null')):
+            meta[prefix[len(PRODUCTS_PREFIX) + 1:]] = value
+
+    yield 'meta', meta
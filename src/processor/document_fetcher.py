@@ -0,0 +1,203 @@
+"""Модуль для загрузки документов продуктов (TDS/SDS) с дедупликацией."""
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from src.fetch.http_client import HttpClient
+from src.processor.records import ProductRecord
+from src.storage.db_storage import DBStorage
+
+CHUNK_SIZE = 1024 * 1024
+# Блокировка .part-файла, не обновлявшаяся столько секунд, считается брошенной
+LOCK_TIMEOUT = 3600
+
+class DocumentFetcher:
+    def __init__(self, storage: DBStorage, blob_store, client: HttpClient, concurrency: int = 4,
+                 revalidate_after: timedelta = timedelta(days=7), work_dir: str = "data/documents_tmp"):
+        self.storage = storage
+        self.blob_store = blob_store
+        self.client = client
+        self.concurrency = concurrency
+        self.revalidate_after = revalidate_after
+        self.work_dir = Path(work_dir)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+
+    def fetch_for_products(self, products: Iterable[ProductRecord]) -> None:
+        """Загрузка документов пачки продуктов и проставление blob_id"""
+        documents = [doc for product in products for doc in product.documents if doc.url]
+        if not documents:
+            return
+
+        blob_ids = self.fetch_all({doc.url for doc in documents})
+        for doc in documents:
+            doc.blob_id = blob_ids.get(doc.url)
+
+    def fetch_all(self, urls: Iterable[str]) -> Dict[str, str]:
+        """
+        Загрузка уникальных URL пулом асинхронных воркеров.
+
+        Returns:
+            Dict[str, str]: URL -> SHA-256 сохраненного файла
+        """
+        urls = list(urls)
+        # Обращения к БД выполняются до и после загрузки в основном потоке
+        refs = self.storage.load_document_refs(urls)
+        now = datetime.utcnow()
+
+        blob_ids = {}
+        stale = []
+        for url in urls:
+            ref = refs.get(url)
+            if ref and ref['fetched_at'] and now - ref['fetched_at'] < self.revalidate_after:
+                blob_ids[url] = ref['sha256']
+            else:
+                stale.append(url)
+
+        if stale:
+            results = asyncio.run(self._run_workers(stale, refs))
+            fresh = [result for result in results if result]
+            self.storage.save_document_refs(fresh)
+            blob_ids.update({result['url']: result['sha256'] for result in fresh})
+
+        print(f"Документов: {len(urls)}, загружено/проверено: {len(stale)}")
+        return blob_ids
+
+    async def _run_workers(self, urls: List[str], refs: Dict[str, Dict]) -> List[Optional[Dict]]:
+        """Ограниченный пул воркеров поверх очереди URL"""
+        queue: asyncio.Queue = asyncio.Queue()
+        for url in urls:
+            queue.put_nowait(url)
+        results: List[Optional[Dict]] = []
+
+        async def worker():
+            while True:
+                try:
+                    url = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                # Загрузка блокирующая (requests), поэтому выполняется в потоке
+                results.append(await asyncio.to_thread(self._fetch_one, url, refs.get(url)))
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(urls)))))
+        return results
+
+    def _fetch_one(self, url: str, ref: Optional[Dict]) -> Optional[Dict]:
+        """Загрузка одного документа; ошибка затрагивает только этот документ"""
+        base = self.work_dir / hashlib.sha1(url.encode('utf-8')).hexdigest()
+        lock_path = base.with_suffix('.lock')
+        try:
+            if not self._acquire(lock_path):
+                print(f"Документ {url} загружает другой воркер, пропускаем")
+                return None
+        except OSError as e:
+            print(f"Ошибка блокировки документа {url}: {e}")
+            return None
+        try:
+            return self._download(url, ref, base.with_suffix('.part'), base.with_suffix('.validator'), lock_path)
+        except Exception as e:
+            # Частично загруженный файл остается для докачки
+            print(f"Ошибка загрузки документа {url}: {e}")
+            return None
+        finally:
+            lock_path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _acquire(lock_path: Path) -> bool:
+        """Эксклюзивная блокировка .part-файла между потоками и репликами (O_EXCL)"""
+        for _ in range(2):
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    # Блокировку упавшего воркера выдает давно не обновлявшееся время изменения
+                    if time.time() - lock_path.stat().st_mtime < LOCK_TIMEOUT:
+                        return False
+                    lock_path.unlink()
+                except FileNotFoundError:
+                    pass
+        return False
+
+    def _download(self, url: str, ref: Optional[Dict], part_path: Path, validator_path: Path,
+                  lock_path: Path) -> Optional[Dict]:
+        """Условная и докачиваемая загрузка документа в .part-файл и перенос в хранилище"""
+        headers = {}
+        if ref and ref['sha256'] and self.blob_store.exists(ref['sha256']):
+            # Повторная проверка без загрузки тела, если файл не изменился
+            if ref.get('etag'):
+                headers['If-None-Match'] = ref['etag']
+            if ref.get('last_modified'):
+                headers['If-Modified-Since'] = ref['last_modified']
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        validator = validator_path.read_text() if offset and validator_path.exists() else None
+        if validator:
+            # If-Range: докачка только той же версии, иначе сервер отдаст файл целиком (200)
+            headers['Range'] = f"bytes={offset}-"
+            headers['If-Range'] = validator
+        else:
+            offset = 0
+
+        response = self.client.get(url, headers=headers, stream=True)
+        if response is None:
+            return None
+        try:
+            if response.status_code == 304:
+                # Файл не изменился: недокачанная часть другой версии больше не нужна
+                self._discard(part_path, validator_path)
+                return {**ref, 'url': url}
+            if response.status_code not in (200, 206):
+                print(f"Не удалось загрузить документ {url}: статус {response.status_code}")
+                return None
+            content_range = response.headers.get('Content-Range', '')
+            if response.status_code == 206 and not content_range.startswith(f"bytes {offset}-"):
+                print(f"Неожиданный диапазон документа {url}: {content_range}")
+                self._discard(part_path, validator_path)
+                return None
+
+            # 200 на запрос с Range: сервер не поддерживает докачку или файл изменился
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            if mode == 'wb':
+                self._save_validator(validator_path, response.headers)
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    os.utime(lock_path)
+        finally:
+            response.close()
+
+        sha256 = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        size = part_path.stat().st_size
+        content_type = response.headers.get('Content-Type')
+        self.blob_store.put_file(part_path, digest, content_type)
+        validator_path.unlink(missing_ok=True)
+
+        return {
+            'url': url,
+            'sha256': digest,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'size': size,
+            'content_type': content_type,
+        }
+
+    @staticmethod
+    def _save_validator(validator_path: Path, headers) -> None:
+        """Версия загружаемого файла для If-Range (слабый ETag для него не подходит)"""
+        etag = headers.get('ETag')
+        validator = etag if etag and not etag.startswith('W/') else headers.get('Last-Modified')
+        if validator:
+            validator_path.write_text(validator)
+        else:
+            validator_path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _discard(part_path: Path, validator_path: Path) -> None:
+        part_path.unlink(missing_ok=True)
+        validator_path.unlink(missing_ok=True)
@@ -1,177 +1,292 @@
 """Модуль для извлечения и обработки отдельных продуктов из JSON файлов брендов."""
 import json
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from src.storage.db_storage import DBStorage
+from src.processor.brand_stream import iter_brand_payload
+from src.processor.records import ProductRecord, documents_from_json, tables_from_json
+from src.processor.product_listing import ProductListingFetcher
+from src.processor.document_fetcher import DocumentFetcher
+from src.processor.spec_parser import parse_specs
+from src.processor.product_page import CONTENT_TABLES, parse_product_page
+from src.monitoring.profiler import get_profiler
+from src.fetch.http_cache import RENDERED, HttpCache, create_http_cache
 from selenium.common.exceptions import TimeoutException
-import time
 
 class ProductExtractor:
-    def __init__(self, storage: DBStorage, driver=None):
+    def __init__(self, storage: DBStorage, driver=None, batch_size: int = 20,
+                 listing_fetcher: Optional[ProductListingFetcher] = None,
+                 document_fetcher: Optional[DocumentFetcher] = None, browser_engine=None,
+                 page_cache: Optional[HttpCache] = None):
         self.storage = storage
         self.driver = driver
+        # BrowserEngine: страницы продуктов грузятся пачкой в параллельных вкладках
+        self.browser_engine = browser_engine
+        # Отрисованные страницы продуктов из дискового кэша (HTTP_CACHE=on/offline)
+        self.page_cache = page_cache or create_http_cache()
+        self.batch_size = batch_size
+        self.listing_fetcher = listing_fetcher
+        self.document_fetcher = document_fetcher
 
-    def extract_products_from_brand(self, brand_name: str) -> List[Dict]:
-        """Извлекает все продукты из JSON файла бренда и сохраняет их отдельно."""
+    def extract_products_from_brand(self, brand_name: str) -> int:
+        """
+        Потоково извлекает продукты бренда и сохраняет их пачками.
+
+        Returns:
+            int: Количество обработанных продуктов
+        """
+        processed_count = 0
+        batch = []
+        # PROFILE=1 или SIGUSR1: профиль задачи бренда в PROFILE_DIR
+        with get_profiler().profile('brand', brand_name):
+            for record in self.iter_brand_products(brand_name):
+                processed_count += 1
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    self.fetch_details(batch)
+                    self.save_batch(batch)
+                    batch = []
+            self.fetch_details(batch)
+            self.save_batch(batch)
+        return processed_count
+
+    def iter_brand_products(self, brand_name: str) -> Iterator[ProductRecord]:
+        """
+        Потоковая выдача продуктов бренда без данных страниц продуктов.
+
+        Данные бренда разбираются через ijson за один проход: продукты
+        обрабатываются по одному, секции details собираются попутно и
+        после обхода сохраняются как свойства бренда. Ошибки разбора и
+        загрузки страниц списка не перехватываются: вызывающий код должен
+        отметить бренд как неудачный, а не как извлеченный частично.
+        """
         print(f"Начинаем извлечение продуктов для бренда: {brand_name}")
         
-        brand_data = self.storage.load_brand_data(brand_name)
-        if not brand_data:
+        stream = self.storage.open_brand_json(brand_name)
+        if not stream:
             print(f"Не найдены данные для бренда: {brand_name}")
-            return []
+            return
+
+        found_count = 0
+        details = []
+        meta = {}
+        seen_ids = set()
 
-        processed_products = []
+        def handle_product(product: Dict) -> Optional[ProductRecord]:
+            nonlocal found_count
+            product_id = product.get('id') if isinstance(product, dict) else None
+            if product_id is not None:
+                # Встроенная страница может пересекаться с загруженными
+                if product_id in seen_ids:
+                    return None
+                seen_ids.add(product_id)
+            found_count += 1
+            processed_product = self._process_product(product, brand_name)
+            if processed_product:
+                print(f"Обработан продукт: {processed_product.name}")
+            return processed_product
         
-        try:
-            queries = brand_data['pageProps']['dehydratedState']['queries']
-            print(f"Найдено {len(queries)} queries для бренда {brand_name}")
-            
-            # Получаем свойства бренда
-            brand_properties = self._extract_brand_properties(queries)
-            print(f"Извлечены свойства бренда: {brand_properties}")
-            
-            # Ищем нужный query с продуктами
-            products_query = None
-            for query in queries:
-                if 'state' in query and 'data' in query['state']:
-                    if 'products' in query['state']['data']:
-                        products_query = query
-                        break
-            
-            if products_query and 'data' in products_query['state']['data']['products']:
-                all_products = products_query['state']['data']['products']['data']
-                
-                if all_products:
-                    print(f"Найдено {len(all_products)} продуктов для бренда {brand_name}")
-                    
-                    for product in all_products:
-                        processed_product = self._process_product(product, brand_name, brand_properties)
-                        if processed_product:
-                            processed_products.append(processed_product)
-                            self.storage.save_product(processed_product)
-                            print(f"Обработан продукт: {processed_product['name']}")
-                else:
-                    print(f"Не найдено продуктов для бренда {brand_name}")
-            else:
-                print(f"Не найден query с продуктами для бренда {brand_name}")
+        # Поток читается серверным курсором: закрываем его и при досрочном выходе
+        with stream:
+            for kind, value in iter_brand_payload(stream):
+                if kind == 'details':
+                    details.append(value)
+                elif kind == 'product':
+                    record = handle_product(value)
+                    if record:
+                        yield record
+                elif kind == 'meta':
+                    meta = value
 
-            return processed_products
+        # Остальные страницы списка продуктов, если бренд встроил только первую
+        if self.listing_fetcher and found_count:
+            pages = self.listing_fetcher.page_count(meta, found_count)
+            if pages > 1:
+                print(f"Загрузка еще {pages - 1} страниц продуктов для бренда {brand_name}")
+                route = self.storage.load_brand_route(brand_name) or {}
+                for product in self.listing_fetcher.iter_remaining_products(route, pages):
+                    record = handle_product(product)
+                    if record:
+                        yield record
 
-        except Exception as e:
-            print(f"Ошибка при обработке бренда {brand_name}: {str(e)}")
-            return []
+        if found_count:
+            print(f"Найдено {found_count} продуктов для бренда {brand_name}")
+        else:
+            print(f"Не найдено продуктов для бренда {brand_name}")
+
+        # Свойства бренда хранятся один раз, а не копируются в каждый продукт
+        brand_properties = self._extract_brand_properties(details)
+        print(f"Извлечены свойства бренда: {brand_properties}")
+        self.storage.save_brand_properties(brand_name, brand_properties)
+
+    def fetch_details(self, batch: List[ProductRecord]) -> None:
+        """Заполнение таблиц и документов со страниц продуктов и загрузка документов"""
+        if self.browser_engine or self.driver or self.page_cache:
+            pages = self._load_product_pages([record.product_url for record in batch])
+            missing = []
+            for record in batch:
+                html = pages.get(record.product_url)
+                if not html:
+                    missing.append(record)
+                    continue
+                extracted_data = parse_product_page(html, record.product_url)
+                self._log_extracted(extracted_data)
+                self._apply_details(record, extracted_data)
+            if missing:
+                self._restore_details(missing)
+        if self.document_fetcher:
+            self.document_fetcher.fetch_for_products(batch)
+
+    def _load_product_pages(self, urls: List[str]) -> Dict[str, Optional[str]]:
+        """HTML страниц продуктов: из кэша, затем вкладками CDP-движка или через WebDriver"""
+        pages: Dict[str, Optional[str]] = {}
+        if self.page_cache:
+            pages = {url: body.decode('utf-8') for url, body in self.page_cache.get_many(urls, RENDERED).items()}
+            if self.page_cache.offline:
+                return pages
+        missing = [url for url in dict.fromkeys(urls) if url not in pages]
+        if not missing:
+            return pages
 
-    def _extract_brand_properties(self, queries: List[Dict]) -> Dict:
-        """Извлекает свойства из блоков бренда."""
+        if self.browser_engine:
+            fetched = self.browser_engine.fetch_all(missing)
+        elif self.driver:
+            fetched = {url: self._render_product_page(url) for url in missing}
+        else:
+            fetched = {}
+        if self.page_cache:
+            for url, html in fetched.items():
+                if html:
+                    self.page_cache.put(url, html.encode('utf-8'), RENDERED)
+        pages.update(fetched)
+        return pages
+
+    def _restore_details(self, records: List[ProductRecord]) -> None:
+        """
+        Данные страниц продуктов, страницы которых не получены (нет в кэше offline
+        или не загрузились), берутся из БД: иначе persist затер бы их пустыми.
+        """
+        print(f"Нет страниц для {len(records)} продуктов, сохраняем их данные страниц без изменений")
+        stored = self.storage.load_product_details([str(record.id) for record in records if record.id is not None])
+        if stored is None:
+            raise RuntimeError(f"Не удалось загрузить сохраненные данные страниц {len(records)} продуктов")
+        for record in records:
+            details = stored.get(str(record.id))
+            if details:
+                record.tables = tables_from_json(details.get('tables'))
+                record.documents = documents_from_json(details.get('documents'))
+                record.img = details['img']
+                record.info = details['info']
+
+    @staticmethod
+    def _apply_details(record: ProductRecord, extracted_data: Dict) -> None:
+        record.tables = extracted_data['tables']
+        record.documents = extracted_data['documents']
+        record.img = extracted_data['img']
+        record.info = extracted_data['info']
+
+    def save_batch(self, batch: List[ProductRecord]) -> None:
+        """Сохранение пачки продуктов и их числовых характеристик"""
+        if not batch:
+            return
+        # Ошибка сохранения передается стадии persist, чтобы пачка была повторена, а не потеряна
+        if not self.storage.save_products(batch):
+            raise RuntimeError(f"Не удалось сохранить пачку из {len(batch)} продуктов")
+        # Индекс числовых характеристик для поиска по диапазонам
+        self.storage.save_product_specs([str(p.id) for p in batch if p.id is not None], parse_specs(batch))
+
+    def _extract_brand_properties(self, sections: List[Dict]) -> Dict:
+        """Извлекает свойства из секций details бренда."""
         brand_properties = {}
         
         try:
-            for query in queries:
-                if 'state' in query and 'data' in query['state']:
-                    data = query['state']['data']
-                    if 'details' in data:
-                        for section in data['details']:
-                            for block in section.get('content_blocks', []):
-                                key = block.get('key')
-                                if key:
-                                    if block.get('type') == 'ContentBlockType.FiltersContentBlock':
-                                        brand_properties[key] = [
-                                            f.get('filter_name') for f in block.get('filters', [])
-                                            if f.get('filter_name')
-                                        ]
-                                    elif block.get('type') == 'ContentBlockType.GroupFilterContentBlock':
-                                        values = []
-                                        for group in block.get('group_filters', []):
-                                            if 'header_filter' in group:
-                                                values.append(group['header_filter'].get('filter_name'))
-                                            for f in group.get('filters', []):
-                                                values.append(f.get('filter_name'))
-                                        brand_properties[key] = [v for v in values if v]
+            for section in sections:
+                for block in section.get('content_blocks', []):
+                    key = block.get('key')
+                    if key:
+                        if block.get('type') == 'ContentBlockType.FiltersContentBlock':
+                            brand_properties[key] = [
+                                f.get('filter_name') for f in block.get('filters', [])
+                                if f.get('filter_name')
+                            ]
+                        elif block.get('type') == 'ContentBlockType.GroupFilterContentBlock':
+                            values = []
+                            for group in block.get('group_filters', []):
+                                if 'header_filter' in group:
+                                    values.append(group['header_filter'].get('filter_name'))
+                                for f in group.get('filters', []):
+                                    values.append(f.get('filter_name'))
+                            brand_properties[key] = [v for v in values if v]
         except (KeyError, TypeError, AttributeError) as e:
             print(f"Ошибка при извлечении свойств бренда: {str(e)}")
         
         return brand_properties
 
-    def _process_product(self, product: Dict, brand_name: str, brand_properties: Dict) -> Optional[Dict]:
+    def _process_product(self, product: Dict, brand_name: str) -> Optional[ProductRecord]:
         """
         Обрабатывает данные отдельного продукта.
         
         Args:
             product: Исходные данные продукта
             brand_name: Название бренда
-            brand_properties: Свойства бренда
         Returns:
-            Dict: Обработанные данные продукта
+            ProductRecord: Обработанные данные продукта
         """
         if not product:
             return None
 
         try:
-            processed = {
-                'id': product.get('id'),
-                'brand': brand_name,
-                'name': product.get('name'),
-                'slug': product.get('slug'),
-                'uuid': product.get('uuid'),
-                'description': product.get('description'),
-                'company_name': product.get('company_name'),
-                'company_slug': product.get('company_slug'),
-                'company_id': product.get('company_id'),
-                'summary': product.get('summary'),
-                # URL продукта на Knowde
-                'product_url': f"https://www.knowde.com/stores/{product.get('company_slug')}/products/{product.get('slug')}",
-                # Изображения
-                'logo_url': product.get('logo_url'),
-                'banner_url': product.get('banner_url'),
-                
-                # Свойства продукта
-                'properties': {},
-                'brand_properties': brand_properties,
-                # Добавляем поля для таблиц и документов
-                'tables': [],
-                'documents': {}
-            }
-            
             # Обработка properties
+            properties = {}
             for prop in product.get('properties', []):
                 prop_name = prop.get('name', '')
                 prop_items = prop.get('items', [])
-                processed['properties'][prop_name] = prop_items
+                properties[prop_name] = prop_items
 
             # Обработка summary если есть
+            summary = product.get('summary')
             if 'summary' in product:
-                processed['summary'] = {}
+                summary = {}
                 for summary_item in product.get('summary', []):
                     summary_name = summary_item.get('name', '')
                     summary_items = summary_item.get('items', [])
-                    processed['summary'][summary_name] = summary_items
+                    summary[summary_name] = summary_items
 
-            # Если есть драйвер, извлекаем таблицы и документы
-            if self.driver:
-                extracted_data = self._extract_product_tables(processed['product_url'])
-                processed['tables'] = extracted_data['tables']
-                processed['documents'] = extracted_data['documents']
-                processed['img'] = extracted_data['img']
-                processed['info'] = extracted_data['info']
+            # URL продукта на Knowde
+            product_url = f"https://www.knowde.com/stores/{product.get('company_slug')}/products/{product.get('slug')}"
 
-            return processed
+            # Таблицы и документы со страницы продукта заполняет fetch_details
+            return ProductRecord(
+                id=product.get('id'),
+                brand=brand_name,
+                name=product.get('name'),
+                slug=product.get('slug'),
+                uuid=product.get('uuid'),
+                description=product.get('description'),
+                company_name=product.get('company_name'),
+                company_slug=product.get('company_slug'),
+                company_id=product.get('company_id'),
+                summary=summary,
+                product_url=product_url,
+                # Изображения
+                logo_url=product.get('logo_url'),
+                banner_url=product.get('banner_url'),
+                properties=properties,
+                tables=[],
+                documents=[],
+                img=[],
+                info=[],
+            )
 
         except (KeyError, TypeError, AttributeError) as e:
             print(f"Ошибка при обработке продукта {product.get('name', 'Unknown')}: {str(e)}")
             return None
 
-    def _extract_product_tables(self, product_url: str) -> Dict:
-        """Извлекает данные из таблиц и документов на странице продукта."""
-        result = {
-            'tables': [],
-            'documents': {},
-            'img': [],
-            'info': []
-        }
-
+    def _render_product_page(self, product_url: str) -> Optional[str]:
+        """Загружает страницу продукта в WebDriver и возвращает отрисованный HTML."""
         try:
             print(f"Загрузка страницы продукта: {product_url}")
             
@@ -187,130 +302,16 @@ class ProductExtractor:
 
             # Ждем загрузки элементов
             WebDriverWait(self.driver, 10).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, "table[class^='table-content_table']"))
+                EC.presence_of_all_elements_located((By.CSS_SELECTOR, CONTENT_TABLES))
             )
 
-            
-            # Извлечение таблиц из основного контента
-            table_elements = self.driver.find_elements(By.CSS_SELECTOR, "table[class^='table-content_table']")
-            for table in table_elements:
-                # Обработка таблиц первого типа
-                headers = []
-                header_row = table.find_element(By.CSS_SELECTOR, "thead tr")
-                header_cells = header_row.find_elements(By.CSS_SELECTOR, "td, th")
-                headers = [cell.text.strip() for cell in header_cells]
-                
-                rows = []
-                row_elements = table.find_elements(By.CSS_SELECTOR, "tbody tr")
-                for row in row_elements:
-                    row_data = [cell.text.strip() for cell in row.find_elements(By.CSS_SELECTOR, "td")]
-                    if row_data:
-                        rows.append(row_data)
-                
-                if headers or rows:
-                    table_name = ""
-                    caption = table.find_elements(By.CSS_SELECTOR, "caption")
-                    if caption:
-                        table_name = caption[0].text.strip()
-                    
-                    result['tables'].append({
-                        'type': 'content',
-                        'name': table_name,
-                        'headers': headers,
-                        'rows': rows
-                    })
-            # Извлечение документов
-            doc_elements = self.driver.find_elements(By.CSS_SELECTOR, "a[class^='document-list-item_container']")
-            for doc in doc_elements:
-                doc_text = doc.text.strip()
-                if doc_text:
-                    result['documents'][doc_text] = doc.get_attribute('href')
-
-            # Извлечение таблиц из div с классом html-content
-            html_content_divs = self.driver.find_elements(By.CSS_SELECTOR, "div[class^='html-content']")
-            for div in html_content_divs:
-                content_tables = div.find_elements(By.CSS_SELECTOR, "table")
-                for table in content_tables:
-                    rows = []
-                    all_rows = table.find_elements(By.CSS_SELECTOR, "tr")
-                    
-                    # Определяем, есть ли заголовок
-                    headers = []
-                    first_row = all_rows[0] if all_rows else None
-                    if first_row:
-                        header_cells = first_row.find_elements(By.CSS_SELECTOR, "th")
-                        if header_cells:
-                            headers = [cell.text.strip() for cell in header_cells]
-                            all_rows = all_rows[1:]  # Пропускаем первую строку, если это заголовок
-                    
-                    # Обработка строк
-                    for row in all_rows:
-                        cells = row.find_elements(By.CSS_SELECTOR, "td")
-                        row_data = [cell.text.strip() for cell in cells]
-                        if row_data:
-                            rows.append(row_data)
-                    
-                    if rows:
-                        result['tables'].append({
-                            'type': 'html_content',
-                            'headers': headers,
-                            'rows': rows
-                        })
-                        
-            # Обработка контента из div
-            for div in html_content_divs:
-                # Изображения с подписями
-                img_elements = div.find_elements(By.CSS_SELECTOR, "img")
-                if img_elements:
-                    for img in img_elements:
-                        img_data = {
-                            'src': img.get_attribute('src'),
-                            'caption': ''
-                        }   
-                        result['img'].append(img_data)
-                    continue
-                # Информационные блоки
-                info_elements = div.find_elements(By.CSS_SELECTOR, "p, ul")
-                for element in info_elements:
-                    if element.tag_name == 'ul':
-                        li_items = element.find_elements(By.CSS_SELECTOR, "li")
-                        list_items = [li.text.strip() for li in li_items if li.text.strip()]
-                        if list_items:
-                            result['info'].append({
-                                'type': 'list',
-                                'content': list_items
-                            })
-                    elif element.tag_name == 'p':
-                        p_text = element.text.strip()
-                        if p_text:
-                            result['info'].append({
-                                'type': 'text',
-                                'content': p_text
-                            })
-
-            print(f"Извлечено таблиц: {len(result['tables'])}, документов: {len(result['documents'])}, изображений: {len(result['img'])}, инфо-блоков: {len(result['info'])}")
-            return result
+            # HTML разбирается одним проходом в parse_product_page, а не обращениями к WebDriver
+            return self.driver.page_source
 
         except Exception as e:
             print(f"Ошибка при извлечении данных для {product_url}: {str(e)}")
-            return {'tables': [], 'documents': {}, 'img': [], 'info': []} 
+            return None
 
-    def run(self):
-        """Основной цикл обработки"""
-        while True:
-            brand = self.queue.get_next_brand()
-            if not brand:
-                time.sleep(5)  # Ждем новые бренды
-                continue
-            
-            try:
-                print(f"Обработка бренда: {brand}")
-                products = self.extract_products_from_brand(brand)
-                self.storage.update_brand_status(
-                    brand, 
-                    'completed',
-                    products_count=len(products)
-                )
-            except Exception as e:
-                print(f"Ошибка обработки бренда {brand}: {e}")
-                self.storage.update_brand_status(brand, 'failed', str(e)) 
\ No newline at end of file
+    @staticmethod
+    def _log_extracted(result: Dict) -> None:
+        print(f"Извлечено таблиц: {len(result['tables'])}, документов: {len(result['documents'])}, изображений: {len(result['img'])}, инфо-блоков: {len(result['info'])}")
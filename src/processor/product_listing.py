@@ -0,0 +1,84 @@
+"""Модуль для постраничной загрузки полного списка продуктов бренда."""
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+import orjson
+from src.fetch.http_client import HttpClient
+
+# Шаблон JSON-эндпоинта Next.js для страницы бренда
+DEFAULT_URL_TEMPLATE = "https://www.knowde.com/_next/data/{build_id}{path}.json?page={page}"
+
+TOTAL_KEYS = ('total', 'meta.total', 'total_count', 'count', 'meta.total_count')
+PER_PAGE_KEYS = ('per_page', 'meta.per_page', 'page_size', 'limit', 'meta.limit')
+
+class ProductListingFetcher:
+    def __init__(self, client: HttpClient, concurrency: int = 4, url_template: Optional[str] = None):
+        self.client = client
+        self.concurrency = concurrency
+        self.url_template = url_template or os.getenv('KNOWDE_PRODUCTS_URL', DEFAULT_URL_TEMPLATE)
+
+    @staticmethod
+    def page_count(meta: Dict[str, Any], first_page_size: int) -> int:
+        """Общее число страниц по метаданным первой страницы"""
+        total = next((meta[key] for key in TOTAL_KEYS if isinstance(meta.get(key), (int, float))), None)
+        per_page = next((meta[key] for key in PER_PAGE_KEYS if isinstance(meta.get(key), (int, float))), None)
+        per_page = per_page or first_page_size
+        if not total or not per_page:
+            return 1
+        return math.ceil(total / per_page)
+
+    @staticmethod
+    def resolve_path(route: Dict[str, Any]) -> Optional[str]:
+        """Путь страницы бренда из шаблона Next.js (page) и его параметров (query)"""
+        page, query = route.get('page'), route.get('query') or {}
+        if not page:
+            return None
+        try:
+            return re.sub(r'\[([^\]]+)\]', lambda m: str(query[m.group(1)]), page)
+        except KeyError:
+            return None
+
+    def iter_remaining_products(self, route: Dict[str, Any], pages: int) -> Iterator[Dict]:
+        """
+        Параллельно загружает страницы 2..pages и отдает продукты по мере готовности.
+
+        Args:
+            route: buildId, page и query бренда из сохраненных данных
+            pages: Общее число страниц
+        Yields:
+            Dict: Исходные данные продукта
+        """
+        path = self.resolve_path(route)
+        if not path or not route.get('buildId') or pages < 2:
+            return
+
+        urls = [self.url_template.format(build_id=route['buildId'], path=path, page=page)
+                for page in range(2, pages + 1)]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            # Окно ограничивает число загруженных, но еще не обработанных страниц
+            pending = deque()
+            for url in urls:
+                pending.append(executor.submit(self._fetch_page, url))
+                if len(pending) >= self.concurrency * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def _fetch_page(self, url: str) -> List[Dict]:
+        """Загрузка одной страницы списка продуктов"""
+        response = self.client.get(url)
+        if response is None or response.status_code != 200:
+            # Пропуск страницы оставил бы бренд извлеченным не полностью
+            raise RuntimeError(f"Не удалось загрузить страницу продуктов {url}")
+        try:
+            data = orjson.loads(response.content)
+            for query in data['pageProps']['dehydratedState']['queries']:
+                query_data = query.get('state', {}).get('data', {})
+                if isinstance(query_data, dict) and 'products' in query_data:
+                    return query_data['products'].get('data') or []
+        except (KeyError, TypeError, AttributeError, orjson.JSONDecodeError) as e:
+            print(f"Ошибка разбора страницы продуктов {url}: {e}")
+        return []
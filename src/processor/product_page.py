@@ -0,0 +1,98 @@
+"""Модуль разбора HTML страницы продукта (общий для Selenium и CDP-движка)."""
+import re
+from typing import Dict, List
+from urllib.parse import urljoin
+import lxml.html
+from src.processor.records import ProductDocument, ProductTable
+
+# Селекторы те же, что использовались при разборе через WebDriver
+CONTENT_TABLES = "table[class^='table-content_table']"
+DOCUMENT_LINKS = "a[class^='document-list-item_container']"
+HTML_CONTENT = "div[class^='html-content']"
+
+def _text(element) -> str:
+    """Текст элемента с нормализованными пробелами"""
+    return re.sub(r'\s+', ' ', element.text_content()).strip()
+
+def empty_result() -> Dict[str, List]:
+    return {'tables': [], 'documents': [], 'img': [], 'info': []}
+
+def parse_product_page(html: str, page_url: str) -> Dict[str, List]:
+    """
+    Извлечение таблиц, документов, изображений и инфо-блоков со страницы продукта.
+
+    Args:
+        html: HTML отрисованной страницы
+        page_url: URL страницы для разрешения относительных ссылок
+    Returns:
+        Dict: tables (ProductTable), documents (ProductDocument), img, info
+    """
+    result = empty_result()
+    if not html:
+        return result
+    root = lxml.html.fromstring(html)
+
+    # Таблицы из основного контента
+    for table in root.cssselect(CONTENT_TABLES):
+        header_row = table.cssselect("thead tr")
+        headers = [_text(cell) for cell in header_row[0].cssselect("td, th")] if header_row else []
+        rows = []
+        for row in table.cssselect("tbody tr"):
+            row_data = [_text(cell) for cell in row.cssselect("td")]
+            if row_data:
+                rows.append(row_data)
+        if headers or rows:
+            caption = table.cssselect("caption")
+            result['tables'].append(ProductTable(
+                type='content',
+                name=_text(caption[0]) if caption else "",
+                headers=headers,
+                rows=rows
+            ))
+
+    # Документы
+    for doc in root.cssselect(DOCUMENT_LINKS):
+        doc_text = _text(doc)
+        if doc_text:
+            href = doc.get('href')
+            result['documents'].append(
+                ProductDocument(name=doc_text, url=urljoin(page_url, href) if href else None, blob_id=None)
+            )
+
+    html_content_divs = root.cssselect(HTML_CONTENT)
+    # Таблицы из div с классом html-content
+    for div in html_content_divs:
+        for table in div.cssselect("table"):
+            all_rows = table.cssselect("tr")
+            headers = []
+            if all_rows:
+                header_cells = all_rows[0].cssselect("th")
+                if header_cells:
+                    headers = [_text(cell) for cell in header_cells]
+                    all_rows = all_rows[1:]
+            rows = [row_data for row_data in ([_text(cell) for cell in row.cssselect("td")] for row in all_rows)
+                    if row_data]
+            if rows:
+                result['tables'].append(ProductTable(type='html_content', name='', headers=headers, rows=rows))
+
+    # Изображения и информационные блоки
+    for div in html_content_divs:
+        images = div.cssselect("img")
+        if images:
+            result['img'].extend(
+                {'src': urljoin(page_url, img.get('src')) if img.get('src') else None, 'caption': ''}
+                for img in images
+            )
+            continue
+        for element in div.cssselect("p, ul"):
+            if element.tag == 'ul':
+                list_items = [_text(li) for li in element.cssselect("li")]
+                list_items = [item for item in list_items if item]
+                if list_items:
+                    result['info'].append({'type': 'list', 'content': list_items})
+            else:
+                p_text = _text(element)
+                if p_text:
+                    result['info'].append({'type': 'text', 'content': p_text})
+
+    return result
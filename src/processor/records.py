@@ -0,0 +1,87 @@
+"""Типизированные записи продуктов со __slots__ (orjson сериализует их напрямую)."""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+@dataclass
+class ProductTable:
+    __slots__ = ('type', 'name', 'headers', 'rows')
+
+    type: str
+    name: str
+    headers: List[str]
+    rows: List[List[str]]
+
+@dataclass
+class ProductDocument:
+    __slots__ = ('name', 'url', 'blob_id')
+
+    name: str
+    url: Optional[str]
+    # SHA-256 загруженного файла в хранилище документов
+    blob_id: Optional[str]
+
+@dataclass
+class ProductRecord:
+    __slots__ = (
+        'id', 'brand', 'name', 'slug', 'uuid', 'description',
+        'company_name', 'company_slug', 'company_id', 'summary', 'product_url',
+        'logo_url', 'banner_url', 'properties', 'tables', 'documents', 'img', 'info',
+    )
+
+    id: Any
+    brand: str
+    name: Optional[str]
+    slug: Optional[str]
+    uuid: Optional[str]
+    description: Optional[str]
+    company_name: Optional[str]
+    company_slug: Optional[str]
+    company_id: Any
+    summary: Any
+    product_url: str
+    logo_url: Optional[str]
+    banner_url: Optional[str]
+    properties: Dict[str, List[Any]]
+    tables: List[ProductTable]
+    documents: List[ProductDocument]
+    img: List[Dict[str, str]]
+    info: List[Dict[str, Any]]
+
+@dataclass
+class ProductSpec:
+    __slots__ = ('product_id', 'property', 'min_value', 'max_value', 'unit', 'raw')
+
+    product_id: str
+    property: str
+    min_value: Optional[float]
+    max_value: Optional[float]
+    unit: Optional[str]
+    raw: str
+
+def tables_from_json(tables: Optional[List[Dict[str, Any]]]) -> List[ProductTable]:
+    """Таблицы из JSON; у html_content-таблиц старых строк нет имени"""
+    return [
+        ProductTable(type=table.get('type', 'content'), name=table.get('name') or '',
+                     headers=table.get('headers') or [], rows=table.get('rows') or [])
+        for table in tables or []
+    ]
+
+def documents_from_json(documents: Any) -> List[ProductDocument]:
+    """Документы из JSON; старые строки хранят их словарем {название: url}"""
+    if isinstance(documents, dict):
+        documents = [{'name': name, 'url': url} for name, url in documents.items()]
+    return [
+        ProductDocument(name=document.get('name') or '', url=document.get('url'),
+                        blob_id=document.get('blob_id'))
+        for document in documents or []
+    ]
+
+def record_from_dict(data: Dict[str, Any]) -> ProductRecord:
+    """Восстановление ProductRecord из словаря (например, после orjson между стадиями)"""
+    fields = {name: data.get(name) for name in ProductRecord.__slots__}
+    fields['tables'] = tables_from_json(data.get('tables'))
+    fields['documents'] = documents_from_json(data.get('documents'))
+    fields['properties'] = fields['properties'] or {}
+    fields['img'] = fields['img'] or []
+    fields['info'] = fields['info'] or []
+    return ProductRecord(**fields)
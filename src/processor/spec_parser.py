@@ -0,0 +1,191 @@
+"""Модуль для разбора характеристик продуктов в числовые диапазоны."""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.processor.records import ProductRecord, ProductSpec
+
+# Единица -> (каноническая единица, множитель, смещение). Однобуквенных псевдонимов
+# ('c', 'f', 'k', 'm', 'p') нет: единицей считается любое слово после числа
+UNITS: Dict[str, Tuple[str, float, float]] = {
+    'cp': ('cP', 1.0, 0.0), 'mpa·s': ('cP', 1.0, 0.0), 'mpa.s': ('cP', 1.0, 0.0), 'mpas': ('cP', 1.0, 0.0),
+    'mpa*s': ('cP', 1.0, 0.0), 'pa·s': ('cP', 1000.0, 0.0), 'pa.s': ('cP', 1000.0, 0.0),
+    'cst': ('cSt', 1.0, 0.0), 'mm²/s': ('cSt', 1.0, 0.0), 'mm2/s': ('cSt', 1.0, 0.0),
+    'g/cm³': ('g/cm³', 1.0, 0.0), 'g/cm3': ('g/cm³', 1.0, 0.0), 'g/cc': ('g/cm³', 1.0, 0.0),
+    'g/ml': ('g/cm³', 1.0, 0.0), 'kg/m³': ('g/cm³', 0.001, 0.0), 'kg/m3': ('g/cm³', 0.001, 0.0),
+    'kg/l': ('g/cm³', 1.0, 0.0), 'lb/gal': ('g/cm³', 0.119826, 0.0),
+    '°c': ('°C', 1.0, 0.0), '°f': ('°C', 5 / 9, -160 / 9),
+    '%': ('%', 1.0, 0.0), 'wt%': ('%', 1.0, 0.0), 'wt.%': ('%', 1.0, 0.0), 'ppm': ('ppm', 1.0, 0.0),
+    'ppb': ('ppm', 0.001, 0.0),
+    'mpa': ('MPa', 1.0, 0.0), 'kpa': ('MPa', 0.001, 0.0), 'gpa': ('MPa', 1000.0, 0.0), 'pa': ('MPa', 1e-6, 0.0),
+    'psi': ('MPa', 0.00689476, 0.0), 'bar': ('MPa', 0.1, 0.0),
+    'mm': ('mm', 1.0, 0.0), 'µm': ('mm', 0.001, 0.0), 'um': ('mm', 0.001, 0.0), 'nm': ('mm', 1e-6, 0.0),
+    'cm': ('mm', 10.0, 0.0),
+    'g/mol': ('g/mol', 1.0, 0.0), 'mg koh/g': ('mg KOH/g', 1.0, 0.0),
+}
+
+# Разделитель тысяч (запятая или неразрывный пробел) - только перед группой ровно из трех цифр,
+# дробная часть - после точки или запятой. Обычный пробел между числами ('100 200') неоднозначен:
+# такое значение не разбирается
+NUMBER = r'(?:\d{1,3}(?:[,\u00a0\u202f\u2009]\d{3})+|\d+)(?!\d)(?:[.,]\d+)?(?!\s+\d)'
+# Значение должно начинаться с числа (допускаются сравнение и "approx."): 'Type 2' - не значение
+VALUE_RE = re.compile(
+    r'(?:approx\.?|ca\.?|~|typ\.?|typical)?\s*'
+    rf'(?P<cmp><=|>=|≤|≥|<|>|max\.?|min\.?)?\s*(?P<min>[-+]?{NUMBER})'
+    rf'(?:\s*(?:–|—|-|to|\.\.\.)\s*(?P<max>[-+]?{NUMBER}))?'
+    r'\s*(?P<unit>[^\d\s(),;][^\s(),;]*(?:\s(?:KOH/g|s))?)?',
+    re.IGNORECASE,
+)
+
+# Заголовки столбца значения и столбцов, которые значениями не являются
+VALUE_HEADERS = ('value', 'typical', 'result')
+NON_VALUE_HEADERS = ('method', 'standard', 'test', 'condition', 'unit', 'norm')
+# Обозначения вида 'Type 2', 'Class 1': число без единицы - номер, а не величина
+DESIGNATIONS = {'type', 'class', 'grade', 'category', 'group', 'level', 'series', 'part',
+                'version', 'no', 'no.', 'number', 'step', 'zone', 'form', 'kind'}
+
+def normalize_property(name: str) -> str:
+    """Каноническое имя характеристики: нижний регистр без условий измерения"""
+    name = re.split(r'[@(\[,]', name, maxsplit=1)[0]
+    return re.sub(r'\s+', ' ', name).strip(' :|-').lower()
+
+def _clean_number(text: str) -> str:
+    """Удаление разделителей тысяч; одиночная запятая без тройки цифр - десятичная"""
+    text = re.sub(r'\s', '', text)
+    if re.fullmatch(r'[-+]?\d{1,3}(,\d{3})+(\.\d+)?', text):
+        return text.replace(',', '')
+    return text.replace(',', '.')
+
+def split_spec(text: str) -> Optional[Tuple[str, str]]:
+    """Разделение строки вида 'Viscosity | 1,200 – 1,500 cP' на имя и значение"""
+    parts = re.split(r'\s*[|:]\s*', text, maxsplit=1)
+    if len(parts) == 2 and parts[0]:
+        return parts[0], parts[1]
+    match = re.search(r'[<>≤≥]?\s*[-+]?\d', text)
+    if match and match.start() > 0:
+        return text[:match.start()], text[match.start():]
+    return None
+
+def value_column(headers: List[str]) -> Optional[int]:
+    """
+    Номер столбца значения по заголовкам таблицы.
+
+    Предпочитается столбец 'Value'/'Typical'/'Result', иначе первый после имени,
+    не являющийся методом, стандартом или единицей. Без заголовков - второй столбец.
+    """
+    if not headers:
+        return 1
+    headers = [header.lower() for header in headers]
+    for i, header in enumerate(headers[1:], start=1):
+        if any(key in header for key in VALUE_HEADERS) and not any(
+                key in header for key in ('method', 'standard')):
+            return i
+    for i, header in enumerate(headers[1:], start=1):
+        if not any(key in header for key in NON_VALUE_HEADERS):
+            return i
+    return None
+
+def iter_spec_candidates(product: ProductRecord) -> Iterable[Tuple[str, str]]:
+    """Пары (имя, значение) из таблиц и свойств продукта"""
+    for table in product.tables:
+        headers = [header.lower() for header in table.headers]
+        unit_index = next((i for i, header in enumerate(headers) if 'unit' in header), None)
+        value_index = value_column(headers)
+        for row in table.rows:
+            if len(row) >= 2:
+                if value_index is None or value_index >= len(row):
+                    continue
+                value = row[value_index]
+                if unit_index is not None and unit_index < len(row) and unit_index != value_index:
+                    value = f"{value} {row[unit_index]}"
+                yield row[0], value
+            elif len(row) == 1:
+                pair = split_spec(row[0])
+                if pair:
+                    yield pair
+    for name, items in product.properties.items():
+        for item in items or []:
+            if isinstance(item, str) and re.search(r'\d', item):
+                yield name, item
+
+def parse_specs(products: List[ProductRecord]) -> List[ProductSpec]:
+    """
+    Разбор характеристик пачки продуктов.
+
+    Регулярные выражения применяются к строкам, а преобразование чисел
+    и приведение единиц выполняется векторно через NumPy для всей пачки.
+    """
+    owners, properties, raws, mins, maxs, units = [], [], [], [], [], []
+    for product in products:
+        if product.id is None:
+            continue
+        for name, value in iter_spec_candidates(product):
+            prop = normalize_property(str(name))
+            match = VALUE_RE.match(str(value).strip())
+            if not prop or not match:
+                continue
+            if prop in DESIGNATIONS and not match.group('unit'):
+                continue
+            low, high = _clean_number(match.group('min')), match.group('max')
+            high = _clean_number(high) if high else low
+            cmp = (match.group('cmp') or '').lower()
+            # '< 5' и 'max 5' задают только верхнюю границу, '> 5' и 'min 5' - только нижнюю
+            if cmp.startswith(('<', '≤', 'max')):
+                low = 'nan'
+            elif cmp.startswith(('>', '≥', 'min')):
+                high = 'nan'
+            owners.append(str(product.id))
+            properties.append(prop)
+            raws.append(str(value).strip())
+            mins.append(low)
+            maxs.append(high)
+            units.append((match.group('unit') or '').strip().lower())
+
+    if not owners:
+        return []
+
+    # NumPy нужен только при извлечении; API использует лишь normalize_value
+    import numpy as np
+
+    try:
+        min_values = np.array(mins, dtype=str).astype(np.float64)
+        max_values = np.array(maxs, dtype=str).astype(np.float64)
+    except ValueError:
+        # Редкие неразборчивые числа обрабатываем поштучно
+        min_values = np.array([_to_float(v) for v in mins], dtype=np.float64)
+        max_values = np.array([_to_float(v) for v in maxs], dtype=np.float64)
+
+    conversions = [UNITS.get(unit, (unit or None, 1.0, 0.0)) for unit in units]
+    scale = np.fromiter((c[1] for c in conversions), dtype=np.float64, count=len(conversions))
+    offset = np.fromiter((c[2] for c in conversions), dtype=np.float64, count=len(conversions))
+    min_values = min_values * scale + offset
+    max_values = max_values * scale + offset
+    # После пересчета (например, из °F) границы могут поменяться местами
+    low_values = np.fmin(min_values, max_values)
+    high_values = np.fmax(min_values, max_values)
+    low_values = np.where(np.isnan(min_values), np.nan, low_values)
+    high_values = np.where(np.isnan(max_values), np.nan, high_values)
+
+    return [
+        ProductSpec(
+            product_id=owners[i],
+            property=properties[i],
+            min_value=None if np.isnan(low_values[i]) else float(low_values[i]),
+            max_value=None if np.isnan(high_values[i]) else float(high_values[i]),
+            unit=conversions[i][0],
+            raw=raws[i],
+        )
+        for i in range(len(owners))
+    ]
+
+def normalize_value(value: Optional[float], unit: Optional[str]) -> Tuple[Optional[float], Optional[str]]:
+    """Приведение значения из запроса к канонической единице"""
+    if not unit:
+        return value, None
+    canonical, scale, offset = UNITS.get(unit.strip().lower(), (unit, 1.0, 0.0))
+    return (value * scale + offset if value is not None else None), canonical
+
+def _to_float(value: str) -> float:
+    """Безопасное преобразование строки в число"""
+    try:
+        return float(value)
+    except ValueError:
+        return float('nan')
@@ -0,0 +1,61 @@
+"""Модуль учета обращений к брендам через API (для планировщика обновлений)."""
+import time
+from typing import Dict, Iterable, Optional
+from redis import Redis
+
+class AccessStats:
+    def __init__(self, redis: Redis, prefix: str = 'brand_access', bucket_seconds: int = 3600,
+                 retention_buckets: int = 168):
+        """
+        Args:
+            prefix: Префикс ключей zset с числом обращений за интервал
+            bucket_seconds: Длина интервала (по умолчанию час)
+            retention_buckets: Сколько интервалов хранить (по умолчанию неделя)
+        """
+        self.redis = redis
+        self.prefix = prefix
+        self.bucket_seconds = bucket_seconds
+        self.retention_buckets = retention_buckets
+
+    def _bucket(self, now: Optional[float] = None) -> int:
+        return int((now or time.time()) // self.bucket_seconds)
+
+    def _key(self, bucket: int) -> str:
+        return f'{self.prefix}:{bucket}'
+
+    def record(self, names: Iterable[str]) -> None:
+        """Учет обращений; ошибка Redis не влияет на ответ API"""
+        names = list(names)
+        if not names:
+            return
+        key = self._key(self._bucket())
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for name in names:
+                pipe.zincrby(key, 1, name)
+            pipe.expire(key, self.bucket_seconds * self.retention_buckets)
+            pipe.execute()
+        except Exception as e:
+            print(f"Ошибка учета обращений: {e}")
+
+    def counts(self, half_life_hours: float = 24.0) -> Dict[str, float]:
+        """
+        Число обращений с экспоненциальным затуханием по давности.
+
+        Интервалы складываются ZUNIONSTORE с весами 0.5 ** (возраст / период полураспада).
+
+        Returns:
+            Dict[str, float]: Имя бренда -> взвешенное число обращений
+        """
+        current = self._bucket()
+        weights = {
+            self._key(current - age): 0.5 ** (age * self.bucket_seconds / 3600 / half_life_hours)
+            for age in range(self.retention_buckets)
+        }
+        target = f'{self.prefix}:decayed'
+        pipe = self.redis.pipeline()
+        pipe.zunionstore(target, weights)
+        pipe.zrange(target, 0, -1, withscores=True)
+        pipe.delete(target)
+        _, scores, _ = pipe.execute()
+        return {name.decode('utf-8'): score for name, score in scores}
@@ -0,0 +1,114 @@
+"""Модуль ограничения глубины очередей между стадиями и метрик их задержки."""
+import os
+import time
+from typing import Dict, Optional
+from redis import Redis
+from src.queue.frontier import enqueued_at_key
+
+# Стадия конвейера -> очередь, из которой она читает (см. src/pipeline/knowde_pipeline.py)
+STAGE_QUEUES: Dict[str, str] = {
+    'discover': 'pipeline:discover',
+    'fetch_brand': 'brand_urls_queue',
+    'extract_products': 'brands_queue',
+    'fetch_details': 'pipeline:fetch_details',
+    'persist': 'pipeline:persist',
+    'refresh_brand': 'refresh_urls_queue',
+}
+
+class QueueMetrics:
+    def __init__(self, redis: Redis, queues: Optional[Dict[str, str]] = None):
+        self.redis = redis
+        self.queues = queues or STAGE_QUEUES
+
+    def snapshot(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Глубина очереди, возраст самого старого элемента и пачки в обработке по стадиям.
+
+        Returns:
+            Dict: стадия -> {'queue', 'depth', 'oldest_age', 'in_flight', 'dead'}
+                (возраст в секундах или None)
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for queue_key in self.queues.values():
+            pipe.llen(queue_key)
+            pipe.zrange(enqueued_at_key(queue_key), 0, 0, withscores=True)
+            # Арендованные воркерами и исчерпавшие попытки элементы (src/pipeline/pipeline.py)
+            pipe.zcard(f'{queue_key}:leases')
+            pipe.llen(f'{queue_key}:dead')
+        results = pipe.execute()
+
+        now = time.time()
+        snapshot = {}
+        for i, (stage, queue_key) in enumerate(self.queues.items()):
+            depth, oldest, in_flight, dead = results[4 * i:4 * i + 4]
+            snapshot[stage] = {
+                'queue': queue_key,
+                'depth': depth,
+                'oldest_age': round(max(now - oldest[0][1], 0.0), 3) if oldest and depth else None,
+                'in_flight': in_flight,
+                'dead': dead,
+            }
+        return snapshot
+
+def format_prometheus(snapshot: Dict[str, Dict[str, Optional[float]]]) -> str:
+    """Метрики в текстовом формате Prometheus (для автомасштабирования воркеров)"""
+    lines = [
+        '# HELP pipeline_queue_depth Number of items waiting for the stage',
+        '# TYPE pipeline_queue_depth gauge',
+    ]
+    lines += [f'pipeline_queue_depth{{stage="{stage}"}} {stats["depth"]}' for stage, stats in snapshot.items()]
+    lines += [
+        '# HELP pipeline_queue_oldest_age_seconds Age of the oldest waiting item',
+        '# TYPE pipeline_queue_oldest_age_seconds gauge',
+    ]
+    lines += [f'pipeline_queue_oldest_age_seconds{{stage="{stage}"}} {stats["oldest_age"] or 0}'
+              for stage, stats in snapshot.items()]
+    lines += [
+        '# HELP pipeline_queue_in_flight Number of items leased by workers of the stage',
+        '# TYPE pipeline_queue_in_flight gauge',
+    ]
+    lines += [f'pipeline_queue_in_flight{{stage="{stage}"}} {stats["in_flight"]}' for stage, stats in snapshot.items()]
+    lines += [
+        '# HELP pipeline_queue_dead Number of items that exhausted their attempts',
+        '# TYPE pipeline_queue_dead gauge',
+    ]
+    lines += [f'pipeline_queue_dead{{stage="{stage}"}} {stats["dead"]}' for stage, stats in snapshot.items()]
+    return '\n'.join(lines) + '\n'
+
+class Watermarks:
+    def __init__(self, redis: Redis, queue_key: str, high: int, low: int, poll_interval: float = 5.0):
+        self.redis = redis
+        self.queue_key = queue_key
+        self.high = high
+        # Нижняя граница ниже верхней дает гистерезис и не дергает производителя
+        self.low = min(low, high)
+        self.poll_interval = poll_interval
+
+    @classmethod
+    def from_env(cls, redis: Redis, queue_key: str) -> Optional['Watermarks']:
+        """Границы из QUEUE_HIGH_WATERMARK/QUEUE_LOW_WATERMARK (0 - без ограничения)"""
+        high = int(os.getenv('QUEUE_HIGH_WATERMARK', 5000))
+        if high <= 0:
+            return None
+        low = int(os.getenv('QUEUE_LOW_WATERMARK', high // 5))
+        return cls(redis, queue_key, high, low, float(os.getenv('QUEUE_POLL_INTERVAL', 5)))
+
+    def wait(self) -> float:
+        """
+        Пауза производителя, пока потребители не разберут очередь.
+
+        Returns:
+            float: Время ожидания в секундах
+        """
+        depth = self.redis.llen(self.queue_key)
+        if depth < self.high:
+            return 0.0
+
+        print(f"Очередь {self.queue_key} заполнена ({depth} >= {self.high}), ожидаем снижения до {self.low}")
+        started = time.monotonic()
+        while depth > self.low:
+            time.sleep(self.poll_interval)
+            depth = self.redis.llen(self.queue_key)
+        waited = time.monotonic() - started
+        print(f"Очередь {self.queue_key}: {depth}, продолжаем после паузы {waited:.0f} с")
+        return waited
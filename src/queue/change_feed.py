@@ -0,0 +1,105 @@
+"""Модуль ленты изменений брендов и продуктов на Redis Streams."""
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import ResponseError
+
+# Тип изменения: новая запись или изменение существующей (неизмененные не публикуются)
+CREATED = 'created'
+UPDATED = 'updated'
+
+ChangeEvent = Tuple[str, Dict[str, str]]
+
+class ChangeFeed:
+    def __init__(self, redis: Optional[Redis] = None, stream: str = 'changes', maxlen: int = 100_000,
+                 async_redis: Optional[AsyncRedis] = None):
+        """
+        Args:
+            async_redis: Асинхронное соединение для подписчиков в цикле событий (read_async)
+        """
+        self.redis = redis or Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+        self.async_redis = async_redis
+        self.stream = stream
+        self.maxlen = maxlen
+
+    def publish(self, entity: str, changes: Iterable[Tuple[str, str, str]]) -> None:
+        """
+        Публикация изменений одним конвейером.
+
+        Args:
+            entity: Тип сущности ('brand' или 'product')
+            changes: Тройки (ключ, версия, тип изменения)
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for key, version, change in changes:
+            # Приблизительная обрезка (~) не блокирует запись на каждом XADD
+            pipe.xadd(self.stream, {'entity': entity, 'key': key, 'version': version or '', 'change': change},
+                      maxlen=self.maxlen, approximate=True)
+        pipe.execute()
+
+    def read(self, last_id: str = '0-0', count: int = 100, block: Optional[int] = None) -> List[ChangeEvent]:
+        """Чтение событий после last_id без группы (повтор с произвольного смещения)"""
+        response = self.redis.xread({self.stream: last_id}, count=count, block=block)
+        return self._decode(response)
+
+    async def read_async(self, last_id: str = '0-0', count: int = 100,
+                         block: Optional[int] = None) -> List[ChangeEvent]:
+        """Как read, но блокирующий XREAD ждет в цикле событий, не занимая поток"""
+        response = await self.async_redis.xread({self.stream: last_id}, count=count, block=block)
+        return self._decode(response)
+
+    async def latest_id_async(self) -> str:
+        """Идентификатор последнего события ленты ('0-0' для пустой)"""
+        latest = await self.async_redis.xrevrange(self.stream, count=1)
+        return latest[0][0].decode('utf-8') if latest else '0-0'
+
+    def create_group(self, group: str, start_id: str = '$') -> None:
+        """Создание группы потребителей; start_id='0' - с начала сохраненной ленты"""
+        try:
+            self.redis.xgroup_create(self.stream, group, id=start_id, mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def seek_group(self, group: str, last_id: str) -> None:
+        """Перемотка группы: следующие чтения вернут события после last_id"""
+        self.redis.xgroup_setid(self.stream, group, last_id)
+
+    def read_group(self, group: str, consumer: str, count: int = 100, block: Optional[int] = None,
+                   pending: bool = False) -> List[ChangeEvent]:
+        """
+        Чтение событий группой потребителей.
+
+        Args:
+            pending: Вернуть выданные этому потребителю, но не подтвержденные события
+                (восстановление после сбоя) вместо новых
+        """
+        response = self.redis.xreadgroup(group, consumer, {self.stream: '0' if pending else '>'},
+                                         count=count, block=block)
+        return self._decode(response)
+
+    def ack(self, group: str, event_ids: Iterable[str]) -> None:
+        """Подтверждение обработки событий"""
+        event_ids = list(event_ids)
+        if event_ids:
+            self.redis.xack(self.stream, group, *event_ids)
+
+    @staticmethod
+    def _decode(response) -> List[ChangeEvent]:
+        """Приведение ответа XREAD/XREADGROUP к списку (id, поля)"""
+        events = []
+        for _, messages in response or []:
+            for event_id, fields in messages:
+                events.append((
+                    event_id.decode('utf-8'),
+                    {name.decode('utf-8'): value.decode('utf-8') for name, value in fields.items()},
+                ))
+        return events
+
+def create_change_feed() -> Optional[ChangeFeed]:
+    """Лента изменений, если она включена через CHANGE_FEED=1"""
+    if os.getenv('CHANGE_FEED', '0') != '1':
+        return None
+    return ChangeFeed(stream=os.getenv('CHANGE_FEED_STREAM', 'changes'),
+                      maxlen=int(os.getenv('CHANGE_FEED_MAXLEN', 100_000)))
@@ -0,0 +1,129 @@
+"""Модуль регистрации узлов в Redis и распределения ключей консистентным хэшированием."""
+import bisect
+import hashlib
+import os
+import socket
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Set
+from redis import Redis
+
+def _hash(value: str) -> int:
+    """Позиция на кольце: первые 8 байт MD5"""
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+class HashRing:
+    def __init__(self, nodes: Iterable[str], replicas: int = 128):
+        """
+        Args:
+            nodes: Идентификаторы узлов
+            replicas: Виртуальных точек на узел; больше - равномернее распределение
+        """
+        self.nodes = sorted(set(nodes))
+        points = sorted((_hash(f'{node}#{i}'), node) for node in self.nodes for i in range(replicas))
+        self._positions = [position for position, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """Узел, владеющий ключом: первая точка кольца по часовой стрелке"""
+        if not self._positions:
+            return None
+        index = bisect.bisect(self._positions, _hash(key)) % len(self._positions)
+        return self._owners[index]
+
+class ClusterMembership:
+    def __init__(self, redis: Redis, group: str = 'collectors', node_id: Optional[str] = None,
+                 ttl: int = 30, heartbeat_interval: int = 10, replicas: int = 128):
+        """
+        Args:
+            group: Группа узлов (например, collectors)
+            node_id: Идентификатор узла (по умолчанию NODE_ID или hostname-pid)
+            ttl: Через сколько секунд без heartbeat узел считается выбывшим
+        """
+        self.redis = redis
+        self.key = f'cluster:{group}:nodes'
+        self.node_id = node_id or os.getenv('NODE_ID') or f'{socket.gethostname()}-{os.getpid()}'
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.replicas = replicas
+        self._ring = HashRing([self.node_id], replicas)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def heartbeat(self) -> None:
+        """Продление регистрации узла и удаление узлов без heartbeat"""
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zadd(self.key, {self.node_id: now})
+        pipe.zremrangebyscore(self.key, '-inf', now - self.ttl)
+        pipe.execute()
+
+    def start(self) -> None:
+        """Регистрация и фоновые heartbeat"""
+        self.heartbeat()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='cluster-heartbeat', daemon=True)
+        self._thread.start()
+        print(f"Узел {self.node_id} зарегистрирован, узлов в группе: {len(self.nodes())}")
+
+    def stop(self) -> None:
+        """Выход из группы: ключи узла сразу переходят к остальным"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.heartbeat_interval)
+        self.redis.zrem(self.key, self.node_id)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                print(f"Ошибка heartbeat узла {self.node_id}: {e}")
+
+    def nodes(self) -> List[str]:
+        """Живые узлы группы"""
+        members = self.redis.zrangebyscore(self.key, time.time() - self.ttl, '+inf')
+        nodes = [member.decode('utf-8') for member in members]
+        # Свой узел учитываем всегда, даже если heartbeat задержался
+        return sorted(set(nodes) | {self.node_id})
+
+    def ring(self) -> HashRing:
+        """Кольцо по текущему составу группы (перестраивается только при его изменении)"""
+        nodes = self.nodes()
+        if nodes != self._ring.nodes:
+            print(f"Состав группы изменился: {nodes}")
+            self._ring = HashRing(nodes, self.replicas)
+        return self._ring
+
+    def owns(self, key: str) -> bool:
+        """Принадлежит ли ключ этому узлу"""
+        return self.ring().owner(key) == self.node_id
+
+    def iter_owned(self, keys: List[str], is_done: Callable[[str], bool]) -> Iterator[str]:
+        """
+        Необработанные ключи этого узла в порядке списка.
+
+        Владение пересчитывается перед каждым ключом: при выходе узла его
+        ключи подхватывают оставшиеся, при входе - часть ключей уходит новому.
+        Каждый ключ выдается не более одного раза за обход.
+        """
+        attempted: Set[str] = set()
+        while True:
+            ring = self.ring()
+            found = None
+            for key in keys:
+                if key in attempted or ring.owner(key) != self.node_id:
+                    continue
+                attempted.add(key)
+                if not is_done(key):
+                    found = key
+                    break
+            if found is None:
+                return
+            yield found
+
+def create_membership(redis: Redis, group: str) -> Optional[ClusterMembership]:
+    """Участие в группе, если включено COLLECTOR_SHARDING=1"""
+    if os.getenv('COLLECTOR_SHARDING', '0') != '1':
+        return None
+    return ClusterMembership(redis, group, ttl=int(os.getenv('CLUSTER_NODE_TTL', 30)))
@@ -0,0 +1,41 @@
+"""Модуль для сохранения прогресса обхода и возобновления после сбоя."""
+import os
+from typing import Iterable, Optional, Set
+from redis import Redis
+
+class CrawlCheckpoint:
+    def __init__(self, name: str, redis: Optional[Redis] = None):
+        self.redis = redis or Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+        self.cursor_key = f'checkpoint:{name}:cursor'
+        self.categories_key = f'checkpoint:{name}:categories_done'
+        self.brands_key = f'checkpoint:{name}:brands'
+
+    def get_page_cursor(self, category: str) -> int:
+        """Номер последней обработанной страницы категории (0 если не начата)"""
+        page = self.redis.hget(self.cursor_key, category)
+        return int(page) if page else 0
+
+    def is_category_done(self, category: str) -> bool:
+        """Проверка, обработана ли категория полностью"""
+        return bool(self.redis.sismember(self.categories_key, category))
+
+    def completed_brands(self) -> Set[str]:
+        """Получение множества уже обработанных брендов"""
+        return {brand.decode('utf-8') for brand in self.redis.smembers(self.brands_key)}
+
+    def commit_page(self, category: str, page: int, brands: Iterable[str]) -> None:
+        """Атомарная фиксация курсора страницы вместе с обработанными на ней брендами"""
+        brands = list(brands)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(self.cursor_key, category, page)
+        if brands:
+            pipe.sadd(self.brands_key, *brands)
+        pipe.execute()
+
+    def complete_category(self, category: str) -> None:
+        """Отметка категории как полностью обработанной"""
+        self.redis.sadd(self.categories_key, category)
+
+    def reset(self) -> None:
+        """Сброс прогресса после успешного завершения полного обхода"""
+        self.redis.delete(self.cursor_key, self.categories_key, self.brands_key)
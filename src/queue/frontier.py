@@ -0,0 +1,168 @@
+"""Модуль общей для всех процессов очереди с дедупликацией (frontier)."""
+import time
+from typing import Iterable, List, Optional
+from redis import Redis
+from redis.exceptions import ResponseError
+
+# KEYS[1] - множество/Bloom-фильтр просмотренных, KEYS[2] - очередь (необязательно),
+# KEYS[3] - zset времени постановки в очередь (для метрик задержки)
+# ARGV[1] - использовать Bloom-фильтр (1/0), ARGV[2] - TTL множества (0 - без TTL),
+# ARGV[3] - текущее время, ARGV[4] - ставить и встречавшиеся элементы, если их нет в очереди (1/0),
+# ARGV[5..] - элементы
+ENQUEUE_SCRIPT = """
+local use_bloom = ARGV[1] == '1'
+local ttl = tonumber(ARGV[2])
+local force = ARGV[4] == '1' and #KEYS > 1
+local added = {}
+for i = 5, #ARGV do
+    local item = ARGV[i]
+    local is_new
+    if use_bloom then
+        is_new = redis.call('BF.ADD', KEYS[1], item) == 1
+    else
+        is_new = redis.call('SADD', KEYS[1], item) == 1
+    end
+    if is_new or (force and not redis.call('ZSCORE', KEYS[3], item)) then
+        added[#added + 1] = item
+    end
+end
+if #added > 0 and #KEYS > 1 then
+    redis.call('RPUSH', KEYS[2], unpack(added))
+    for _, item in ipairs(added) do
+        redis.call('ZADD', KEYS[3], 'NX', ARGV[3], item)
+    end
+end
+if ttl > 0 then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+return added
+"""
+
+# KEYS[1] - очередь, KEYS[2] - zset времени постановки в очередь
+POP_SCRIPT = """
+local item = redis.call('LPOP', KEYS[1])
+if item then
+    redis.call('ZREM', KEYS[2], item)
+end
+return item
+"""
+
+# KEYS[1] - zset захватов (элемент -> срок действия)
+# ARGV[1] - текущее время, ARGV[2] - срок нового захвата, ARGV[3..] - элементы
+CLAIM_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local claimed = {}
+for i = 3, #ARGV do
+    if redis.call('ZADD', KEYS[1], 'NX', ARGV[2], ARGV[i]) == 1 then
+        claimed[#claimed + 1] = ARGV[i]
+    end
+end
+return claimed
+"""
+
+def enqueued_at_key(queue_key: str) -> str:
+    """Ключ zset со временем постановки элементов очереди"""
+    return f'{queue_key}:enqueued_at'
+
+class Frontier:
+    def __init__(self, redis: Redis, seen_key: str, queue_key: Optional[str] = None,
+                 use_bloom: bool = False, ttl: int = 0, batch_size: int = 500,
+                 bloom_error_rate: float = 0.001, bloom_capacity: int = 1_000_000):
+        self.redis = redis
+        self.queue_key = queue_key
+        self.ttl = ttl
+        self.batch_size = batch_size
+        # Истекший Bloom-фильтр BF.ADD пересоздал бы с параметрами по умолчанию,
+        # поэтому с TTL используется обычное множество
+        self.use_bloom = (use_bloom and not ttl
+                          and self._reserve_bloom(f'{seen_key}:bloom', bloom_error_rate, bloom_capacity))
+        # Bloom-фильтр хранится под отдельным ключом, чтобы не конфликтовать с типом множества
+        self.seen_key = f'{seen_key}:bloom' if self.use_bloom else seen_key
+        self._script = self.redis.register_script(ENQUEUE_SCRIPT)
+        self._pop_script = self.redis.register_script(POP_SCRIPT)
+
+    def _reserve_bloom(self, key: str, error_rate: float, capacity: int) -> bool:
+        """Создание масштабируемого Bloom-фильтра (требуется модуль RedisBloom)"""
+        try:
+            self.redis.execute_command('BF.RESERVE', key, error_rate, capacity, 'EXPANSION', 2)
+            return True
+        except ResponseError as e:
+            if 'exists' in str(e).lower():
+                return True
+            print(f"Bloom-фильтр недоступен, используем множество: {e}")
+            return False
+
+    def add(self, items: Iterable[str], force: bool = False) -> List[str]:
+        """
+        Атомарная проверка и добавление элементов пачками.
+
+        Args:
+            items: Элементы (например, slug брендов)
+            force: Ставить в очередь и встречавшиеся ранее элементы, если они не ожидают в ней
+                (например, бренды, payload которых изменился)
+        Returns:
+            List[str]: Элементы, которые ранее не встречались и были добавлены
+        """
+        items = list(dict.fromkeys(items))
+        keys = [self.seen_key]
+        if self.queue_key:
+            keys += [self.queue_key, enqueued_at_key(self.queue_key)]
+        added = []
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            result = self._script(keys=keys, args=['1' if self.use_bloom else '0', self.ttl, time.time(),
+                                               '1' if force else '0', *batch])
+            added.extend(item.decode('utf-8') for item in result)
+        return added
+
+    def pop(self) -> Optional[str]:
+        """Извлечение следующего элемента очереди"""
+        item = self._pop_script(keys=[self.queue_key, enqueued_at_key(self.queue_key)])
+        return item.decode('utf-8') if item else None
+
+    def is_seen(self, item: str) -> bool:
+        """Проверка, встречался ли элемент"""
+        if self.use_bloom:
+            return bool(self.redis.execute_command('BF.EXISTS', self.seen_key, item))
+        return bool(self.redis.sismember(self.seen_key, item))
+
+class ClaimSet:
+    """
+    Захваты элементов с ограниченным сроком действия.
+
+    Захват истекает сам, если процесс упал, и снимается явно при ошибке,
+    поэтому недообработанный элемент снова доступен при возобновлении обхода.
+    """
+
+    def __init__(self, redis: Redis, key: str, claim_ttl: int = 3600, confirmed_ttl: int = 24 * 3600):
+        self.redis = redis
+        self.key = key
+        self.claim_ttl = claim_ttl
+        self.confirmed_ttl = confirmed_ttl
+        self._script = self.redis.register_script(CLAIM_SCRIPT)
+
+    def claim(self, items: Iterable[str]) -> List[str]:
+        """Захват элементов; возвращает те, что не захвачены другими"""
+        items = list(dict.fromkeys(items))
+        if not items:
+            return []
+        now = time.time()
+        result = self._script(keys=[self.key], args=[now, now + self.claim_ttl, *items])
+        return [item.decode('utf-8') for item in result]
+
+    def confirm(self, items: Iterable[str]) -> None:
+        """Продление захвата обработанных элементов до confirmed_ttl"""
+        items = list(items)
+        if items:
+            deadline = time.time() + self.confirmed_ttl
+            self.redis.zadd(self.key, {item: deadline for item in items}, xx=True)
+
+    def release(self, items: Iterable[str]) -> None:
+        """Снятие захвата элементов, которые не удалось обработать"""
+        items = list(items)
+        if items:
+            self.redis.zrem(self.key, *items)
+
+    def clear(self) -> None:
+        """Снятие всех захватов, например после завершения полного обхода"""
+        self.redis.delete(self.key)
@@ -1,77 +1,155 @@
 """Модуль для работы с очередями задач."""
 import os
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, List, Set, Tuple
 from redis import Redis
-from rq import Queue, Worker
-from rq.job import Job
+from src.queue.frontier import POP_SCRIPT, ClaimSet, Frontier, enqueued_at_key
+from src.monitoring.tracing import attach_context
 
 class TaskQueue:
     def __init__(self):
         self.redis = Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
-        self.brand_queue = Queue('brand_processing', connection=self.redis)
-        self.product_queue = Queue('product_extraction', connection=self.redis)
-
-    def enqueue_brand_processing(self, brand_name: str, priority: int = 1) -> Optional[Job]:
-        """Добавление задачи на обработку бренда в очередь"""
-        try:
-            return self.brand_queue.enqueue(
-                'src.tasks.process_brand',
-                args=(brand_name,),
-                job_timeout='1h',
-                result_ttl=24*3600,  # Храним результат 24 часа
-                priority=priority
-            )
-        except Exception as e:
-            print(f"Ошибка при добавлении бренда {brand_name} в очередь: {e}")
-            return None
-
-    def enqueue_product_extraction(self, brand_name: str, priority: int = 1) -> Optional[Job]:
-        """Добавление задачи на извлечение продуктов в очередь"""
-        try:
-            return self.product_queue.enqueue(
-                'src.tasks.extract_products',
-                args=(brand_name,),
-                job_timeout='2h',
-                result_ttl=24*3600,
-                priority=priority
-            )
-        except Exception as e:
-            print(f"Ошибка при добавлении извлечения продуктов для {brand_name} в очередь: {e}")
-            return None
-
-    def get_job_status(self, job_id: str) -> Dict[str, Any]:
-        """Получение статуса задачи"""
-        job = Job.fetch(job_id, connection=self.redis)
-        return {
-            'id': job.id,
-            'status': job.get_status(),
-            'result': job.result,
-            'error': job.exc_info,
-            'enqueued_at': job.enqueued_at,
-            'started_at': job.started_at,
-            'ended_at': job.ended_at
-        }
-
-    def clear_failed_jobs(self):
-        """Очистка неудачных задач"""
-        self.brand_queue.delete_failed_jobs()
-        self.product_queue.delete_failed_jobs()
-
-    def requeue_failed_jobs(self):
-        """Перезапуск неудачных задач"""
-        self.brand_queue.requeue_failed_jobs()
-        self.product_queue.requeue_failed_jobs()
-
-    def enqueue_brand_for_processing(self, brand_name: str) -> None:
+
+        use_bloom = os.getenv('FRONTIER_BLOOM') == '1'
+        # Бренды, поставленные в очередь на извлечение продуктов
+        self.brands_frontier = Frontier(self.redis, 'processed_brands', queue_key='brands_queue',
+                                        use_bloom=use_bloom)
+        # Бренды, взятые в обход одним из коллекторов: захват истекает через BRAND_CLAIM_TTL,
+        # после сохранения бренда продлевается на COLLECTED_BRANDS_TTL
+        self.brand_claims = ClaimSet(self.redis, 'collected_brands:claims',
+                                     claim_ttl=int(os.getenv('BRAND_CLAIM_TTL', 3600)),
+                                     confirmed_ttl=int(os.getenv('COLLECTED_BRANDS_TTL', 24*3600)))
+        self._pop_script = self.redis.register_script(POP_SCRIPT)
+
+    def enqueue_brand_for_processing(self, brand_name: str, force: bool = False) -> None:
         """Добавление бренда в очередь на обработку"""
-        if not self.redis.sismember('processed_brands', brand_name):
-            self.redis.rpush('brands_queue', brand_name)
-            print(f"Бренд {brand_name} добавлен в очередь")
+        self.enqueue_brands_for_processing([brand_name], force=force)
+
+    def enqueue_brands_for_processing(self, brand_names: List[str], force: bool = False) -> List[str]:
+        """
+        Атомарное добавление пачки брендов в очередь с пропуском уже обработанных.
+
+        Единственный путь в brands_queue: и коллектор, и стадии fetch_brand и
+        refresh_brand конвейера ставят бренды через frontier.
+
+        Args:
+            force: Ставить и уже обработанные бренды (payload изменился или
+                извлечение не завершено), если они не ожидают в очереди
+        """
+        added = self.brands_frontier.add(brand_names, force=force)
+        # Экстрактор продолжит трассировку бренда, начатую коллектором
+        attach_context(self.redis, self.brands_frontier.queue_key, added)
+        if added:
+            print(f"Добавлено в очередь брендов: {len(added)}")
+        return added
+
+    def claim_brands(self, brand_names: List[str]) -> List[str]:
+        """Захват брендов для обхода: возвращает только не взятые другими коллекторами"""
+        return self.brand_claims.claim(brand_names)
+
+    def confirm_brands(self, brand_names: List[str]) -> None:
+        """Бренды сохранены: другие коллекторы не берут их до конца обхода"""
+        self.brand_claims.confirm(brand_names)
+
+    def release_brands(self, brand_names: List[str]) -> None:
+        """Бренды не удалось сохранить: снимаем захват для повторной попытки"""
+        self.brand_claims.release(brand_names)
+
+    def reset_brand_claims(self) -> None:
+        """Обход завершен: следующий полный обход снова берет все бренды"""
+        self.brand_claims.clear()
 
     def get_next_brand(self) -> Optional[str]:
         """Получение следующего бренда из очереди"""
-        brand = self.redis.lpop('brands_queue')
-        if brand:
-            self.redis.sadd('processed_brands', brand)
-            return brand.decode('utf-8')
-        return None 
\ No newline at end of file
+        return self.brands_frontier.pop()
+
+    def enqueue_changed_urls(self, kind: str, entries: List[Tuple[str, Optional[str]]]) -> int:
+        """
+        Добавление URL в очередь, если их lastmod изменился с прошлого обхода.
+        lastmod запоминается как ожидающий: обработанным URL становится только
+        после успешного сохранения (mark_url_seen), иначе попадет в следующий обход.
+
+        Args:
+            kind: Тип URL (brand, product)
+            entries: Пары (url, lastmod)
+        Returns:
+            int: Количество добавленных в очередь URL
+        """
+        if not entries:
+            return 0
+        lastmod_key = f'sitemap_lastmod:{kind}'
+        known = self.redis.hmget(lastmod_key, [url for url, _ in entries])
+
+        changed = [
+            (url, lastmod) for (url, lastmod), previous in zip(entries, known)
+            if previous is None or lastmod is None or previous.decode('utf-8') != lastmod
+        ]
+        if not changed:
+            return 0
+
+        queue_key = f'{kind}_urls_queue'
+        # URL, еще ожидающие в очереди с прошлого обхода, повторно не ставятся
+        pending = self.pending_urls(kind, [url for url, _ in changed])
+        urls = [url for url in dict.fromkeys(url for url, _ in changed) if url not in pending]
+        now = time.time()
+        pipe = self.redis.pipeline()
+        if urls:
+            pipe.rpush(queue_key, *urls)
+            pipe.zadd(enqueued_at_key(queue_key), {url: now for url in urls}, nx=True)
+            attach_context(pipe, queue_key, urls)
+        lastmods = {url: lastmod for url, lastmod in changed if lastmod}
+        if lastmods:
+            pipe.hset(f'sitemap_lastmod_pending:{kind}', mapping=lastmods)
+        pipe.execute()
+        return len(urls)
+
+    def pending_urls(self, kind: str, urls: List[str]) -> Set[str]:
+        """URL, которые ожидают в очереди заданного типа"""
+        if not urls:
+            return set()
+        # Элементы очереди есть в zset времени постановки, пока их не извлекли
+        scores = self.redis.zmscore(enqueued_at_key(f'{kind}_urls_queue'), urls)
+        return {url for url, score in zip(urls, scores) if score is not None}
+
+    def enqueue_urls(self, kind: str, urls: List[str]) -> int:
+        """
+        Добавление URL в очередь без проверки lastmod, пропуская уже ожидающие в ней.
+
+        Returns:
+            int: Количество добавленных в очередь URL
+        """
+        queue_key = f'{kind}_urls_queue'
+        pending = self.pending_urls(kind, urls)
+        urls = [url for url in dict.fromkeys(urls) if url not in pending]
+        if not urls:
+            return 0
+        pipe = self.redis.pipeline()
+        pipe.rpush(queue_key, *urls)
+        pipe.zadd(enqueued_at_key(queue_key), {url: time.time() for url in urls}, nx=True)
+        attach_context(pipe, queue_key, urls)
+        pipe.execute()
+        return len(urls)
+
+    def is_url_changed(self, kind: str, url: str, lastmod: str) -> bool:
+        """Проверка, изменился ли lastmod URL с прошлого обхода"""
+        previous = self.redis.hget(f'sitemap_lastmod:{kind}', url)
+        return previous is None or previous.decode('utf-8') != lastmod
+
+    def take_pending_lastmod(self, kind: str, url: str) -> Optional[str]:
+        """Извлечение lastmod, с которым URL был поставлен в очередь"""
+        pipe = self.redis.pipeline()
+        pipe.hget(f'sitemap_lastmod_pending:{kind}', url)
+        pipe.hdel(f'sitemap_lastmod_pending:{kind}', url)
+        lastmod, _ = pipe.execute()
+        return lastmod.decode('utf-8') if lastmod else None
+
+    def mark_url_seen(self, kind: str, url: str, lastmod: Optional[str]) -> None:
+        """Сохранение lastmod обработанного URL"""
+        if lastmod:
+            self.redis.hset(f'sitemap_lastmod:{kind}', url, lastmod)
+
+    def get_next_url(self, kind: str) -> Optional[str]:
+        """Получение следующего URL из очереди заданного типа"""
+        queue_key = f'{kind}_urls_queue'
+        url = self._pop_script(keys=[queue_key, enqueued_at_key(queue_key)])
+        return url.decode('utf-8') if url else None
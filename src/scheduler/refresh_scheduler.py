@@ -0,0 +1,152 @@
+"""
+Планировщик выборочного обновления брендов.
+
+Вместо полного повторного обхода бренды ставятся в очередь refresh_urls_queue
+(вход стадии refresh_brand конвейера) по убыванию ценности обновления:
+
+    score = P(payload изменился) * (1 + popularity_weight * ln(1 + обращения))
+    P = 1 - exp(-rate * age)
+
+rate - частота изменений payload в час по истории загрузок (с априорной
+оценкой prior_changes изменений за prior_hours часов для новых брендов),
+age - часы с последней обработки, обращения - запросы к бренду через API
+с затуханием. Число постановок ограничено бюджетом загрузок в час, общим
+для всех экземпляров планировщика.
+"""
+import heapq
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+from src.processor.product_listing import ProductListingFetcher
+from src.queue.access_stats import AccessStats
+from src.queue.task_queue import TaskQueue
+from src.storage.db_storage import DBStorage
+
+BASE_URL = 'https://www.knowde.com'
+
+# KEYS[1] - счетчик текущего часа; ARGV[1] - запрошено, ARGV[2] - бюджет, ARGV[3] - TTL счетчика
+RESERVE_SCRIPT = """
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+local granted = math.min(tonumber(ARGV[1]), tonumber(ARGV[2]) - used)
+if granted <= 0 then
+    return 0
+end
+redis.call('INCRBY', KEYS[1], granted)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return granted
+"""
+
+@dataclass
+class RefreshCandidate:
+    brand_name: str
+    url: str
+    age_hours: float
+    change_rate: float
+    accesses: float
+    score: float
+
+class RefreshScheduler:
+    def __init__(self, storage: DBStorage, queue: TaskQueue, access_stats: Optional[AccessStats] = None,
+                 budget_per_hour: int = 500, interval: float = 300.0, popularity_weight: float = 1.0,
+                 half_life_hours: float = 24.0, min_age_hours: float = 6.0,
+                 prior_changes: float = 1.0, prior_hours: float = 168.0):
+        """
+        Args:
+            budget_per_hour: Предел постановок брендов на обновление в час
+            interval: Пауза между циклами планирования, секунд
+            popularity_weight: Вес обращений через API относительно вероятности изменения
+            half_life_hours: Период полураспада счетчика обращений
+            min_age_hours: Бренды, обработанные недавно, не обновляются
+            prior_changes: Априорное число изменений за prior_hours часов
+                (оценка частоты для брендов без истории загрузок)
+            prior_hours: Период априорной оценки, часов
+        """
+        self.storage = storage
+        self.queue = queue
+        self.access_stats = access_stats or AccessStats(queue.redis)
+        self.budget_per_hour = budget_per_hour
+        self.interval = interval
+        self.popularity_weight = popularity_weight
+        self.half_life_hours = half_life_hours
+        self.min_age_hours = min_age_hours
+        self.prior_changes = prior_changes
+        self.prior_hours = prior_hours
+        self._reserve_script = queue.redis.register_script(RESERVE_SCRIPT)
+
+    @classmethod
+    def from_env(cls, storage: DBStorage, queue: TaskQueue) -> 'RefreshScheduler':
+        return cls(
+            storage, queue,
+            budget_per_hour=int(os.getenv('REFRESH_BUDGET_PER_HOUR', 500)),
+            interval=float(os.getenv('REFRESH_INTERVAL', 300)),
+            popularity_weight=float(os.getenv('REFRESH_POPULARITY_WEIGHT', 1.0)),
+            half_life_hours=float(os.getenv('REFRESH_ACCESS_HALF_LIFE_HOURS', 24)),
+            min_age_hours=float(os.getenv('REFRESH_MIN_AGE_HOURS', 6)),
+        )
+
+    def change_rate(self, change_count: int, observed_hours: float) -> float:
+        """Оценка частоты изменений payload бренда в час"""
+        return (change_count + self.prior_changes) / (observed_hours + self.prior_hours)
+
+    def score(self, age_hours: float, change_rate: float, accesses: float) -> float:
+        """Ценность обновления бренда"""
+        stale_probability = 1.0 - math.exp(-change_rate * age_hours)
+        return stale_probability * (1.0 + self.popularity_weight * math.log1p(accesses))
+
+    def plan(self, limit: int) -> List[RefreshCandidate]:
+        """Бренды с наибольшей ценностью обновления"""
+        if limit <= 0:
+            return []
+        accesses = self.access_stats.counts(self.half_life_hours)
+        candidates = []
+        for brand_name, page, query, age_hours, change_count, observed_hours in self.storage.load_refresh_candidates():
+            if age_hours < self.min_age_hours:
+                continue
+            path = ProductListingFetcher.resolve_path({'page': page, 'query': query})
+            if not path:
+                continue
+            rate = self.change_rate(change_count, observed_hours)
+            brand_accesses = accesses.get(brand_name, 0.0)
+            candidates.append(RefreshCandidate(
+                brand_name=brand_name, url=BASE_URL + path, age_hours=age_hours, change_rate=rate,
+                accesses=brand_accesses, score=self.score(age_hours, rate, brand_accesses),
+            ))
+        # Бренды, уже ожидающие загрузки, не расходуют бюджет повторно
+        pending = self.queue.pending_urls('refresh', [candidate.url for candidate in candidates])
+        candidates = [candidate for candidate in candidates if candidate.url not in pending]
+        return heapq.nlargest(limit, candidates, key=lambda candidate: candidate.score)
+
+    def _reserve(self, requested: int) -> int:
+        """Резервирование постановок в бюджете текущего часа"""
+        hour_key = f'refresh_budget:{int(time.time() // 3600)}'
+        return int(self._reserve_script(keys=[hour_key], args=[requested, self.budget_per_hour, 7200]))
+
+    def run_once(self) -> int:
+        """
+        Один цикл планирования.
+
+        Бюджет часа расходуется равномерно: за цикл - доля, пропорциональная интервалу.
+
+        Returns:
+            int: Количество брендов, поставленных на обновление
+        """
+        per_cycle = max(1, math.ceil(self.budget_per_hour * self.interval / 3600))
+        planned = self.plan(per_cycle)
+        granted = self._reserve(len(planned)) if planned else 0
+        selected = planned[:granted]
+        enqueued = self.queue.enqueue_urls('refresh', [candidate.url for candidate in selected])
+        if selected:
+            top = ', '.join(f"{c.brand_name} ({c.score:.2f})" for c in selected[:5])
+            print(f"Поставлено на обновление брендов: {enqueued} из {len(selected)}; первые: {top}")
+        return enqueued
+
+    def run(self) -> None:
+        """Бесконечный цикл планирования"""
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Ошибка планирования обновлений: {e}")
+            time.sleep(self.interval)
@@ -1,15 +1,37 @@
 """Сервисный слой для работы с брендами."""
-from typing import Dict, List, Optional
-from selenium.webdriver.remote.webdriver import WebDriver
+import re
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+from src.storage.brand_payload import PROJECTION_VERSION
 from src.storage.db_storage import DBStorage
 from src.processor.brand_processor import BrandProcessor
-from src.processor.product_extractor import ProductExtractor
+from src.processor.spec_parser import normalize_property, normalize_value
+
+if TYPE_CHECKING:
+    # Код браузера и загрузки не нужен API: импортируется только при извлечении продуктов
+    from selenium.webdriver.remote.webdriver import WebDriver
+    from src.processor.product_extractor import ProductExtractor
+    from src.processor.product_listing import ProductListingFetcher
+
+FIELD_RE = re.compile(r'^[\w\- ]+(\.[\w\- ]+)*$')
+MAX_FIELDS = 50
 
 class BrandService:
-    def __init__(self, storage: DBStorage, processor: BrandProcessor, driver: Optional[WebDriver] = None):
+    def __init__(self, storage: DBStorage, processor: BrandProcessor, driver: Optional['WebDriver'] = None,
+                 listing_fetcher: Optional['ProductListingFetcher'] = None):
         self.storage = storage
         self.processor = processor
-        self.product_extractor = ProductExtractor(storage, driver=driver)
+        self.driver = driver
+        self.listing_fetcher = listing_fetcher
+        self._product_extractor: Optional['ProductExtractor'] = None
+
+    @property
+    def product_extractor(self) -> 'ProductExtractor':
+        """Экстрактор создается при первом извлечении продуктов"""
+        if self._product_extractor is None:
+            from src.processor.product_extractor import ProductExtractor
+            self._product_extractor = ProductExtractor(self.storage, driver=self.driver,
+                                                       listing_fetcher=self.listing_fetcher)
+        return self._product_extractor
 
     def get_brand_data(self, brand_name: str, include_products: bool = False) -> Optional[Dict]:
         """Получение данных бренда"""
@@ -18,6 +40,51 @@ class BrandService:
             data['pageProps'].pop('most_viewed_products', None)
         return data
 
+    def get_brand_json(self, brand_name: str, include_products: bool = False,
+                       fields: Optional[List[str]] = None) -> Optional[bytes]:
+        """Получение данных бренда готовым JSON без построения объектов Python"""
+        return self.storage.load_brand_json(brand_name, include_products, fields)
+
+    def iter_brands_json(self, brand_names: List[str], fields: Optional[List[str]] = None,
+                         include_products: bool = False) -> Iterator[bytes]:
+        """Потоковая выдача нескольких брендов"""
+        return self.storage.iter_brands_json(brand_names, fields, include_products)
+
+    def iter_products_json(self, product_ids: List[str], fields: Optional[List[str]] = None) -> Iterator[bytes]:
+        """Потоковая выдача нескольких продуктов"""
+        return self.storage.iter_products_json(product_ids, fields)
+
+    @staticmethod
+    def parse_fields(fields: Optional[Iterable[str]]) -> Optional[List[str]]:
+        """
+        Разбор списка полей вида 'pageProps.name,pageProps.description'.
+
+        Raises:
+            ValueError: Некорректный путь или слишком много полей
+        """
+        if not fields:
+            return None
+        parsed = []
+        for item in fields:
+            for field in item.split(','):
+                field = field.strip()
+                if not field:
+                    continue
+                if not FIELD_RE.match(field):
+                    raise ValueError(f"Некорректное поле: {field}")
+                if field not in parsed:
+                    parsed.append(field)
+        if len(parsed) > MAX_FIELDS:
+            raise ValueError(f"Не более {MAX_FIELDS} полей")
+        return parsed or None
+
+    def get_brand_etag(self, brand_name: str, variant: str = '') -> Optional[str]:
+        """ETag бренда по хэшу сохраненного payload и версии проекции"""
+        version = self.storage.get_brand_version(brand_name)
+        # Слабый валидатор: тело может отдаваться сжатым. Новая проекция меняет тело
+        # при том же payload, поэтому ее версия входит в ETag
+        return f'W/"{version}-p{PROJECTION_VERSION}{variant}"' if version else None
+
     def get_brand_summary(self, brand_name: str) -> Optional[Dict]:
         """Получение сводки о бренде"""
         return self.processor.get_brand_summary(brand_name)
@@ -27,17 +94,32 @@ class BrandService:
         """Поиск продуктов"""
         return self.processor.search_products(brand_name, category, keyword)
 
+    def search_products_by_spec(self, prop: str, min_value: Optional[float] = None,
+                                max_value: Optional[float] = None, unit: Optional[str] = None,
+                                limit: int = 100) -> List[Dict]:
+        """Поиск продуктов по числовому диапазону характеристики"""
+        min_value, canonical_unit = normalize_value(min_value, unit)
+        max_value, _ = normalize_value(max_value, unit)
+        return self.storage.search_product_specs(
+            normalize_property(prop), min_value, max_value, canonical_unit, limit
+        )
+
+    def get_facets(self, filters: List[str], facets: Optional[List[str]] = None, limit: int = 50) -> Dict:
+        """Счетчики фасетов для фильтров вида 'фасет:значение'"""
+        pairs = [tuple(f.split(':', 1)) for f in filters if ':' in f]
+        return self.storage.get_facet_counts(pairs, facets, limit)
+
     def list_available_brands(self) -> List[str]:
         """Получение списка брендов"""
         return self.storage.list_brands()
 
-    def extract_brand_products(self, brand_name: str) -> List[Dict]:
+    def extract_brand_products(self, brand_name: str) -> int:
         """
-        Извлекает все продукты бренда в отдельные файлы.
+        Извлекает все продукты бренда в отдельные записи.
         
         Args:
             brand_name: Название бренда
         Returns:
-            List[Dict]: Список обработанных продуктов
+            int: Количество обработанных продуктов
         """
         return self.product_extractor.extract_products_from_brand(brand_name) 
\ No newline at end of file
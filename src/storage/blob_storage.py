@@ -0,0 +1,66 @@
+"""Модуль контентно-адресуемого хранения файлов (документы TDS/SDS)."""
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+class LocalBlobStore:
+    def __init__(self, root: str = "data/documents"):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, sha256: str) -> Path:
+        """Путь к файлу по хэшу содержимого"""
+        return self.root / sha256[:2] / sha256
+
+    def exists(self, sha256: str) -> bool:
+        """Проверка наличия файла"""
+        return self.path_for(sha256).exists()
+
+    def put_file(self, file_path: Path, sha256: str, content_type: Optional[str] = None) -> None:
+        """Перенос загруженного файла в хранилище"""
+        target = self.path_for(sha256)
+        if target.exists():
+            file_path.unlink()
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(file_path), str(target))
+
+class S3BlobStore:
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None):
+        # boto3 нужен только при хранении в S3-совместимом хранилище
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("Для S3BlobStore установите boto3") from e
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+
+    def key_for(self, sha256: str) -> str:
+        """Ключ объекта по хэшу содержимого"""
+        return f"{self.prefix}/{sha256[:2]}/{sha256}" if self.prefix else f"{sha256[:2]}/{sha256}"
+
+    def exists(self, sha256: str) -> bool:
+        """Проверка наличия объекта"""
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key_for(sha256))
+            return True
+        except Exception:
+            return False
+
+    def put_file(self, file_path: Path, sha256: str, content_type: Optional[str] = None) -> None:
+        """Загрузка файла в бакет"""
+        if not self.exists(sha256):
+            extra = {'ContentType': content_type} if content_type else None
+            self.client.upload_file(str(file_path), self.bucket, self.key_for(sha256), ExtraArgs=extra)
+        file_path.unlink()
+
+def create_blob_store():
+    """Создание хранилища по BLOB_STORE_URL (s3://bucket/prefix или локальный путь)"""
+    url = os.getenv('BLOB_STORE_URL', 'data/documents')
+    parsed = urlparse(url)
+    if parsed.scheme == 's3':
+        return S3BlobStore(parsed.netloc, parsed.path, endpoint_url=os.getenv('S3_ENDPOINT_URL'))
+    return LocalBlobStore(url)
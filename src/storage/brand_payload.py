@@ -0,0 +1,96 @@
+"""Модуль для проекции данных бренда и архивирования исходного payload."""
+import hashlib
+import json
+from typing import Dict, Optional, Tuple
+import zstandard
+
+# Поля pageProps, которые читаются из горячей таблицы brands
+HOT_PAGE_PROPS = ('name', 'description', 'social_links', 'hq_address', 'most_viewed_products')
+# Ключи state.data в dehydratedState.queries, используемые экстрактором
+HOT_QUERY_KEYS = ('details', 'products')
+
+# Версия проекции: увеличивается при изменении project_brand_data, чтобы строки brands
+# со старой проекцией перезаписывались и при неизмененном payload
+PROJECTION_VERSION = 1
+
+def project_brand_data(data: Dict) -> Dict:
+    """
+    Оставляет в данных бренда только используемые поля.
+
+    Args:
+        data: Полный __NEXT_DATA__ бренда
+    Returns:
+        Dict: Проекция для хранения в таблице brands
+    """
+    page_props = data.get('pageProps', {})
+    projected = {key: page_props[key] for key in HOT_PAGE_PROPS if key in page_props}
+
+    queries = []
+    for query in page_props.get('dehydratedState', {}).get('queries', []):
+        query_data = query.get('state', {}).get('data')
+        if not isinstance(query_data, dict):
+            continue
+        kept = {key: query_data[key] for key in HOT_QUERY_KEYS if key in query_data}
+        if kept:
+            queries.append({'queryKey': query.get('queryKey'), 'state': {'data': kept}})
+    projected['dehydratedState'] = {'queries': queries}
+
+    return {
+        'pageProps': projected,
+        # Нужны для восстановления URL страницы и JSON-эндпоинтов Next.js
+        'buildId': data.get('buildId'),
+        'page': data.get('page'),
+        'query': data.get('query'),
+    }
+
+class PayloadArchive:
+    def __init__(self, cur, level: int = 10):
+        self.cur = cur
+        self.compressor = zstandard.ZstdCompressor(level=level)
+        self.decompressor = zstandard.ZstdDecompressor()
+
+    @staticmethod
+    def encode(data: Dict) -> Tuple[str, bytes]:
+        """Каноническая сериализация payload и его SHA-256"""
+        # Не заменять на orjson: байты отличаются от json.dumps (ранее сохраненные хэши
+        # перестанут совпадать), а целые больше 64 бит orjson не кодирует
+        raw = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(raw).hexdigest(), raw
+
+    def create_tables(self) -> None:
+        """Создание таблицы архива"""
+        self.cur.execute("""
+            CREATE TABLE IF NOT EXISTS brand_payloads (
+                payload_hash CHAR(64) PRIMARY KEY,
+                payload BYTEA NOT NULL,
+                raw_size INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+    def save(self, data: Dict) -> str:
+        """
+        Сохраняет сжатый payload, если такого содержимого еще нет.
+        Выполняется в транзакции вызывающего кода, commit не делается.
+
+        Returns:
+            str: SHA-256 исходного payload
+        """
+        payload_hash, raw = self.encode(data)
+        self.cur.execute("""
+            INSERT INTO brand_payloads (payload_hash, payload, raw_size)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (payload_hash) DO NOTHING;
+        """, (payload_hash, self.compressor.compress(raw), len(raw)))
+        return payload_hash
+
+    def load(self, payload_hash: str) -> Optional[Dict]:
+        """Загрузка и распаковка payload по хэшу"""
+        self.cur.execute("""
+            SELECT payload FROM brand_payloads WHERE payload_hash = %s;
+        """, (payload_hash,))
+        result = self.cur.fetchone()
+        if not result:
+            return None
+        # orjson читает целые больше 64 бит как float, и хэш восстановленного payload изменился бы
+        return json.loads(self.decompressor.decompress(bytes(result[0])))
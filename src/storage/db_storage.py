@@ -1,16 +1,25 @@
 """Модуль для работы с базой данных PostgreSQL."""
+import io
 import os
 import json
-from typing import Dict, List, Optional
+import hashlib
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
 import psycopg2
-from psycopg2.extras import Json
+from psycopg2.extras import execute_values
 import time
+from src.storage.json_codec import Json, register as register_json
+from src.storage.brand_payload import PROJECTION_VERSION, PayloadArchive, project_brand_data
+from src.processor.records import ProductRecord, ProductSpec
+from src.queue.change_feed import CREATED, UPDATED, ChangeFeed, create_change_feed
 
 class DBStorage:
-    def __init__(self):
+    def __init__(self, change_feed: Optional[ChangeFeed] = None):
         self.conn = None
         self.cur = None
         self.connect()
+        self.archive = PayloadArchive(self.cur)
+        self._value_ids: Dict[str, int] = {}
+        self.change_feed = change_feed or create_change_feed()
         self.create_tables()
 
     def connect(self):
@@ -24,6 +33,7 @@ class DBStorage:
                     os.getenv('DATABASE_URL'),
                     connect_timeout=10
                 )
+                register_json(self.conn)
                 self.cur = self.conn.cursor()
                 
                 # Проверяем подключение
@@ -56,26 +66,148 @@ class DBStorage:
                     data JSONB NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 );
+
+                ALTER TABLE brands ADD COLUMN IF NOT EXISTS payload_hash CHAR(64);
+                -- Статистика загрузок бренда для планировщика обновлений
+                ALTER TABLE brands ADD COLUMN IF NOT EXISTS fetch_count INTEGER NOT NULL DEFAULT 0;
+                ALTER TABLE brands ADD COLUMN IF NOT EXISTS change_count INTEGER NOT NULL DEFAULT 0;
+                ALTER TABLE brands ADD COLUMN IF NOT EXISTS last_fetched_at TIMESTAMP;
+                ALTER TABLE brands ADD COLUMN IF NOT EXISTS last_processed_at TIMESTAMP;
+                ALTER TABLE brands ADD COLUMN IF NOT EXISTS projection_version INTEGER;
+
+                -- Интернированные значения свойств
+                CREATE TABLE IF NOT EXISTS property_values (
+                    id SERIAL PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS property_values_md5_idx ON property_values (md5(value));
+
+                CREATE TABLE IF NOT EXISTS brand_properties (
+                    brand_name VARCHAR(255) REFERENCES brands(brand_name) ON DELETE CASCADE,
+                    key VARCHAR(255) NOT NULL,
+                    value_id INTEGER NOT NULL REFERENCES property_values(id),
+                    PRIMARY KEY (brand_name, key, value_id)
+                );
+                CREATE INDEX IF NOT EXISTS brand_properties_key_value_idx ON brand_properties (key, value_id);
+
+                CREATE TABLE IF NOT EXISTS product_properties (
+                    product_id VARCHAR(255) REFERENCES products(id) ON DELETE CASCADE,
+                    name VARCHAR(255) NOT NULL,
+                    value_id INTEGER NOT NULL REFERENCES property_values(id),
+                    PRIMARY KEY (product_id, name, value_id)
+                );
+                CREATE INDEX IF NOT EXISTS product_properties_name_value_idx ON product_properties (name, value_id);
+
+                -- Соответствие URL документа и его содержимого в хранилище
+                CREATE TABLE IF NOT EXISTS document_blobs (
+                    url TEXT PRIMARY KEY,
+                    sha256 CHAR(64) NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    size BIGINT,
+                    content_type TEXT,
+                    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE INDEX IF NOT EXISTS document_blobs_sha256_idx ON document_blobs (sha256);
+
+                -- Числовые характеристики продуктов в канонических единицах
+                CREATE TABLE IF NOT EXISTS product_specs (
+                    product_id VARCHAR(255) REFERENCES products(id) ON DELETE CASCADE,
+                    property VARCHAR(255) NOT NULL,
+                    min_value DOUBLE PRECISION,
+                    max_value DOUBLE PRECISION,
+                    unit VARCHAR(32),
+                    raw TEXT
+                );
+                CREATE INDEX IF NOT EXISTS product_specs_property_range_idx
+                    ON product_specs (property, min_value, max_value);
+                CREATE INDEX IF NOT EXISTS product_specs_product_idx ON product_specs (product_id);
+
+                -- Плоское представление фасетов продуктов (свойства продукта и его бренда)
+                CREATE MATERIALIZED VIEW IF NOT EXISTS product_facet_values AS
+                    SELECT pp.product_id, pp.name AS facet, pp.value_id
+                    FROM product_properties pp
+                    UNION
+                    SELECT p.id, bp.key, bp.value_id
+                    FROM products p
+                    JOIN brand_properties bp ON bp.brand_name = p.brand_name;
+                CREATE UNIQUE INDEX IF NOT EXISTS product_facet_values_uidx
+                    ON product_facet_values (product_id, facet, value_id);
+                CREATE INDEX IF NOT EXISTS product_facet_values_facet_idx
+                    ON product_facet_values (facet, value_id);
+
+                -- Счетчики фасетов без фильтров
+                CREATE MATERIALIZED VIEW IF NOT EXISTS facet_counts AS
+                    SELECT facet, value_id, COUNT(*) AS products
+                    FROM product_facet_values
+                    GROUP BY facet, value_id;
+                CREATE UNIQUE INDEX IF NOT EXISTS facet_counts_uidx ON facet_counts (facet, value_id);
+
+                -- Время последнего обновления фасетов, общее для всех воркеров
+                CREATE TABLE IF NOT EXISTS facet_refreshes (
+                    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                    refreshed_at TIMESTAMP NOT NULL
+                );
             """)
+            self.archive.create_tables()
             self.conn.commit()
         except Exception as e:
             print(f"Ошибка создания таблиц: {e}")
             self.conn.rollback()
             raise
 
-    def save_brand_data(self, brand_name: str, data: Dict) -> None:
-        """Сохранение данных бренда"""
+    def save_brand_data(self, brand_name: str, data: Dict) -> Optional[bool]:
+        """
+        Сохранение данных бренда: проекция в brands, полный payload в архив.
+
+        Returns:
+            Optional[bool]: True - бренд новый, payload или версия проекции изменились,
+                False - строка не изменилась, None - ошибка сохранения
+        """
         try:
+            payload_hash = self.archive.save(data)
+            # Строка с неизмененным payload и текущей версией проекции не перезаписывается
+            # и не попадает в ленту изменений
             self.cur.execute("""
-                INSERT INTO brands (brand_name, data)
-                VALUES (%s, %s)
+                WITH previous AS (
+                    SELECT payload_hash FROM brands WHERE brand_name = %s
+                )
+                INSERT INTO brands (brand_name, data, payload_hash, projection_version)
+                VALUES (%s, %s, %s, %s)
                 ON CONFLICT (brand_name) 
-                DO UPDATE SET data = EXCLUDED.data;
-            """, (brand_name, Json(data)))
+                DO UPDATE SET data = EXCLUDED.data, payload_hash = EXCLUDED.payload_hash,
+                              projection_version = EXCLUDED.projection_version
+                WHERE brands.payload_hash IS DISTINCT FROM EXCLUDED.payload_hash
+                   OR brands.projection_version IS DISTINCT FROM EXCLUDED.projection_version
+                RETURNING (xmax = 0), (SELECT payload_hash FROM previous) IS DISTINCT FROM brands.payload_hash;
+            """, (brand_name, brand_name, Json(project_brand_data(data)), payload_hash, PROJECTION_VERSION))
+            result = self.cur.fetchone()
+            # Каждая загрузка учитывается, изменение - только если сменился хэш существующего payload
+            payload_changed = bool(result and not result[0] and result[1])
+            self.cur.execute("""
+                UPDATE brands
+                SET fetch_count = fetch_count + 1,
+                    change_count = change_count + %s,
+                    last_fetched_at = CURRENT_TIMESTAMP
+                WHERE brand_name = %s;
+            """, (1 if payload_changed else 0, brand_name))
             self.conn.commit()
         except Exception as e:
             print(f"Ошибка сохранения бренда {brand_name}: {e}")
             self.conn.rollback()
+            return None
+        if result:
+            self._publish_changes('brand', [(brand_name, payload_hash, CREATED if result[0] else UPDATED)])
+        return bool(result)
+
+    def _publish_changes(self, entity: str, changes: List[Tuple[str, str, str]]) -> None:
+        """Публикация зафиксированных изменений; сбой ленты не отменяет сохранение"""
+        if not self.change_feed or not changes:
+            return
+        try:
+            self.change_feed.publish(entity, changes)
+        except Exception as e:
+            print(f"Ошибка публикации изменений ({entity}): {e}")
 
     def load_brand_data(self, brand_name: str) -> Optional[Dict]:
         """Загрузка данных бренда"""
@@ -89,6 +221,174 @@ class DBStorage:
             print(f"Ошибка загрузки бренда {brand_name}: {e}")
             return None
 
+    @staticmethod
+    def _fields_expression(fields: Optional[List[str]]) -> Tuple[str, List]:
+        """
+        SQL-выражение проекции JSONB по путям вида 'pageProps.name'.
+
+        Returns:
+            Tuple[str, List]: Выражение и его параметры
+        """
+        if not fields:
+            return "data", []
+        params: List = []
+        for field in fields:
+            params.extend([field, field.split('.')])
+        pairs = ", ".join("%s::text, data #> %s::text[]" for _ in fields)
+        return f"jsonb_build_object({pairs})", params
+
+    def load_brand_json(self, brand_name: str, include_products: bool = True,
+                        fields: Optional[List[str]] = None) -> Optional[bytes]:
+        """Получение данных бренда готовым JSON-текстом, собранным в PostgreSQL"""
+        expression, params = self._fields_expression(fields)
+        if not fields and not include_products:
+            expression = "data #- '{pageProps,most_viewed_products}'"
+        try:
+            self.cur.execute(f"""
+                SELECT convert_to(({expression})::text, 'UTF8')
+                FROM brands WHERE brand_name = %s;
+            """, params + [brand_name])
+            result = self.cur.fetchone()
+            return bytes(result[0]) if result else None
+        except Exception as e:
+            print(f"Ошибка загрузки бренда {brand_name}: {e}")
+            self.conn.rollback()
+            return None
+
+    def iter_brands_json(self, brand_names: List[str], fields: Optional[List[str]] = None,
+                         include_products: bool = True) -> Iterator[bytes]:
+        """Потоковая выдача JSON нескольких брендов через серверный курсор"""
+        expression, params = self._fields_expression(fields)
+        if not fields and not include_products:
+            expression = "data #- '{pageProps,most_viewed_products}'"
+        yield from self._iter_json_rows(f"""
+            SELECT convert_to(jsonb_build_object('brand_name', brand_name, 'data', {expression})::text, 'UTF8')
+            FROM brands WHERE brand_name = ANY(%s);
+        """, params + [list(brand_names)])
+
+    def iter_products_json(self, product_ids: List[str], fields: Optional[List[str]] = None) -> Iterator[bytes]:
+        """Потоковая выдача JSON нескольких продуктов через серверный курсор"""
+        expression, params = self._fields_expression(fields)
+        yield from self._iter_json_rows(f"""
+            SELECT convert_to(jsonb_build_object('id', id, 'data', {expression})::text, 'UTF8')
+            FROM products WHERE id = ANY(%s);
+        """, params + [[str(product_id) for product_id in product_ids]])
+
+    def _iter_json_rows(self, query: str, params: List, itersize: int = 50) -> Iterator[bytes]:
+        """Чтение строк JSON именованным курсором порциями по itersize"""
+        # Отдельное соединение на поток: commit других запросов на общем соединении закрыл бы
+        # курсор посреди чтения, а WITH HOLD материализует весь результат на сервере
+        conn = None
+        try:
+            conn = psycopg2.connect(os.getenv('DATABASE_URL'), connect_timeout=10)
+            conn.set_session(readonly=True)
+            with conn.cursor(name='json_rows') as cursor:
+                cursor.itersize = itersize
+                cursor.execute(query, params)
+                for row in cursor:
+                    yield bytes(row[0])
+        except Exception as e:
+            # Оборванный поток не должен выглядеть полным: ответ API прерывается,
+            # извлечение бренда завершается ошибкой
+            print(f"Ошибка потокового чтения: {e}")
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if conn:
+                conn.close()
+
+    def get_brand_version(self, brand_name: str) -> Optional[str]:
+        """Версия данных бренда (хэш payload) без загрузки самих данных"""
+        try:
+            self.cur.execute("""
+                SELECT COALESCE(payload_hash, md5(data::text)) FROM brands WHERE brand_name = %s;
+            """, (brand_name,))
+            result = self.cur.fetchone()
+            return result[0].strip() if result else None
+        except Exception as e:
+            print(f"Ошибка получения версии бренда {brand_name}: {e}")
+            self.conn.rollback()
+            return None
+
+    def open_brand_json(self, brand_name: str, chunk_size: int = 256 * 1024) -> Optional[BinaryIO]:
+        """
+        Получение данных бренда как потока JSON без декодирования в словари.
+
+        JSON нарезается в PostgreSQL на части по chunk_size байт и читается
+        серверным курсором, поэтому в памяти процесса - лишь несколько частей,
+        а не весь payload бренда.
+        """
+        # generate_series во вложенном цикле выдает части по порядку, ORDER BY не нужен:
+        # сортировка собрала бы все части на сервере. MATERIALIZED: иначе подзапрос
+        # встраивается, и JSONB бренда сериализуется заново для каждой части
+        chunks = self._iter_json_rows("""
+            WITH brand AS MATERIALIZED (
+                SELECT convert_to(data::text, 'UTF8') AS payload FROM brands WHERE brand_name = %s
+            )
+            SELECT substring(brand.payload FROM start FOR %s)
+            FROM brand, generate_series(1, octet_length(brand.payload), %s) AS start;
+        """, [brand_name, chunk_size, chunk_size], itersize=8)
+        # JSON бренда не бывает пустым: нет первой части - нет бренда
+        first = next(chunks, None)
+        if first is None:
+            chunks.close()
+            return None
+        return io.BufferedReader(_ChunkReader(first, chunks), buffer_size=chunk_size)
+
+    def load_brand_route(self, brand_name: str) -> Optional[Dict]:
+        """Загрузка buildId, шаблона страницы и параметров маршрута бренда"""
+        try:
+            self.cur.execute("""
+                SELECT data->>'buildId', data->>'page', data->'query'
+                FROM brands WHERE brand_name = %s;
+            """, (brand_name,))
+            result = self.cur.fetchone()
+            if not result:
+                return None
+            return {'buildId': result[0], 'page': result[1], 'query': result[2]}
+        except Exception as e:
+            print(f"Ошибка загрузки маршрута бренда {brand_name}: {e}")
+            return None
+
+    def load_raw_brand_data(self, brand_name: str) -> Optional[Dict]:
+        """Загрузка полного исходного payload бренда из архива"""
+        try:
+            self.cur.execute("""
+                SELECT payload_hash FROM brands WHERE brand_name = %s;
+            """, (brand_name,))
+            result = self.cur.fetchone()
+            if not result or not result[0]:
+                return None
+            return self.archive.load(result[0])
+        except Exception as e:
+            print(f"Ошибка загрузки архива бренда {brand_name}: {e}")
+            return None
+
+    def load_refresh_candidates(self) -> List[Tuple[str, Optional[str], Optional[Dict], float, int, float]]:
+        """
+        Данные брендов для планировщика обновлений.
+
+        Returns:
+            List[Tuple]: (имя, шаблон страницы, параметры маршрута, часов с последней загрузки или обработки,
+                число изменений payload, часов наблюдения от первой до последней загрузки)
+        """
+        try:
+            self.cur.execute("""
+                SELECT brand_name, data->>'page', data->'query',
+                       EXTRACT(EPOCH FROM CURRENT_TIMESTAMP
+                           - COALESCE(GREATEST(last_processed_at, last_fetched_at), created_at)) / 3600,
+                       change_count,
+                       EXTRACT(EPOCH FROM COALESCE(last_fetched_at, created_at) - created_at) / 3600
+                FROM brands;
+            """)
+            return [(row[0], row[1], row[2], float(row[3] or 0), row[4], float(row[5] or 0))
+                    for row in self.cur.fetchall()]
+        except Exception as e:
+            print(f"Ошибка загрузки брендов для обновления: {e}")
+            self.conn.rollback()
+            return []
+
     def list_brands(self) -> List[str]:
         """Получение списка брендов"""
         try:
@@ -98,18 +398,346 @@ class DBStorage:
             print(f"Ошибка получения списка брендов: {e}")
             return []
 
-    def save_product(self, product: Dict) -> None:
+    def save_product(self, product: ProductRecord) -> None:
         """Сохранение данных продукта"""
+        self.save_products([product])
+
+    def save_products(self, products: List[ProductRecord]) -> bool:
+        """
+        Пакетное сохранение продуктов вместе с их свойствами.
+
+        Returns:
+            bool: Пачка сохранена (False - транзакция откачена)
+        """
+        # Дубликаты id в одном INSERT ... ON CONFLICT недопустимы
+        unique = {str(product.id): product for product in products if product.id is not None}
+        if not unique:
+            return True
         try:
-            self.cur.execute("""
+            # RETURNING возвращает только вставленные и действительно измененные строки
+            changed = execute_values(self.cur, """
                 INSERT INTO products (id, brand_name, data)
-                VALUES (%s, %s, %s)
+                VALUES %s
                 ON CONFLICT (id) 
-                DO UPDATE SET data = EXCLUDED.data;
-            """, (product['id'], product['brand'], Json(product)))
+                DO UPDATE SET data = EXCLUDED.data
+                WHERE products.data IS DISTINCT FROM EXCLUDED.data
+                RETURNING id, md5(data::text), (xmax = 0);
+            """, [(product_id, product.brand, Json(product)) for product_id, product in unique.items()],
+                fetch=True)
+
+            rows = [
+                (product_id, name, value)
+                for product_id, product in unique.items()
+                for name, value in self._iter_product_properties(product)
+            ]
+            self.cur.execute("""
+                DELETE FROM product_properties WHERE product_id = ANY(%s);
+            """, (list(unique),))
+            self._insert_properties('product_properties', '(product_id, name, value_id)', rows)
+            self.conn.commit()
+        except Exception as e:
+            print(f"Ошибка сохранения продуктов {list(unique)[:5]}: {e}")
+            self.conn.rollback()
+            # Значения, созданные в откаченной транзакции, не существуют
+            self._value_ids.clear()
+            return False
+        self._publish_changes('product', [
+            (product_id, version, CREATED if inserted else UPDATED)
+            for product_id, version, inserted in changed
+        ])
+        return True
+
+    def save_product_specs(self, product_ids: List[str], specs: List[ProductSpec]) -> None:
+        """Замена числовых характеристик продуктов"""
+        if not product_ids:
+            return
+        try:
+            self.cur.execute("""
+                DELETE FROM product_specs WHERE product_id = ANY(%s);
+            """, (list(product_ids),))
+            if specs:
+                execute_values(self.cur, """
+                    INSERT INTO product_specs (product_id, property, min_value, max_value, unit, raw)
+                    VALUES %s;
+                """, [(spec.product_id, spec.property[:255], spec.min_value, spec.max_value,
+                       spec.unit[:32] if spec.unit else None, spec.raw) for spec in specs])
             self.conn.commit()
         except Exception as e:
-            print(f"Ошибка сохранения продукта {product.get('id')}: {e}")
+            print(f"Ошибка сохранения характеристик продуктов: {e}")
+            self.conn.rollback()
+
+    def search_product_specs(self, prop: str, min_value: Optional[float] = None,
+                             max_value: Optional[float] = None, unit: Optional[str] = None,
+                             limit: int = 100) -> List[Dict]:
+        """Поиск продуктов, диапазон характеристики которых пересекается с [min_value, max_value]"""
+        conditions = ["s.property = %s"]
+        params: List = [prop]
+        if max_value is not None:
+            conditions.append("COALESCE(s.min_value, '-Infinity') <= %s")
+            params.append(max_value)
+        if min_value is not None:
+            conditions.append("COALESCE(s.max_value, 'Infinity') >= %s")
+            params.append(min_value)
+        if unit:
+            conditions.append("s.unit = %s")
+            params.append(unit)
+        params.append(limit)
+        try:
+            self.cur.execute(f"""
+                SELECT s.product_id, p.brand_name, p.data->>'name', s.property,
+                       s.min_value, s.max_value, s.unit, s.raw
+                FROM product_specs s
+                JOIN products p ON p.id = s.product_id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY s.min_value NULLS LAST
+                LIMIT %s;
+            """, params)
+            return [
+                {'product_id': row[0], 'brand': row[1], 'name': row[2], 'property': row[3],
+                 'min': row[4], 'max': row[5], 'unit': row[6], 'raw': row[7]}
+                for row in self.cur.fetchall()
+            ]
+        except Exception as e:
+            print(f"Ошибка поиска по характеристике {prop}: {e}")
+            self.conn.rollback()
+            return []
+
+    def refresh_facets(self, min_interval: int = 0) -> bool:
+        """
+        Обновление материализованных представлений фасетов (CONCURRENTLY).
+
+        Args:
+            min_interval: Не обновлять чаще, чем раз в указанное число секунд
+        Returns:
+            bool: Было ли выполнено обновление
+        """
+        try:
+            # Одновременно обновляет только один воркер, остальные пропускают
+            self.cur.execute("SELECT pg_try_advisory_lock(hashtext('refresh_facets'));")
+            if not self.cur.fetchone()[0]:
+                self.conn.commit()
+                return False
+            try:
+                # Интервал отсчитывается от последнего обновления любым воркером
+                self.cur.execute("""
+                    SELECT 1 FROM facet_refreshes
+                    WHERE refreshed_at > CURRENT_TIMESTAMP - make_interval(secs => %s);
+                """, (min_interval,))
+                if self.cur.fetchone():
+                    self.conn.commit()
+                    return False
+                self.cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY product_facet_values;")
+                self.cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY facet_counts;")
+                self.cur.execute("""
+                    INSERT INTO facet_refreshes (id, refreshed_at) VALUES (TRUE, CURRENT_TIMESTAMP)
+                    ON CONFLICT (id) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;
+                """)
+                self.conn.commit()
+            finally:
+                # После ошибки транзакция прервана, и без отката блокировка осталась бы у сессии
+                self.conn.rollback()
+                self.cur.execute("SELECT pg_advisory_unlock(hashtext('refresh_facets'));")
+                self.conn.commit()
+            print("Фасеты обновлены")
+            return True
+        except Exception as e:
+            print(f"Ошибка обновления фасетов: {e}")
+            self.conn.rollback()
+            return False
+
+    def get_facet_counts(self, filters: List[Tuple[str, str]], facets: Optional[List[str]] = None,
+                         limit: int = 50) -> Dict:
+        """
+        Счетчики продуктов по значениям фасетов с учетом фильтров.
+
+        Args:
+            filters: Пары (фасет, значение), объединяемые по И
+            facets: Какие фасеты вернуть (по умолчанию все)
+            limit: Максимум значений на фасет
+        """
+        params: List = []
+        if filters:
+            matched = " INTERSECT ".join(
+                "SELECT product_id FROM product_facet_values "
+                "WHERE facet = %s AND value_id = (SELECT id FROM property_values WHERE md5(value) = md5(%s))"
+                for _ in filters
+            )
+            for facet, value in filters:
+                params.extend([facet, value])
+            source = f"""
+                SELECT f.facet, f.value_id, COUNT(*) AS products
+                FROM product_facet_values f
+                JOIN ({matched}) m ON m.product_id = f.product_id
+                GROUP BY f.facet, f.value_id
+            """
+            total_sql = f"SELECT COUNT(*) FROM ({matched}) m"
+        else:
+            source = "SELECT facet, value_id, products FROM facet_counts"
+            total_sql = "SELECT COUNT(DISTINCT product_id) FROM product_facet_values"
+
+        facet_filter = "WHERE c.facet = ANY(%s)" if facets else ""
+        try:
+            self.cur.execute(f"""
+                SELECT facet, value, products FROM (
+                    SELECT c.facet, v.value, c.products,
+                           ROW_NUMBER() OVER (PARTITION BY c.facet ORDER BY c.products DESC, v.value) AS rank
+                    FROM ({source}) c
+                    JOIN property_values v ON v.id = c.value_id
+                    {facet_filter}
+                ) ranked
+                WHERE rank <= %s
+                ORDER BY facet, products DESC, value;
+            """, params + ([facets] if facets else []) + [limit])
+            counts: Dict[str, List[Dict]] = {}
+            for facet, value, products in self.cur.fetchall():
+                counts.setdefault(facet, []).append({'value': value, 'count': products})
+
+            self.cur.execute(total_sql, params)
+            return {'total': self.cur.fetchone()[0], 'facets': counts}
+        except Exception as e:
+            print(f"Ошибка получения фасетов: {e}")
+            self.conn.rollback()
+            return {'total': 0, 'facets': {}}
+
+    def save_brand_properties(self, brand_name: str, properties: Dict[str, List[str]]) -> None:
+        """Сохранение свойств бренда (фасетов) в нормализованном виде"""
+        try:
+            self.cur.execute("""
+                DELETE FROM brand_properties WHERE brand_name = %s;
+            """, (brand_name,))
+            rows = [(brand_name, key, value) for key, values in properties.items() for value in values]
+            self._insert_properties('brand_properties', '(brand_name, key, value_id)', rows)
+            self.conn.commit()
+        except Exception as e:
+            print(f"Ошибка сохранения свойств бренда {brand_name}: {e}")
+            self.conn.rollback()
+            self._value_ids.clear()
+
+    def load_brand_properties(self, brand_name: str) -> Dict[str, List[str]]:
+        """Загрузка свойств бренда"""
+        try:
+            self.cur.execute("""
+                SELECT bp.key, pv.value
+                FROM brand_properties bp
+                JOIN property_values pv ON pv.id = bp.value_id
+                WHERE bp.brand_name = %s
+                ORDER BY bp.key, pv.value;
+            """, (brand_name,))
+            properties: Dict[str, List[str]] = {}
+            for key, value in self.cur.fetchall():
+                properties.setdefault(key, []).append(value)
+            return properties
+        except Exception as e:
+            print(f"Ошибка загрузки свойств бренда {brand_name}: {e}")
+            return {}
+
+    @staticmethod
+    def _iter_product_properties(product: ProductRecord) -> Iterable[Tuple[str, str]]:
+        """Пары (свойство, значение) продукта"""
+        for name, items in product.properties.items():
+            for item in items or []:
+                value = item.get('name') if isinstance(item, dict) else item
+                if value:
+                    yield name, str(value)
+
+    def _insert_properties(self, table: str, columns: str, rows: List[Tuple[str, str, str]]) -> None:
+        """Вставка строк (владелец, свойство, значение) с интернированием значений"""
+        if not rows:
+            return
+        value_ids = self._intern_values({value for _, _, value in rows})
+        execute_values(self.cur, f"""
+            INSERT INTO {table} {columns}
+            VALUES %s
+            ON CONFLICT DO NOTHING;
+        """, list({(owner, name, value_ids[value]) for owner, name, value in rows}))
+
+    def _intern_values(self, values: Iterable[str]) -> Dict[str, int]:
+        """Получение id значений свойств, создавая недостающие"""
+        values = set(values)
+        value_ids = {value: self._value_ids[value] for value in values if value in self._value_ids}
+        missing = [value for value in values if value not in value_ids]
+        if missing:
+            execute_values(self.cur, """
+                INSERT INTO property_values (value)
+                VALUES %s
+                ON CONFLICT (md5(value)) DO NOTHING;
+            """, [(value,) for value in missing])
+            hashes = [hashlib.md5(value.encode('utf-8')).hexdigest() for value in missing]
+            self.cur.execute("""
+                SELECT value, id FROM property_values WHERE md5(value) = ANY(%s);
+            """, (hashes,))
+            fetched = dict(self.cur.fetchall())
+            value_ids.update(fetched)
+            # Кэш ограничен, чтобы не расти бесконечно на длинных обходах
+            if len(self._value_ids) > 100_000:
+                self._value_ids.clear()
+            self._value_ids.update(fetched)
+        return value_ids
+
+    def load_product_details(self, product_ids: List[str]) -> Optional[Dict[str, Dict]]:
+        """
+        Сохраненные данные страниц продуктов (tables, documents, img, info).
+
+        Returns:
+            Optional[Dict]: id -> данные страницы; None при ошибке запроса
+        """
+        if not product_ids:
+            return {}
+        try:
+            self.cur.execute("""
+                SELECT id, data->'tables', data->'documents', data->'img', data->'info'
+                FROM products WHERE id = ANY(%s);
+            """, (list(product_ids),))
+            return {
+                product_id: {'tables': tables or [], 'documents': documents or [], 'img': img or [], 'info': info or []}
+                for product_id, tables, documents, img, info in self.cur.fetchall()
+            }
+        except Exception as e:
+            print(f"Ошибка загрузки данных страниц продуктов: {e}")
+            self.conn.rollback()
+            return None
+
+    def load_document_refs(self, urls: List[str]) -> Dict[str, Dict]:
+        """Загрузка известных соответствий URL документа -> файл"""
+        if not urls:
+            return {}
+        try:
+            self.cur.execute("""
+                SELECT url, sha256, etag, last_modified, fetched_at
+                FROM document_blobs WHERE url = ANY(%s);
+            """, (list(urls),))
+            return {
+                url: {'sha256': sha256, 'etag': etag, 'last_modified': last_modified, 'fetched_at': fetched_at}
+                for url, sha256, etag, last_modified, fetched_at in self.cur.fetchall()
+            }
+        except Exception as e:
+            print(f"Ошибка загрузки ссылок на документы: {e}")
+            self.conn.rollback()
+            return {}
+
+    def save_document_refs(self, refs: List[Dict]) -> None:
+        """Сохранение соответствий URL документа -> файл"""
+        if not refs:
+            return
+        try:
+            execute_values(self.cur, """
+                INSERT INTO document_blobs (url, sha256, etag, last_modified, size, content_type, fetched_at)
+                VALUES %s
+                ON CONFLICT (url) DO UPDATE SET
+                    sha256 = EXCLUDED.sha256,
+                    etag = COALESCE(EXCLUDED.etag, document_blobs.etag),
+                    last_modified = COALESCE(EXCLUDED.last_modified, document_blobs.last_modified),
+                    size = COALESCE(EXCLUDED.size, document_blobs.size),
+                    content_type = COALESCE(EXCLUDED.content_type, document_blobs.content_type),
+                    fetched_at = EXCLUDED.fetched_at;
+            """, [
+                (ref['url'], ref['sha256'], ref.get('etag'), ref.get('last_modified'),
+                 ref.get('size'), ref.get('content_type'))
+                for ref in refs
+            ], template="(%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)")
+            self.conn.commit()
+        except Exception as e:
+            print(f"Ошибка сохранения ссылок на документы: {e}")
             self.conn.rollback()
 
     def update_brand_status(self, brand_name: str, status: str, error: str = None) -> None:
@@ -129,17 +757,23 @@ class DBStorage:
 
     def update_extraction_status(self, brand_name: str, status: str, 
                                products_count: int = None, error: str = None) -> None:
-        """Обновление статуса извлечения продуктов"""
+        """
+        Обновление статуса извлечения продуктов.
+
+        Статусы: processing -> extracted (продукты поставлены в очередь) ->
+        completed (все сохранены) или failed.
+        """
         try:
             self.cur.execute("""
                 UPDATE brands 
-                SET products_extracted = %s,
+                SET status = %s,
+                    products_extracted = %s,
                     products_count = COALESCE(%s, products_count),
                     last_processed_at = CURRENT_TIMESTAMP,
                     updated_at = CURRENT_TIMESTAMP,
                     error_message = %s
                 WHERE brand_name = %s;
-            """, (status == 'completed', products_count, error, brand_name))
+            """, (status, status == 'completed', products_count, error, brand_name))
             self.conn.commit()
         except Exception as e:
             print(f"Ошибка обновления статуса извлечения для {brand_name}: {e}")
@@ -164,4 +798,29 @@ class DBStorage:
         if self.cur:
             self.cur.close()
         if self.conn:
-            self.conn.close() 
\ No newline at end of file
+            self.conn.close() 
+
+class _ChunkReader(io.RawIOBase):
+    """Файловый объект поверх итератора частей (bytes)"""
+
+    def __init__(self, first: bytes, chunks: Iterator[bytes]):
+        self._buffer = first
+        self._chunks = chunks
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while not self._buffer:
+            self._buffer = next(self._chunks, b'')
+            if not self._buffer:
+                return 0
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def close(self) -> None:
+        # Недочитанный поток закрывает серверный курсор
+        self._chunks.close()
+        super().close()
@@ -0,0 +1,38 @@
+"""Быстрая JSON-сериализация на orjson для PostgreSQL и API."""
+import dataclasses
+import json
+from typing import Any
+import orjson
+from psycopg2.extras import Json as _Json, register_default_json, register_default_jsonb
+
+def _default(obj: Any) -> Any:
+    """Dataclass-записи для стандартного json"""
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumpb(obj: Any) -> bytes:
+    """Сериализация в байты (dataclass-записи поддерживаются напрямую)"""
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # orjson не кодирует целые за пределами 64 бит, такие данные пишет стандартный json
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def dumps(obj: Any) -> str:
+    """Сериализация в строку"""
+    return dumpb(obj).decode('utf-8')
+
+def loads(data) -> Any:
+    """Десериализация JSON"""
+    return orjson.loads(data)
+
+class Json(_Json):
+    """Адаптер psycopg2 для JSON/JSONB, кодирующий через orjson"""
+    def dumps(self, obj: Any) -> str:
+        return dumps(obj)
+
+def register(conn) -> None:
+    """Декодирование json/jsonb колонок через orjson для соединения"""
+    register_default_json(conn, loads=loads)
+    register_default_jsonb(conn, loads=loads)